@@ -17,11 +17,11 @@
 
 from __future__ import division
 import matplotlib.animation as animation
-from matplotlib.mlab import psd
 import pylab as pyl
 import numpy as np
 import sys
 from rtlsdr import RtlSdr
+from rtlsdr.spectrum import WelchPSD
 
 # A simple waterfall, spectrum plotter
 #
@@ -54,6 +54,7 @@ class Waterfall(object):
     def __init__(self, sdr=None, fig=None):
         self.fig = fig if fig else pyl.figure()
         self.sdr = sdr if sdr else RtlSdr()
+        self.psd = WelchPSD(nfft=NFFT, num_averages=NUM_SAMPLES_PER_SCAN//NFFT)
 
         self.init_plot()
 
@@ -134,8 +135,9 @@ class Waterfall(object):
             self.sdr.fc += self.sdr.rs*scan_num
 
             # estimate PSD for one scan
+            self.psd.reset()
             samples = self.sdr.read_samples(NUM_SAMPLES_PER_SCAN)
-            psd_scan, f = psd(samples, NFFT=NFFT)
+            psd_scan = self.psd.update(samples)
 
             self.image_buffer[0, start_ind: start_ind+NFFT] = 10*np.log10(psd_scan)
 
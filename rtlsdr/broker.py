@@ -0,0 +1,396 @@
+"""
+This module contains a pool of open devices shared by the threads of one
+process.
+
+:class:`DeviceBroker` opens the devices once and keeps them open.  Jobs
+running as threads (or asyncio tasks) of the same process take exclusive
+use of a device with :meth:`~DeviceBroker.lease`, selecting it by serial
+number or tuner type.  When the lease is released the device stays open,
+and the settings it was left with are remembered so the next lease only
+changes the ones that differ.  This avoids the cost of opening and
+initializing a device for every job, as well as ``LIBUSB_ERROR_BUSY``
+errors from jobs opening the same device.
+
+Example:
+    .. code-block:: python
+
+       from rtlsdr.broker import DeviceBroker
+
+       broker = DeviceBroker()
+
+       def scan_job(center_freq):
+           settings = {'sample_rate': 2.048e6, 'center_freq': center_freq}
+           with broker.lease(tuner_type='R820T', settings=settings) as lease:
+               return lease.sdr.read_samples(256*1024)
+
+Notes:
+    Leases are only given to the process that created the broker.  It does
+    not coordinate separate processes: the devices it holds are busy for
+    them, and devices held by them fail to open here (and are retried
+    later).  Jobs run as separate processes should be dispatched by a
+    single process owning the broker instead.
+"""
+
+from __future__ import division
+import time
+import threading
+import collections
+
+from .rtlsdr import RtlSdr
+
+
+#: The tuner names accepted as ``tuner_type`` (see
+#: :meth:`~rtlsdr.rtlsdr.BaseRtlSdr.get_tuner_type`)
+TUNER_TYPES = collections.OrderedDict([
+    ('UNKNOWN', 0),
+    ('E4000', 1),
+    ('FC0012', 2),
+    ('FC0013', 3),
+    ('FC2580', 4),
+    ('R820T', 5),
+    ('R828D', 6),
+])
+
+
+class DeviceLease(object):
+    """Exclusive use of a device given by :meth:`DeviceBroker.lease`
+
+    Leases can also be used as a context manager which releases the device
+    on exit.
+
+    Attributes:
+        broker (DeviceBroker): The broker the device belongs to
+        serial_number (str): The serial number of the device
+        sdr: The open device instance
+        applied (list): The names of the settings that were changed for this
+            lease (the others already had the requested values)
+        released (bool): Whether :meth:`release` has been called
+    """
+
+    def __init__(self, broker, serial_number, sdr):
+        self.broker = broker
+        self.serial_number = serial_number
+        self.sdr = sdr
+        self.applied = []
+        self.released = False
+
+    def release(self):
+        """Return the device to the broker
+
+        Any async reads must be stopped first. The :attr:`sdr` must not be
+        used after this call.
+        """
+        if self.released:
+            return
+        self.released = True
+        self.broker._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __repr__(self):
+        return '<{self.__class__.__name__} serial_number={self.serial_number} released={self.released}>'.format(
+            self=self,
+        )
+
+
+class DeviceBroker(object):
+    """Keep a set of devices open and lease them to the threads of this
+    process
+
+    Arguments:
+        serial_numbers (:obj:`list`, optional): The serial numbers of the
+            devices to manage.  Defaults to all attached devices (see
+            :meth:`~rtlsdr.rtlsdr.BaseRtlSdr.get_device_serial_addresses`).
+            Devices sharing a serial number can't be told apart, so only the
+            first of them is used.
+        test_mode_enabled (:obj:`bool`, optional): Passed to each device
+        dithering_enabled (:obj:`bool`, optional): Passed to each device
+        device_class (optional): The class used to open the devices.
+            Defaults to :class:`~rtlsdr.rtlsdr.RtlSdr`
+
+    Attributes:
+        devices (collections.OrderedDict): The device instances by serial
+            number (None for devices that could not be opened)
+        tuner_types (dict): The tuner type of each device that was opened
+        errors (dict): The exception raised by the last failed attempt to
+            open each device.  These devices (for example, ones opened by
+            another process) are opened again when a lease could use them,
+            but not before their retry delay has passed.
+        closed (bool): Whether :meth:`close` has been called
+    """
+
+    RETRY_DELAY = 1.
+    """The time (in seconds) before a device that failed to open is tried
+    again.  It is doubled after every failure, up to :attr:`MAX_RETRY_DELAY`
+    """
+
+    MAX_RETRY_DELAY = 60.
+    """The longest time (in seconds) between attempts to open a device"""
+
+    def __init__(self, serial_numbers=None, test_mode_enabled=False,
+                 dithering_enabled=True, device_class=None):
+        if device_class is None:
+            device_class = RtlSdr
+        if serial_numbers is None:
+            serial_numbers = device_class.get_device_serial_addresses()
+        else:
+            serial_numbers = list(serial_numbers)
+            if len(set(serial_numbers)) != len(serial_numbers):
+                raise ValueError('Serial numbers must be unique')
+        self.device_class = device_class
+        self.test_mode_enabled = test_mode_enabled
+        self.dithering_enabled = dithering_enabled
+        self.devices = collections.OrderedDict()
+        self.tuner_types = {}
+        self.errors = {}
+        self.closed = False
+        self._cond = threading.Condition()
+        self._leases = {}
+        self._opening = set()
+        self._retry_times = {}
+        self._retry_delays = {}
+        self._settings = {}
+        for serial_number in serial_numbers:
+            if serial_number not in self.devices:
+                self.devices[serial_number] = None
+                self._open(serial_number)
+
+    @property
+    def available(self):
+        """list: The serial numbers of the open devices that are not leased"""
+        with self._cond:
+            return [
+                serial_number for serial_number, sdr in self.devices.items()
+                if sdr is not None and serial_number not in self._leases
+            ]
+
+    @property
+    def num_leased(self):
+        """int: The number of devices currently leased"""
+        return len(self._leases)
+
+    @staticmethod
+    def get_tuner_type_value(tuner_type):
+        """Get the value of a tuner type given by name
+
+        Arguments:
+            tuner_type: A name from :data:`TUNER_TYPES` (not case sensitive)
+                or the value returned by
+                :meth:`~rtlsdr.rtlsdr.BaseRtlSdr.get_tuner_type`
+
+        Returns:
+            int: The tuner type
+        """
+        if isinstance(tuner_type, str):
+            try:
+                return TUNER_TYPES[tuner_type.upper()]
+            except KeyError:
+                raise ValueError('Unknown tuner type "%s"' % (tuner_type))
+        return int(tuner_type)
+
+    def _open(self, serial_number):
+        # called without holding the lock, so other leases aren't blocked
+        # while the device is initialized
+        sdr = None
+        try:
+            sdr = self.device_class(
+                serial_number=serial_number,
+                test_mode_enabled=self.test_mode_enabled,
+                dithering_enabled=self.dithering_enabled,
+            )
+            tuner_type = sdr.get_tuner_type()
+        except IOError as exc:
+            if sdr is not None:
+                sdr.close()
+            with self._cond:
+                self.devices[serial_number] = None
+                self.errors[serial_number] = exc
+                delay = self._retry_delays.get(serial_number)
+                if delay is None:
+                    delay = self.RETRY_DELAY
+                else:
+                    delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                self._retry_delays[serial_number] = delay
+                self._retry_times[serial_number] = time.monotonic() + delay
+            return None
+        with self._cond:
+            if self.closed:
+                sdr.close()
+            self.devices[serial_number] = sdr
+            self.tuner_types[serial_number] = tuner_type
+            self.errors.pop(serial_number, None)
+            self._retry_delays.pop(serial_number, None)
+            self._retry_times.pop(serial_number, None)
+            self._settings[serial_number] = {}
+        return sdr
+
+    def _matches(self, serial_number, tuner_type):
+        # devices that were never opened are only used if asked for by serial
+        if tuner_type is None:
+            return True
+        return self.tuner_types.get(serial_number) == tuner_type
+
+    def _find_device(self, serial_number, tuner_type, settings):
+        # returns an open device to lease, or else a closed one to open
+        best = None
+        to_open = None
+        now = time.monotonic()
+        for candidate in self.devices:
+            if serial_number is not None and candidate != serial_number:
+                continue
+            if candidate in self._leases or candidate in self._opening:
+                continue
+            if not self._matches(candidate, tuner_type):
+                continue
+            sdr = self.devices[candidate]
+            if sdr is None or not sdr.device_opened:
+                if to_open is None and self._retry_times.get(candidate, now) <= now:
+                    to_open = candidate
+                continue
+            # prefer the device needing the fewest setting changes
+            cache = self._settings[candidate]
+            changes = sum(
+                1 for name, value in settings.items()
+                if name not in cache or cache[name][0] != value
+            )
+            if best is None or changes < best[0]:
+                best = (changes, candidate)
+                if not changes:
+                    break
+        if best is not None:
+            return best[1], None
+        return None, to_open
+
+    def lease(self, serial_number=None, tuner_type=None, settings=None, timeout=None):
+        """Take exclusive use of a device
+
+        If all of the matching devices are leased, this waits for one of
+        them to be released.
+
+        Arguments:
+            serial_number (:obj:`str`, optional): The serial number of the
+                device.  If not given, any device may be used
+            tuner_type (optional): The tuner type (see
+                :meth:`get_tuner_type_value`)
+            settings (:obj:`dict`, optional): Property names and values
+                (such as ``center_freq``, ``sample_rate`` or ``gain``) to
+                apply to the device, in order
+            timeout (:obj:`float`, optional): The maximum time to wait in
+                seconds.  If None (the default), wait until a device is
+                released
+
+        Returns:
+            DeviceLease: The lease for the device
+
+        Raises:
+            ValueError: If no device matches
+            TimeoutError: If no matching device was released within
+                ``timeout``
+        """
+        if settings is None:
+            settings = {}
+        if serial_number is not None and serial_number not in self.devices:
+            raise ValueError('Unknown serial number "%s"' % (serial_number))
+        if tuner_type is not None:
+            tuner_type = self.get_tuner_type_value(tuner_type)
+        for name in settings:
+            if not isinstance(getattr(self.device_class, name, None), property):
+                raise ValueError('Unknown setting "%s"' % (name))
+        if timeout is not None:
+            end_time = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self.closed:
+                    raise ValueError('DeviceBroker is closed')
+                found, to_open = self._find_device(serial_number, tuner_type, settings)
+                if found is not None:
+                    lease = self._leases[found] = DeviceLease(self, found, self.devices[found])
+                    break
+                if to_open is not None:
+                    self._opening.add(to_open)
+                else:
+                    busy = list(self._leases) + list(self._opening)
+                    if not any(
+                        self._matches(candidate, tuner_type) for candidate in busy
+                        if serial_number is None or candidate == serial_number
+                    ):
+                        # waiting won't help
+                        if serial_number in self.errors:
+                            raise self.errors[serial_number]
+                        raise ValueError('No device matches the lease')
+                    remaining = None
+                    if timeout is not None:
+                        remaining = end_time - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError('Timed out waiting for a device')
+                    self._cond.wait(remaining)
+                    continue
+            try:
+                self._open(to_open)
+            finally:
+                with self._cond:
+                    self._opening.discard(to_open)
+                    self._cond.notify_all()
+        try:
+            lease.applied = self._apply_settings(lease, settings)
+            lease.sdr.reset_buffer()
+        except Exception:
+            lease.release()
+            raise
+        return lease
+
+    def _apply_settings(self, lease, settings):
+        # the cache holds the requested value (to match leases) and the
+        # value read back from the device (to detect changes by the job),
+        # since the device may round the value or report it differently
+        # (such as a numeric gain for 'auto')
+        cache = self._settings[lease.serial_number]
+        applied = []
+        for name, value in settings.items():
+            if name in cache and cache[name][0] == value:
+                continue
+            cache.pop(name, None)
+            setattr(lease.sdr, name, value)
+            cache[name] = (value, getattr(lease.sdr, name))
+            applied.append(name)
+        return applied
+
+    def _release(self, lease):
+        sdr = lease.sdr
+        cache = self._settings[lease.serial_number]
+        if sdr.device_opened:
+            # forget the settings the job changed
+            try:
+                for name in list(cache):
+                    if getattr(sdr, name) != cache[name][1]:
+                        del cache[name]
+            except IOError:
+                cache.clear()
+        else:
+            # closed after an error, so it's opened again by the next lease
+            cache.clear()
+        with self._cond:
+            del self._leases[lease.serial_number]
+            self._cond.notify_all()
+
+    def close(self):
+        """Close all of the devices
+
+        Any leases still held can no longer be used.
+        """
+        with self._cond:
+            self.closed = True
+            for sdr in self.devices.values():
+                if sdr is not None:
+                    sdr.close()
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
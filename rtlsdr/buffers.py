@@ -0,0 +1,442 @@
+"""
+This module contains preallocated buffer types used to avoid allocating
+memory for each block of data read from the device, and the
+:class:`BlockInfo` metadata attached to each block.
+"""
+
+from __future__ import division
+import threading
+from ctypes import c_ubyte, c_void_p, addressof, cast, memmove
+
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+
+class BlockInfo(object):
+    """Metadata for a block of data read from the device
+
+    The latest instance is available as
+    :attr:`~rtlsdr.rtlsdr.BaseRtlSdr.block_info` while the block is passed to
+    the callback (or after a synchronous read).
+
+    Arguments and attributes:
+        sequence (int): The number of blocks received before this one. A
+            gap in the sequence means blocks were dropped (see
+            :attr:`~rtlsdr.rtlsdr.RtlSdr.overruns`)
+        sample_index (int): The number of samples received before this block
+        num_samples (int): The number of (raw I/Q) samples in the block
+        time (float): The :func:`time.monotonic` value when the block was
+            received from librtlsdr
+        center_freq (float): The center frequency in Hz
+        sample_rate (float): The sample rate in Hz
+        gain (float): The tuner gain in dB
+
+    Notes:
+        The tuning values are those set when the block was received. Data
+        captured shortly before a change may still be in transit.
+    """
+
+    __slots__ = (
+        'sequence', 'sample_index', 'num_samples', 'time',
+        'center_freq', 'sample_rate', 'gain',
+    )
+
+    def __init__(self, sequence, sample_index, num_samples, time,
+                 center_freq, sample_rate, gain):
+        self.sequence = sequence
+        self.sample_index = sample_index
+        self.num_samples = num_samples
+        self.time = time
+        self.center_freq = center_freq
+        self.sample_rate = sample_rate
+        self.gain = gain
+
+    @property
+    def start_time(self):
+        """float: The estimated :func:`time.monotonic` value of the first
+        sample (:attr:`time` less the duration of the block)
+        """
+        return self.time - self.num_samples / self.sample_rate
+
+    def __repr__(self):
+        return '<{self.__class__.__name__} sequence={self.sequence} sample_index={self.sample_index} num_samples={self.num_samples}>'.format(
+            self=self,
+        )
+
+
+class SampleBufferPool(object):
+    """A fixed number of preallocated sample arrays used in rotation
+
+    Each call to :meth:`next_buffer` returns the next array in the pool,
+    wrapping around after :attr:`num_buffers` calls.  The data in a buffer is
+    therefore only valid until it has been handed out again.
+
+    Arguments:
+        num_buffers (int): The number of arrays to allocate
+        num_samples (int): The length of each array
+        dtype (optional): The data type of the arrays. Defaults to
+            ``'complex128'``
+
+    Attributes:
+        buffers (list): The allocated :class:`numpy.ndarray` instances
+
+    Notes:
+        This requires NumPy
+    """
+
+    def __init__(self, num_buffers, num_samples, dtype='complex128'):
+        if not has_numpy:
+            raise ImportError('SampleBufferPool requires NumPy')
+        if num_buffers < 1:
+            raise ValueError('num_buffers must be at least 1')
+        self.num_samples = num_samples
+        self.dtype = np.dtype(dtype)
+        self.buffers = [np.empty(num_samples, dtype=self.dtype) for _ in range(num_buffers)]
+        self.index = 0
+
+    @property
+    def num_buffers(self):
+        """int: The number of arrays in the pool"""
+        return len(self.buffers)
+
+    def next_buffer(self):
+        """Get the next array in the rotation
+
+        Returns:
+            numpy.ndarray:
+        """
+        buf = self.buffers[self.index]
+        self.index += 1
+        if self.index == len(self.buffers):
+            self.index = 0
+        return buf
+
+
+class ReadBufferRing(object):
+    """A ring of preallocated byte buffers used for synchronous reads
+
+    Buffers are handed out in rotation by :meth:`acquire`, so the data in a
+    buffer stays valid until its slot comes around again (after
+    :attr:`num_buffers` further reads).  A slot can be held for longer by
+    leasing it (see :meth:`lease`), in which case it will be skipped by the
+    rotation until :meth:`release` is called.
+
+    Arguments:
+        num_buffers (int): The number of buffers in the ring
+
+    Attributes:
+        buffers (list): The ``ctypes`` arrays for each slot (``None`` if a
+            slot has not been used yet)
+    """
+
+    def __init__(self, num_buffers):
+        if num_buffers < 1:
+            raise ValueError('num_buffers must be at least 1')
+        self.buffers = [None] * num_buffers
+        self.leased = [False] * num_buffers
+        self.index = 0
+        self._lock = threading.Lock()
+
+    @property
+    def num_buffers(self):
+        """int: The number of slots in the ring"""
+        return len(self.buffers)
+
+    def acquire(self, num_bytes, lease=False):
+        """Get the next buffer in the rotation that is not leased
+
+        The buffer for the slot is (re)allocated if its size does not match
+        ``num_bytes``.
+
+        Arguments:
+            num_bytes (int): The required buffer size
+            lease (:obj:`bool`, optional): If True, mark the slot as leased
+                (see :meth:`lease`)
+
+        Returns:
+            tuple: The slot index and its ``ctypes.Array[c_ubyte]`` buffer
+
+        Raises:
+            BufferError: If all of the slots are leased
+        """
+        with self._lock:
+            num_buffers = len(self.buffers)
+            for i in range(num_buffers):
+                index = (self.index + i) % num_buffers
+                if not self.leased[index]:
+                    break
+            else:
+                raise BufferError('All %d read buffers are leased' % (num_buffers))
+            buffer = self.buffers[index]
+            if buffer is None or len(buffer) != num_bytes:
+                buffer = self.buffers[index] = (c_ubyte*num_bytes)()
+            if lease:
+                self.leased[index] = True
+            self.index = (index + 1) % num_buffers
+        return index, buffer
+
+    def lease(self, num_bytes):
+        """Acquire the next available slot and lease it
+
+        Arguments:
+            num_bytes (int): The required buffer size
+
+        Returns:
+            BufferLease:
+
+        Raises:
+            BufferError: If all of the slots are leased
+        """
+        index, buffer = self.acquire(num_bytes, lease=True)
+        return BufferLease(self, index)
+
+    def release(self, index):
+        """Return a leased slot to the rotation
+
+        Arguments:
+            index (int): The slot index
+        """
+        with self._lock:
+            self.leased[index] = False
+
+    @property
+    def num_leased(self):
+        """int: The number of slots currently leased"""
+        return sum(self.leased)
+
+
+class BufferLease(object):
+    """Ownership of a single :class:`ReadBufferRing` slot
+
+    The data will not be overwritten until :meth:`release` is called.
+    Leases can also be used as a context manager which releases the slot
+    on exit.
+
+    Attributes:
+        ring (ReadBufferRing): The ring the slot belongs to
+        index (int): The slot index
+        buffer: The ``ctypes.Array[c_ubyte]`` for the slot
+        data: A zero-copy view of :attr:`buffer`. This will be a
+            :class:`numpy.ndarray` if NumPy is available, otherwise a
+            :class:`memoryview`
+        released (bool): Whether :meth:`release` has been called
+    """
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self.buffer = ring.buffers[index]
+        if has_numpy:
+            self.data = np.ctypeslib.as_array(self.buffer)
+        else:
+            self.data = memoryview(self.buffer).cast('B')
+        self.released = False
+
+    def release(self):
+        """Return the slot to the ring
+
+        The :attr:`data` must not be used after this call.
+        """
+        if self.released:
+            return
+        self.released = True
+        self.ring.release(self.index)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __repr__(self):
+        return '<{self.__class__.__name__} index={self.index} size={size} released={self.released}>'.format(
+            self=self, size=len(self.buffer),
+        )
+
+
+class AsyncReadRing(object):
+    """A bounded ring of preallocated byte buffers between the thread running
+    the ``rtlsdr_read_async`` callbacks and a consumer thread
+
+    The producer (:meth:`put`) only copies the data into the next free slot,
+    so it never waits on the consumer.  If all of the slots are full, the
+    data is dropped and counted in :attr:`overruns`.
+
+    The consumer takes the oldest filled slot with :meth:`get` and returns
+    it to the ring with :meth:`release`.
+
+    Arguments:
+        num_buffers (int): The number of slots in the ring
+        num_bytes (int): The size of each slot
+
+    Attributes:
+        buffers (list): The ``ctypes`` arrays for each slot
+        overruns (int): The number of blocks dropped because the ring was
+            full
+        underruns (int): The number of times the consumer had to wait for
+            data because the ring was empty
+        closed (bool): Whether :meth:`close` has been called
+    """
+
+    def __init__(self, num_buffers, num_bytes):
+        if num_buffers < 1:
+            raise ValueError('num_buffers must be at least 1')
+        self.buffers = [(c_ubyte*num_bytes)() for _ in range(num_buffers)]
+        self.lengths = [0] * num_buffers
+        self.infos = [None] * num_buffers
+        self.read_index = 0
+        self.count = 0
+        self.overruns = 0
+        self.underruns = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def num_buffers(self):
+        """int: The number of slots in the ring"""
+        return len(self.buffers)
+
+    def put(self, raw_buffer, num_bytes, info=None):
+        """Copy a block of data into the next free slot
+
+        Arguments:
+            raw_buffer: The source data (a ``ctypes`` pointer or array)
+            num_bytes (int): The number of bytes to copy
+            info (:obj:`BlockInfo`, optional): Metadata stored with the block
+
+        Returns:
+            bool: False if the block was dropped (the ring is full or closed)
+        """
+        cond = self._cond
+        with cond:
+            if self.closed:
+                return False
+            num_buffers = len(self.buffers)
+            if self.count == num_buffers:
+                self.overruns += 1
+                return False
+            index = (self.read_index + self.count) % num_buffers
+        # the slot is not visible to the consumer until count is increased
+        buffer = self.buffers[index]
+        if len(buffer) < num_bytes:
+            buffer = self.buffers[index] = (c_ubyte*num_bytes)()
+        memmove(buffer, raw_buffer, num_bytes)
+        with cond:
+            self.lengths[index] = num_bytes
+            self.infos[index] = info
+            self.count += 1
+            cond.notify()
+        return True
+
+    def get(self, timeout=None):
+        """Wait for the oldest filled slot
+
+        The slot must be returned with :meth:`release` when its data is no
+        longer needed.
+
+        Arguments:
+            timeout (:obj:`float`, optional): The maximum time to wait in
+                seconds. If None (the default), wait until data is available
+                or the ring is closed
+
+        Returns:
+            tuple: The ``ctypes.Array[c_ubyte]`` with the data and the
+            :class:`BlockInfo` given to :meth:`put`, or None if the ring was
+            closed (or the timeout expired) with no data available
+        """
+        cond = self._cond
+        with cond:
+            if not self.count and not self.closed:
+                self.underruns += 1
+                cond.wait_for(lambda: self.count or self.closed, timeout)
+            if not self.count:
+                return None
+            index = self.read_index
+            buffer = self.buffers[index]
+            num_bytes = self.lengths[index]
+            info = self.infos[index]
+        if num_bytes != len(buffer):
+            buffer = (c_ubyte*num_bytes).from_buffer(buffer)
+        return buffer, info
+
+    def release(self):
+        """Return the slot given by the last call to :meth:`get` to the ring
+        """
+        with self._cond:
+            self.read_index = (self.read_index + 1) % len(self.buffers)
+            self.count -= 1
+
+    def close(self):
+        """Stop accepting data and wake the consumer
+
+        Blocks already in the ring can still be read with :meth:`get`.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class BlockAssembler(object):
+    """Splits or joins the USB transfers of ``rtlsdr_read_async`` into blocks
+    of a fixed size
+
+    Each call to :meth:`feed` passes one transfer.  Complete blocks within
+    the transfer are passed on without copying.  Blocks that span transfers
+    are assembled in a preallocated buffer.
+
+    Arguments:
+        num_bytes (int): The size of the output blocks
+        callback: Called for each block with the signature
+            ``callback(raw_buffer, num_bytes, context)`` (the same as the
+            ``rtlsdr_read_async`` callback), where ``raw_buffer`` is the
+            address of the data
+
+    Attributes:
+        num_pending (int): The number of bytes held for the next block
+    """
+
+    def __init__(self, num_bytes, callback):
+        if num_bytes < 1:
+            raise ValueError('num_bytes must be at least 1')
+        self.num_bytes = num_bytes
+        self.callback = callback
+        self.pending = (c_ubyte*num_bytes)()
+        self.num_pending = 0
+
+    def reset(self):
+        """Discard any partially assembled block"""
+        self.num_pending = 0
+
+    def feed(self, raw_buffer, length, context):
+        """Add a transfer
+
+        Arguments:
+            raw_buffer: The transfer data (a ``ctypes`` pointer or array)
+            length (int): The length of the transfer in bytes
+            context: Passed to the callback
+        """
+        num_bytes = self.num_bytes
+        address = cast(raw_buffer, c_void_p).value
+        offset = 0
+        if self.num_pending:
+            count = min(num_bytes - self.num_pending, length)
+            memmove(addressof(self.pending) + self.num_pending, address, count)
+            self.num_pending += count
+            offset = count
+            if self.num_pending < num_bytes:
+                return
+            self.num_pending = 0
+            self.callback(addressof(self.pending), num_bytes, context)
+        while length - offset >= num_bytes:
+            self.callback(address + offset, num_bytes, context)
+            offset += num_bytes
+        if offset < length:
+            self.num_pending = length - offset
+            memmove(self.pending, address + offset, self.num_pending)
@@ -0,0 +1,477 @@
+"""
+This module contains the converters used to unpack the raw 8-bit interleaved
+I/Q data read from the device into normalized complex samples.
+
+A converter instance is stored in the ``converter`` attribute of
+:class:`~rtlsdr.rtlsdr.BaseRtlSdr` and
+:class:`~rtlsdr.rtlsdrtcp.base.RtlSdrTcpBase` and is used by their
+``packed_bytes_to_iq`` methods (and therefore by all sample reads).
+It can be replaced on an instance to change how samples are produced.
+
+Example:
+    .. code-block:: python
+
+       from rtlsdr import RtlSdr
+       from rtlsdr.conversion import SampleConverter
+
+       sdr = RtlSdr()
+
+       # use the arithmetic converter instead of the default lookup table
+       sdr.converter = SampleConverter()
+
+"""
+
+from __future__ import division
+import sys
+import threading
+import struct
+from array import array
+
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+
+INTEGER_DTYPES = ('int8', 'int16')
+"""Names of the integer output types supported by the converters"""
+
+REAL_DTYPES = ('float32', 'float64')
+"""Names of the real output types supported by the converters (these take
+one branch of each I/Q pair, as used in direct sampling mode)"""
+
+ARRAY_TYPECODES = {
+    'complex64': 'f',
+    'complex128': 'd',
+    'int8': 'b',
+    'int16': 'h',
+    'float32': 'f',
+    'float64': 'd',
+}
+""":mod:`array` typecodes used for each output type if NumPy is not available"""
+
+
+def get_dtype_name(dtype):
+    """Get the name of a data type given as a string or NumPy dtype
+
+    This works without NumPy if ``dtype`` is a string.
+    """
+    if has_numpy:
+        return np.dtype(dtype).name
+    return str(dtype)
+
+
+class SampleConverter(object):
+    """Converts raw interleaved I/Q bytes using arithmetic
+
+    The bytes are widened to floating point, scaled by ``1/127.5`` and offset
+    by ``-(1+1j)`` so the real and imaginary parts are in the range [-1, 1].
+
+    Integer output is also supported for fixed-point processing.  In this case
+    the I/Q values remain interleaved and are produced directly from the bytes:
+
+    * ``'int8'``: The offset is removed (``x - 128``), giving values in the
+      range [-128, 127]
+    * ``'int16'``: The ``'int8'`` values scaled by 256 (``(x - 128) << 8``),
+      giving values in the range [-32768, 32512]
+
+    Real output (one of :data:`REAL_DTYPES`) takes one byte of each I/Q pair
+    (the ``branch`` given to :meth:`convert`), normalized to the range
+    [-1, 1] the same way as the complex values.  This is used in direct
+    sampling mode, where only the I or Q branch carries the ADC samples.
+
+    This is the base class for all converters. Subclasses should override
+    :meth:`_convert_numpy`.
+
+    Attributes:
+        PROCESS_CHUNKS (bool): Whether :meth:`convert` applies its
+            ``process_chunk`` argument to each chunk as it is converted.
+            :class:`~rtlsdr.rtlsdr.BaseRtlSdr` only passes one if this is
+            set by the class overriding :meth:`convert` (or a subclass of
+            it), so converters overriding :meth:`convert` without this
+            argument keep working.
+    """
+
+    PROCESS_CHUNKS = False
+
+    def __call__(self, bytes, dtype=None, out=None):
+        return self.convert(bytes, dtype, out)
+
+    def convert(self, bytes, dtype=None, out=None, process_chunk=None, branch=0):
+        """Unpack a sequence of bytes to a sequence of normalized complex numbers
+
+        Arguments:
+            bytes: The raw interleaved I/Q data
+            dtype (optional): The data type to produce (``'complex64'``,
+                ``'complex128'`` or one of :data:`INTEGER_DTYPES` or
+                :data:`REAL_DTYPES`).  If None, the dtype of ``out`` is used
+                if given, otherwise ``'complex128'``.
+            out (optional): An existing array (or list if NumPy is not
+                available) to write the samples into.  It must have the length
+                given by :meth:`get_output_length` and (for arrays) be
+                C-contiguous.
+            process_chunk (optional): A function applied in place to the
+                complex output as ``process_chunk(chunk, start_index)``.
+                :class:`LUTConverter` calls it for each chunk right after it
+                is converted (while it is still in cache), other converters
+                call it once for the whole output.  Requires NumPy.
+            branch (:obj:`int`, optional): For real types, the byte of each
+                I/Q pair to use: ``0`` for I (the default) or ``1`` for Q
+
+        Returns:
+            The unpacked iq values as a :class:`numpy.ndarray`. If NumPy is
+            not available, an :class:`IQArray` is returned for complex types
+            and an :class:`array.array` for integer and real types.
+            If ``out`` was given, it will be returned.
+        """
+        dtype = self.resolve_dtype(dtype, out)
+        if branch not in (0, 1):
+            raise ValueError('branch must be 0 (I) or 1 (Q)')
+        if not has_numpy:
+            return self._convert_array(bytes, get_dtype_name(dtype), out, branch)
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'c' and dtype.name not in INTEGER_DTYPES + REAL_DTYPES:
+            raise ValueError('dtype "%s" not supported' % (dtype))
+        data = np.ctypeslib.as_array(bytes)
+        if data.dtype != np.uint8:
+            data = data.astype(np.uint8)
+        if out is not None:
+            self._check_out(out, self.get_output_length(data.size, dtype), dtype)
+        if dtype.kind == 'c':
+            if process_chunk is not None:
+                return self._convert_chunks(data, dtype, out, process_chunk)
+            return self._convert_numpy(data, dtype, out)
+        if dtype.kind == 'f':
+            return self._convert_real(data[branch:data.size - data.size % 2:2], dtype, out)
+        return self._convert_integer(data, dtype, out)
+
+    @staticmethod
+    def resolve_dtype(dtype=None, out=None):
+        """Get the data type :meth:`convert` will produce for the given arguments
+
+        Arguments:
+            dtype (optional): The requested data type
+            out (optional): The output array
+
+        Returns:
+            ``dtype`` if given, otherwise the data type of ``out`` or
+            ``'complex128'``
+        """
+        if dtype is not None:
+            return dtype
+        if out is None:
+            return 'complex128'
+        if isinstance(out, IQArray):
+            return 'complex64' if out.data.typecode == 'f' else 'complex128'
+        if isinstance(out, array):
+            return _ARRAY_DTYPES[out.typecode]
+        return out.dtype
+
+    def get_output_length(self, num_bytes, dtype):
+        """Get the number of values produced from ``num_bytes`` raw bytes
+
+        Arguments:
+            num_bytes (int): The number of raw bytes
+            dtype: The output data type
+
+        Returns:
+            int: ``num_bytes`` for integer types (since their output is
+                interleaved), otherwise ``num_bytes // 2``
+        """
+        if get_dtype_name(dtype) in INTEGER_DTYPES:
+            return num_bytes
+        return num_bytes // 2
+
+    def get_bytes_per_sample(self, dtype):
+        """Get the number of raw bytes used for each sample of ``dtype``
+
+        Arguments:
+            dtype: The output data type
+
+        Returns:
+            int: ``2`` (an I/Q byte pair) for all types
+        """
+        return 2
+
+    @staticmethod
+    def _check_out(out, length, dtype):
+        if out.dtype != dtype:
+            raise ValueError('out has dtype "%s", expected "%s"' % (out.dtype, dtype))
+        if out.shape != (length,):
+            raise ValueError('out has shape %r, expected (%d,)' % (out.shape, length))
+        if not out.flags.c_contiguous:
+            raise ValueError('out must be C-contiguous')
+
+    def _convert_numpy(self, data, dtype, out=None):
+        float_dtype = np.dtype('f%d' % (dtype.itemsize // 2))
+        if out is None:
+            iq = data.astype(float_dtype).view(dtype)
+        else:
+            iq = out
+            np.copyto(iq.view(float_dtype), data, casting='unsafe')
+        iq /= 127.5
+        iq -= (1 + 1j)
+        return iq
+
+    def _convert_chunks(self, data, dtype, out, process_chunk):
+        iq = self._convert_numpy(data, dtype, out)
+        process_chunk(iq, 0)
+        return iq
+
+    def _convert_real(self, data, dtype, out=None):
+        # data holds the bytes of one branch
+        if out is None:
+            out = data.astype(dtype)
+        else:
+            np.copyto(out, data, casting='unsafe')
+        out /= 127.5
+        out -= 1
+        return out
+
+    def _convert_integer(self, data, dtype, out=None):
+        if out is None:
+            out = np.empty(data.size, dtype=dtype)
+        if dtype.name == 'int8':
+            # x - 128 is the same as flipping the sign bit
+            np.bitwise_xor(data, 0x80, out=out.view(np.uint8))
+        else:
+            np.subtract(data, 128, out=out, dtype=dtype)
+            np.left_shift(out, 8, out=out)
+        return out
+
+    def _convert_array(self, bytes, dtype_name, out=None, branch=0):
+        typecode = ARRAY_TYPECODES.get(dtype_name)
+        if typecode is None:
+            raise ValueError('dtype "%s" not supported' % (dtype_name))
+        try:
+            data = memoryview(bytes).cast('B')
+        except TypeError:
+            # a sequence of ints (as received by RtlSdrTcpClient)
+            data = memoryview(bytearray(bytes))
+        if dtype_name in REAL_DTYPES:
+            data = data[branch:len(data) - len(data) % 2:2]
+
+        if dtype_name in INTEGER_DTYPES:
+            # translate() removes the offset from every byte in a single call
+            int8_bytes = data.tobytes().translate(_get_array_table('int8'))
+            values = array(typecode)
+            if dtype_name == 'int8':
+                values.frombytes(int8_bytes)
+            else:
+                # the int16 values are the int8 values in the high byte
+                packed = bytearray(len(int8_bytes) * 2)
+                if sys.byteorder == 'little':
+                    packed[1::2] = int8_bytes
+                else:
+                    packed[0::2] = int8_bytes
+                values.frombytes(packed)
+        else:
+            # join the packed value of every byte from a 256 entry table
+            table = _get_array_table(dtype_name)
+            values = array(typecode)
+            values.frombytes(b''.join(map(table.__getitem__, data)))
+
+        if dtype_name in INTEGER_DTYPES or dtype_name in REAL_DTYPES:
+            result = values
+            if out is not None:
+                out[:] = values
+                result = out
+        else:
+            if len(values) % 2:
+                raise ValueError('bytes must contain an even number of values')
+            if out is not None:
+                out.data[:] = values
+                result = out
+            else:
+                result = IQArray(values)
+        return result
+
+
+_ARRAY_DTYPES = {
+    'b': 'int8',
+    'h': 'int16',
+    'f': 'float32',
+    'd': 'float64',
+}
+
+_array_tables = {}
+
+def _get_array_table(dtype_name):
+    """Get the cached table used to convert raw bytes without NumPy
+
+    For ``'int8'`` this is a :meth:`bytes.translate` table, otherwise a list
+    of the 256 packed output values.
+    """
+    table = _array_tables.get(dtype_name)
+    if table is not None:
+        return table
+    if dtype_name in REAL_DTYPES:
+        # the same values as the matching complex type
+        table = _get_array_table('complex64' if dtype_name == 'float32' else 'complex128')
+    elif dtype_name == 'int8':
+        table = bytes(bytearray((i ^ 0x80) for i in range(256)))
+    else:
+        fmt = '=%s' % (ARRAY_TYPECODES[dtype_name])
+        table = [struct.pack(fmt, i/127.5 - 1) for i in range(256)]
+    _array_tables[dtype_name] = table
+    return table
+
+
+class IQArray(object):
+    """A compact sequence of complex samples used if NumPy is not available
+
+    The samples are stored as interleaved I/Q values in an :class:`array.array`
+    of either ``float`` (``'complex64'``) or ``double`` (``'complex128'``),
+    instead of a :class:`list` of :class:`complex` objects.
+
+    Indexing and iteration produce :class:`complex` values, so instances
+    can be used in most places a list of samples would be.
+
+    Arguments:
+        data (array.array): The interleaved I/Q values
+
+    Attributes:
+        data (array.array): The interleaved I/Q values.  This supports the
+            buffer protocol and can be used without copying.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __iter__(self):
+        values = iter(self.data)
+        return map(complex, values, values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return IQArray(self.data[start*2:stop*2])
+            values = array(self.data.typecode)
+            for i in range(start, stop, step):
+                values.extend(self.data[i*2:i*2+2])
+            return IQArray(values)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('IQArray index out of range')
+        return complex(self.data[index*2], self.data[index*2+1])
+
+    def __eq__(self, other):
+        if isinstance(other, IQArray):
+            return self.data == other.data
+        try:
+            if len(self) != len(other):
+                return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def tolist(self):
+        """Get the samples as a :class:`list` of :class:`complex`"""
+        return list(self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.data)
+
+
+class LUTConverter(SampleConverter):
+    """Converts raw interleaved I/Q bytes using a lookup table
+
+    Each I/Q byte pair is viewed as a single ``uint16`` and used to index a
+    65536 entry table of complex values, producing the normalized output in
+    a single gather (instead of the three passes used by
+    :class:`SampleConverter`).  Real output uses a 256 entry table indexed
+    by each byte.
+
+    The tables are built once for each data type and cached for all instances.
+
+    Attributes:
+        CHUNK_SIZE (int): When converting into an existing array, the number of
+            samples gathered at a time using a reusable (per-thread) index
+            buffer.  This avoids allocating a temporary index array the size
+            of the whole block.  A ``process_chunk`` function given to
+            :meth:`~SampleConverter.convert` is applied to each of these
+            chunks.
+    """
+
+    CHUNK_SIZE = 8192
+    PROCESS_CHUNKS = True
+
+    _lut_cache = {}
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @classmethod
+    def get_lut(cls, dtype):
+        """Get the lookup table for the given complex or real data type
+
+        The table is built by :meth:`build_lut` on first use.
+        """
+        dtype = np.dtype(dtype)
+        lut = cls._lut_cache.get(dtype)
+        if lut is None:
+            lut = cls._lut_cache[dtype] = cls.build_lut(dtype)
+        return lut
+
+    @classmethod
+    def build_lut(cls, dtype):
+        """Build a lookup table indexed by the native ``uint16`` view of an
+        I/Q byte pair (or by each byte for real data types)
+
+        The table values are computed using the arithmetic of
+        :class:`SampleConverter`, so both produce identical results.
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'f':
+            return SampleConverter()._convert_real(np.arange(256, dtype=np.uint8), dtype)
+
+        # every possible uint16 as laid out in memory (so the table is
+        # correct regardless of byte order)
+        pairs = np.arange(65536, dtype=np.uint16).view(np.uint8)
+        return SampleConverter()._convert_numpy(pairs, dtype)
+
+    def _convert_numpy(self, data, dtype, out=None):
+        if data.size % 2:
+            return super(LUTConverter, self)._convert_numpy(data, dtype, out)
+        data = np.ascontiguousarray(data)
+        return self._take(self.get_lut(dtype), data.view(np.uint16), out)
+
+    def _convert_chunks(self, data, dtype, out, process_chunk):
+        if data.size % 2:
+            return super(LUTConverter, self)._convert_chunks(data, dtype, out, process_chunk)
+        if out is None:
+            out = np.empty(data.size // 2, dtype=dtype)
+        data = np.ascontiguousarray(data)
+        return self._take(self.get_lut(dtype), data.view(np.uint16), out, process_chunk)
+
+    def _convert_real(self, data, dtype, out=None):
+        return self._take(self.get_lut(dtype), data, out)
+
+    def _take(self, lut, indices, out=None, process_chunk=None):
+        if out is None:
+            return np.take(lut, indices, mode='clip')
+
+        chunk_size = self.CHUNK_SIZE
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            scratch = self._local.scratch = np.empty(chunk_size, dtype=np.intp)
+        for start_index in range(0, indices.size, chunk_size):
+            end_index = min(start_index + chunk_size, indices.size)
+            chunk_indices = scratch[:end_index - start_index]
+            chunk_indices[...] = indices[start_index:end_index]
+            chunk = out[start_index:end_index]
+            np.take(lut, chunk_indices, out=chunk, mode='clip')
+            if process_chunk is not None:
+                process_chunk(chunk, start_index)
+        return out
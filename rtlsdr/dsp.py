@@ -0,0 +1,1138 @@
+"""
+This module contains signal processing stages that operate on streamed blocks
+of samples.
+
+Each stage is a subclass of :class:`Stage`.  Stages keep their state between
+calls to :meth:`~Stage.process`, so a continuous stream of samples can be
+processed block by block (as delivered by
+:meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async` or
+:meth:`~rtlsdr.rtlsdraio.RtlSdrAio.stream`) with the same results as if it
+were processed at once.
+
+Notes:
+    All stages require NumPy.  :class:`Squelch` does not.
+"""
+
+from __future__ import division
+import math
+from fractions import Fraction
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+
+class Stage(object):
+    """Base class for all processing stages
+
+    Subclasses must implement :meth:`process` and :meth:`reset` (if they
+    have state).  Calling a stage instance is the same as calling
+    :meth:`process`.
+    """
+
+    def __init__(self):
+        if not has_numpy:
+            raise ImportError('%s requires NumPy' % (self.__class__.__name__))
+
+    def process(self, samples):
+        """Process a block of samples
+
+        Arguments:
+            samples (numpy.ndarray): The input block
+
+        Returns:
+            numpy.ndarray: The output block.  Stages that operate in place
+            return ``samples`` itself.
+        """
+        raise NotImplementedError()
+
+    def reset(self):
+        """Clear any state carried across blocks"""
+        pass
+
+    def __call__(self, samples):
+        return self.process(samples)
+
+
+class IQCorrector(Stage):
+    """Streaming DC offset and I/Q imbalance correction
+
+    The RTL2832 produces a strong DC spike along with gain and phase
+    mismatches between its I and Q branches.  This stage estimates them from
+    each block and corrects the samples in place.
+
+    The estimates are averaged across blocks using an exponential moving
+    average with the smoothing factor ``alpha``.  The imbalance is estimated
+    from the second order statistics of the (DC removed) I and Q components:
+
+    * Gain ratio: ``g = sqrt(E[Q**2] / E[I**2])``
+    * Phase error: ``sin(phi) = E[I*Q] / sqrt(E[I**2] * E[Q**2])``
+
+    and corrected by ``Q' = (Q / g - I * sin(phi)) / cos(phi)``.
+
+    Arguments:
+        alpha (:obj:`float`, optional): The smoothing factor (between 0 and 1)
+            applied to the estimates for every block. A value of 1 will only
+            use the current block.  Default is ``0.05``
+        dc_correction (:obj:`bool`, optional): Enable DC offset removal.
+            Default is True
+        imbalance_correction (:obj:`bool`, optional): Enable I/Q imbalance
+            correction. Default is True
+
+    Attributes:
+        dc_offset (complex): The current DC offset estimate
+        gain_ratio (float): The current Q/I gain ratio estimate
+        phase_error (float): The current phase error estimate (in radians)
+    """
+
+    MAX_PHASE_ERROR = np.pi / 4 if has_numpy else None
+    """Phase error estimates beyond this value (in radians) are assumed to be
+    caused by the signal itself rather than the hardware and are not corrected
+    """
+
+    def __init__(self, alpha=0.05, dc_correction=True, imbalance_correction=True):
+        super(IQCorrector, self).__init__()
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha must be in the range (0, 1]')
+        self.alpha = alpha
+        self.dc_correction = dc_correction
+        self.imbalance_correction = imbalance_correction
+        self._scratch = None
+        self.reset()
+
+    def reset(self):
+        self.dc_offset = 0j
+        self.gain_ratio = 1.
+        self.phase_error = 0.
+        self._dc_estimate = None
+        self._power_i = None
+        self._power_q = None
+        self._cross_iq = None
+
+    def _average(self, prev, value):
+        if prev is None:
+            return value
+        return prev + self.alpha * (value - prev)
+
+    def process(self, samples):
+        """Correct a block of complex samples in place
+
+        Arguments:
+            samples (numpy.ndarray): A block of complex samples
+
+        Returns:
+            numpy.ndarray: ``samples``
+        """
+        if not len(samples):
+            return samples
+        if self.dc_correction:
+            self._dc_estimate = self._average(self._dc_estimate, complex(samples.mean()))
+            self.dc_offset = self._dc_estimate
+            samples -= samples.dtype.type(self.dc_offset)
+        if self.imbalance_correction:
+            self._correct_imbalance(samples)
+        return samples
+
+    def _correct_imbalance(self, samples):
+        i_values = samples.real
+        q_values = samples.imag
+        n = len(samples)
+        self._power_i = self._average(self._power_i, float(np.dot(i_values, i_values)) / n)
+        self._power_q = self._average(self._power_q, float(np.dot(q_values, q_values)) / n)
+        self._cross_iq = self._average(self._cross_iq, float(np.dot(i_values, q_values)) / n)
+        if self._power_i <= 0 or self._power_q <= 0:
+            return
+
+        self.gain_ratio = np.sqrt(self._power_q / self._power_i)
+        sin_phi = self._cross_iq / np.sqrt(self._power_i * self._power_q)
+        self.phase_error = np.arcsin(np.clip(sin_phi, -1, 1))
+        if abs(self.phase_error) > self.MAX_PHASE_ERROR:
+            return
+        cos_phi = np.cos(self.phase_error)
+
+        scratch = self._scratch
+        if scratch is None or scratch.shape != i_values.shape or scratch.dtype != i_values.dtype:
+            scratch = self._scratch = np.empty_like(i_values)
+
+        # Q' = Q / (g * cos(phi)) - I * tan(phi)
+        np.multiply(i_values, np.tan(self.phase_error), out=scratch)
+        q_values *= 1 / (self.gain_ratio * cos_phi)
+        q_values -= scratch
+
+
+def design_lowpass(cutoff, num_taps):
+    """Design a lowpass FIR filter using a Hamming windowed sinc
+
+    Arguments:
+        cutoff (float): The cutoff frequency as a fraction of the sample
+            rate (between 0 and 0.5)
+        num_taps (int): The number of filter taps
+
+    Returns:
+        numpy.ndarray: The filter taps (normalized for unity gain at DC)
+    """
+    if not has_numpy:
+        raise ImportError('design_lowpass requires NumPy')
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+    return taps / taps.sum()
+
+
+class _StreamingFIR(Stage):
+    """Common state handling for the FIR based stages
+
+    The last ``num_history`` input samples are kept and prepended to the
+    next block, so the filter output is continuous across blocks.
+    """
+
+    def __init__(self):
+        super(_StreamingFIR, self).__init__()
+        self._typed_taps = {}
+        self._extended = None
+        self._scratch = None
+        self._history = None
+
+    def _get_typed(self, name, dtype):
+        """Get a copy of the ``name`` attribute (the taps) as ``dtype``
+        """
+        key = (name, dtype)
+        typed = self._typed_taps.get(key)
+        if typed is None:
+            typed = self._typed_taps[key] = getattr(self, name).astype(dtype)
+        return typed
+
+    def _get_buffer(self, name, shape, dtype):
+        if not isinstance(shape, tuple):
+            shape = (shape,)
+        buf = getattr(self, name, None)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            setattr(self, name, buf)
+        return buf
+
+    def _extend(self, samples, num_history):
+        """Get the history followed by ``samples`` (and store the new history)
+        """
+        num_samples = len(samples)
+        extended = self._get_buffer('_extended', num_history + num_samples, samples.dtype)
+        if self._history is None:
+            extended[:num_history] = 0
+        else:
+            extended[:num_history] = self._history
+        extended[num_history:] = samples
+        if num_history:
+            self._history = extended[num_samples:]
+        return extended
+
+    def _check_out(self, out, num_out, dtype):
+        if out is None:
+            return np.empty(num_out, dtype=dtype)
+        if len(out) != num_out:
+            raise ValueError('out has length %d, expected %d' % (len(out), num_out))
+        return out
+
+    def _accumulate(self, extended, taps, start_index, step, out):
+        """Compute ``out[n] = sum(taps[k] * extended[start_index + n*step - k])``
+
+        This loops over the taps with vectorized operations on strided
+        views, so no windowed copy of the input is needed.
+        """
+        num_out = len(out)
+        if not num_out:
+            return
+        scratch = self._get_buffer('_scratch', num_out, out.dtype)
+        span = (num_out - 1) * step + 1
+        for k, tap in enumerate(taps):
+            view = extended[start_index - k:start_index - k + span:step]
+            if k == 0:
+                np.multiply(view, tap, out=out)
+            else:
+                np.multiply(view, tap, out=scratch)
+                out += scratch
+
+
+class Decimator(_StreamingFIR):
+    """Streaming FIR decimation by an integer factor
+
+    Only every ``factor``-th output of the filter is computed (a polyphase
+    decomposition of the FIR), so the cost is proportional to the decimated
+    rate.  The filter history and the position of the next output are
+    carried across blocks, so the output is continuous regardless of the
+    block size.
+
+    Arguments:
+        factor (int): The decimation factor
+        taps (optional): The FIR filter taps.  If not given, a lowpass
+            filter is designed with :func:`design_lowpass` with a cutoff at
+            the output Nyquist frequency
+        num_taps (:obj:`int`, optional): The number of taps to design if
+            ``taps`` is not given.  Defaults to ``8 * factor + 1``
+
+    Attributes:
+        taps (numpy.ndarray): The filter taps
+    """
+
+    def __init__(self, factor, taps=None, num_taps=None):
+        super(Decimator, self).__init__()
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError('factor must be at least 1')
+        self.factor = factor
+        if taps is None:
+            if num_taps is None:
+                num_taps = 8 * factor + 1
+            taps = design_lowpass(0.5 / factor, num_taps)
+        self.taps = np.asarray(taps, dtype=np.float64)
+        if self.taps.ndim != 1 or not self.taps.size:
+            raise ValueError('taps must be a non-empty sequence')
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        self._offset = 0
+
+    def get_output_length(self, num_samples):
+        """Get the number of samples produced by the next call to
+        :meth:`process` for a block of ``num_samples``
+
+        Arguments:
+            num_samples (int):
+
+        Returns:
+            int:
+        """
+        if num_samples <= self._offset:
+            return 0
+        return (num_samples - self._offset + self.factor - 1) // self.factor
+
+    def process(self, samples, out=None):
+        """Filter and decimate a block of samples
+
+        Arguments:
+            samples (numpy.ndarray): The input block
+            out (optional): An existing array to write the output into.  It
+                must have the length given by :meth:`get_output_length`
+
+        Returns:
+            numpy.ndarray: The decimated samples
+        """
+        num_samples = len(samples)
+        num_history = self.taps.size - 1
+        offset = self._offset
+        num_out = self.get_output_length(num_samples)
+        out = self._check_out(out, num_out, samples.dtype)
+
+        extended = self._extend(samples, num_history)
+        taps = self._get_typed('taps', out.real.dtype)
+        self._accumulate(extended, taps, offset + num_history, self.factor, out)
+
+        self._offset = offset + num_out * self.factor - num_samples
+        return out
+
+
+class FrequencyShifter(Stage):
+    """Phase continuous frequency shift (a numerically controlled oscillator)
+
+    Blocks are multiplied in place by ``exp(2j * pi * frequency * n / sample_rate)``.
+    The phasor table for a block length is computed once and cached, and the
+    phase is carried across blocks so there are no discontinuities at the
+    block boundaries.
+
+    Arguments:
+        frequency (float): The frequency shift in Hz.  To move a signal at
+            ``center_freq + offset`` to zero, use ``-offset``
+        sample_rate (float): The sample rate in Hz
+
+    Attributes:
+        CHUNK_SIZE (int): The number of samples rotated at a time, so the
+            scaled phasors stay in cache while the block is multiplied
+        MAX_TABLES (int): The maximum number of cached phasor tables (one for
+            each block length and data type)
+    """
+
+    CHUNK_SIZE = 8192
+    MAX_TABLES = 8
+
+    def __init__(self, frequency, sample_rate):
+        super(FrequencyShifter, self).__init__()
+        self._frequency = float(frequency)
+        self._sample_rate = float(sample_rate)
+        self._tables = {}
+        self._scratch = None
+        self.reset()
+
+    @property
+    def frequency(self):
+        """float: The frequency shift in Hz"""
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, value):
+        self._frequency = float(value)
+        self._tables.clear()
+
+    @property
+    def sample_rate(self):
+        """float: The sample rate in Hz"""
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        self._sample_rate = float(value)
+        self._tables.clear()
+
+    def reset(self):
+        self.phase = 0.
+
+    def _get_table(self, num_samples, dtype):
+        key = (num_samples, dtype)
+        table = self._tables.get(key)
+        if table is None:
+            step = 2 * np.pi * self._frequency / self._sample_rate
+            table = np.exp(1j * step * np.arange(num_samples)).astype(dtype)
+            if len(self._tables) >= self.MAX_TABLES:
+                self._tables.clear()
+            self._tables[key] = table
+        return table
+
+    def get_chunk_processor(self, num_samples, dtype):
+        """Get a function shifting one block of complex samples in chunks
+
+        This lets the shift be applied to each chunk of a block as it is
+        produced (see the ``process_chunk`` argument of
+        :meth:`~rtlsdr.conversion.SampleConverter.convert`), instead of in a
+        separate pass over the block.  The phase is advanced past the block
+        by this call, so the returned function must be applied to every
+        sample of the block.
+
+        Arguments:
+            num_samples (int): The length of the block
+            dtype: The complex data type of the block
+
+        Returns:
+            A function called as ``process_chunk(chunk, start_index)`` which
+            shifts ``chunk`` (the samples of the block starting at
+            ``start_index``) in place, or None if no shift is needed
+        """
+        if not num_samples or self._frequency == 0:
+            return None
+        dtype = np.dtype(dtype)
+        table = self._get_table(num_samples, dtype)
+        rotation = dtype.type(np.exp(1j * self.phase))
+        step = 2 * np.pi * self._frequency / self._sample_rate
+        self.phase = (self.phase + step * num_samples) % (2 * np.pi)
+
+        scratch = self._scratch
+        if scratch is None or scratch.dtype != dtype:
+            scratch = self._scratch = np.empty(self.CHUNK_SIZE, dtype=dtype)
+
+        def process_chunk(chunk, start_index):
+            chunk_size = len(scratch)
+            for offset in range(0, len(chunk), chunk_size):
+                end_offset = min(offset + chunk_size, len(chunk))
+                chunk_phasors = scratch[:end_offset - offset]
+                table_index = start_index + offset
+                np.multiply(
+                    table[table_index:table_index + len(chunk_phasors)], rotation,
+                    out=chunk_phasors,
+                )
+                chunk[offset:end_offset] *= chunk_phasors
+        return process_chunk
+
+    def process(self, samples):
+        """Shift a block of complex samples in place
+
+        Arguments:
+            samples (numpy.ndarray): A block of complex samples
+
+        Returns:
+            numpy.ndarray: ``samples``
+        """
+        process_chunk = self.get_chunk_processor(len(samples), samples.dtype)
+        if process_chunk is not None:
+            process_chunk(samples, 0)
+        return samples
+
+
+class Resampler(_StreamingFIR):
+    """Streaming rational resampler using a polyphase filter bank
+
+    The ratio ``out_rate / in_rate`` is approximated by a fraction
+    ``up / down`` (with a denominator of at most :attr:`MAX_DENOMINATOR`).
+    Each output sample is computed from a single branch of the filter bank,
+    so the cost is proportional to the output rate.
+
+    The filter banks are cached for each ``(in_rate, out_rate)`` and shared
+    by all instances.  The filter history and the position of the next output
+    are carried across blocks, so the output is continuous regardless of the
+    block size.
+
+    Arguments:
+        in_rate (float): The input sample rate
+        out_rate (float): The output sample rate
+        taps_per_phase (:obj:`int`, optional): The number of taps in each
+            branch of the filter bank.  Defaults to
+            ``8 * max(up, down) // up + 1``
+
+    Attributes:
+        up (int): The interpolation factor
+        down (int): The decimation factor
+        bank (numpy.ndarray): The filter bank with shape
+            ``(up, taps_per_phase)``
+        MAX_DENOMINATOR (int): The limit used to approximate the ratio
+    """
+
+    MAX_DENOMINATOR = 1000
+
+    _bank_cache = {}
+
+    def __init__(self, in_rate, out_rate, taps_per_phase=None):
+        super(Resampler, self).__init__()
+        self.in_rate = float(in_rate)
+        self.out_rate = float(out_rate)
+        self.up, self.down = self.get_ratio(in_rate, out_rate)
+        self.bank = self.get_filter_bank(in_rate, out_rate, taps_per_phase)
+        self.reset()
+
+    @classmethod
+    def get_ratio(cls, in_rate, out_rate):
+        """Get the ``(up, down)`` factors used for the given rates
+
+        Returns:
+            tuple(int, int):
+        """
+        if in_rate <= 0 or out_rate <= 0:
+            raise ValueError('Sample rates must be positive')
+        ratio = Fraction(float(out_rate) / float(in_rate)).limit_denominator(cls.MAX_DENOMINATOR)
+        if ratio == 0:
+            raise ValueError('Resampling ratio is too small')
+        return ratio.numerator, ratio.denominator
+
+    @classmethod
+    def get_filter_bank(cls, in_rate, out_rate, taps_per_phase=None):
+        """Get the cached filter bank for the given rates
+
+        The bank is built by :meth:`build_filter_bank` on first use.
+        """
+        key = (float(in_rate), float(out_rate), taps_per_phase)
+        bank = cls._bank_cache.get(key)
+        if bank is None:
+            up, down = cls.get_ratio(in_rate, out_rate)
+            bank = cls._bank_cache[key] = cls.build_filter_bank(up, down, taps_per_phase)
+        return bank
+
+    @classmethod
+    def build_filter_bank(cls, up, down, taps_per_phase=None):
+        """Design a lowpass prototype filter and split it into ``up`` branches
+
+        Branch ``p`` holds the taps ``h[p::up]`` (scaled by ``up`` to keep
+        unity gain).
+        """
+        if taps_per_phase is None:
+            taps_per_phase = 8 * max(up, down) // up + 1
+        taps = design_lowpass(0.5 / max(up, down), up * taps_per_phase) * up
+        return taps.reshape(taps_per_phase, up).T.copy()
+
+    @property
+    def actual_out_rate(self):
+        """float: The output rate given by the approximated ratio"""
+        return self.in_rate * self.up / self.down
+
+    def reset(self):
+        self._history = None
+        self._offset = 0
+
+    def get_output_length(self, num_samples):
+        """Get the number of samples produced by the next call to
+        :meth:`process` for a block of ``num_samples``
+
+        Arguments:
+            num_samples (int):
+
+        Returns:
+            int:
+        """
+        remaining = num_samples * self.up - self._offset
+        if remaining <= 0:
+            return 0
+        return (remaining + self.down - 1) // self.down
+
+    def process(self, samples, out=None):
+        """Resample a block of samples
+
+        Arguments:
+            samples (numpy.ndarray): The input block
+            out (optional): An existing array to write the output into.  It
+                must have the length given by :meth:`get_output_length`
+
+        Returns:
+            numpy.ndarray: The resampled samples
+        """
+        up, down = self.up, self.down
+        num_samples = len(samples)
+        num_history = self.bank.shape[1] - 1
+        offset = self._offset
+        num_out = self.get_output_length(num_samples)
+        out = self._check_out(out, num_out, samples.dtype)
+
+        extended = self._extend(samples, num_history)
+        bank = self._get_typed('bank', out.real.dtype)
+
+        # output n is at position offset + n*down of the upsampled input.
+        # outputs n, n+up, n+2*up, ... all use the same branch and are
+        # spaced by ``down`` input samples
+        for n in range(min(up, num_out)):
+            position = offset + n * down
+            self._accumulate(
+                extended, bank[position % up], num_history + position // up,
+                down, out[n::up],
+            )
+
+        self._offset = offset + num_out * down - num_samples * up
+        return out
+
+
+class Channelizer(_StreamingFIR):
+    """Polyphase filter bank channelizer
+
+    Splits the input into ``num_channels`` uniformly spaced channels, each
+    decimated by ``num_channels`` (critically sampled).  Channel ``k`` is
+    centered at ``k * sample_rate / num_channels`` (channels above
+    ``num_channels // 2`` are the negative frequencies, as ordered by
+    :func:`numpy.fft.fftfreq`).  Negative channel numbers may also be used.
+
+    The output is the same as shifting each channel to zero, lowpass
+    filtering and decimating, but all channels are produced by the
+    polyphase branches of one prototype filter followed by a single FFT for
+    each output sample.  The filter history is carried across blocks.
+
+    Channels can be subscribed to with :meth:`subscribe`, whose callbacks
+    are called by :meth:`process` with the samples of each channel.  A
+    channelizer instance can be used directly as the callback for
+    :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async` (see also
+    :meth:`~rtlsdr.rtlsdraio.RtlSdrAio.stream_channels`).
+
+    Arguments:
+        num_channels (int): The number of channels
+        taps_per_channel (:obj:`int`, optional): The number of taps in each
+            polyphase branch if ``taps`` is not given.  Default is ``16``
+        taps (optional): The prototype lowpass filter.  If not given, one is
+            designed with :func:`design_lowpass` with a cutoff at half the
+            channel spacing.  It is zero padded to a multiple of
+            ``num_channels``
+
+    Attributes:
+        bank (numpy.ndarray): The prototype filter arranged with shape
+            ``(taps_per_channel, num_channels)``
+    """
+
+    def __init__(self, num_channels, taps_per_channel=16, taps=None):
+        super(Channelizer, self).__init__()
+        num_channels = int(num_channels)
+        if num_channels < 1:
+            raise ValueError('num_channels must be at least 1')
+        self.num_channels = num_channels
+        if taps is None:
+            taps = design_lowpass(0.5 / num_channels, num_channels * taps_per_channel)
+        taps = np.asarray(taps, dtype=np.float64)
+        num_branch_taps = -(-taps.size // num_channels)
+        padded = np.zeros(num_branch_taps * num_channels)
+        padded[:taps.size] = taps
+        self.bank = padded.reshape(num_branch_taps, num_channels)
+        self._subscribers = {}
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        self._offset = 0
+
+    def get_channel_frequency(self, channel, sample_rate=1.):
+        """Get the center frequency of a channel relative to the input
+
+        Arguments:
+            channel (int): The channel number
+            sample_rate (:obj:`float`, optional): The input sample rate
+
+        Returns:
+            float:
+        """
+        channel %= self.num_channels
+        if channel >= (self.num_channels + 1) // 2:
+            channel -= self.num_channels
+        return channel * sample_rate / self.num_channels
+
+    def subscribe(self, channel, callback):
+        """Add a callback for the samples of a channel
+
+        The callback is called by :meth:`process` with the signature::
+
+            callback(samples, channel)
+
+        Arguments:
+            channel (int): The channel number
+            callback: The function to call
+        """
+        channel %= self.num_channels
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def unsubscribe(self, channel, callback):
+        """Remove a callback added by :meth:`subscribe`
+        """
+        channel %= self.num_channels
+        callbacks = self._subscribers.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self._subscribers.pop(channel, None)
+
+    @property
+    def channels(self):
+        """list: The channel numbers with subscribers"""
+        return sorted(self._subscribers.keys())
+
+    def get_output_length(self, num_samples):
+        """Get the number of samples per channel produced by the next call to
+        :meth:`process` for a block of ``num_samples``
+
+        Arguments:
+            num_samples (int):
+
+        Returns:
+            int:
+        """
+        if num_samples <= self._offset:
+            return 0
+        return (num_samples - self._offset + self.num_channels - 1) // self.num_channels
+
+    def process(self, samples, out=None):
+        """Channelize a block of samples
+
+        Arguments:
+            samples (numpy.ndarray): The input block
+            out (optional): An existing array with the shape
+                ``(get_output_length(len(samples)), num_channels)`` to write
+                the output into
+
+        Returns:
+            numpy.ndarray: The channel samples with one column per channel
+        """
+        num_channels = self.num_channels
+        num_samples = len(samples)
+        num_branch_taps = self.bank.shape[0]
+        num_history = num_branch_taps * num_channels - 1
+        offset = self._offset
+        num_out = self.get_output_length(num_samples)
+        dtype = np.result_type(samples.dtype, np.complex64)
+        if out is not None and out.shape != (num_out, num_channels):
+            raise ValueError('out has shape %r, expected %r' % (out.shape, (num_out, num_channels)))
+
+        extended = self._extend(samples.astype(dtype, copy=False), num_history)
+        bank = self._get_typed('bank', extended.real.dtype)
+
+        # branch p of output n is sum(bank[q, p] * x[(n - q)*M - p]),
+        # built from views with the branches in reverse memory order
+        branches = self._get_buffer('_branches', (num_out, num_channels), dtype)
+        scratch = self._get_buffer('_scratch', (num_out, num_channels), dtype)
+        itemsize = extended.itemsize
+        for q in range(num_branch_taps):
+            base_index = num_history + offset - q * num_channels
+            view = np.lib.stride_tricks.as_strided(
+                extended[base_index:], shape=(num_out, num_channels),
+                strides=(num_channels * itemsize, -itemsize), writeable=False,
+            )
+            if q == 0:
+                np.multiply(view, bank[q], out=branches)
+            else:
+                np.multiply(view, bank[q], out=scratch)
+                branches += scratch
+
+        # an unscaled inverse FFT across the branches gives every channel
+        result = np.fft.ifft(branches, axis=1, norm='forward')
+        if out is not None:
+            out[...] = result
+            result = out
+
+        self._offset = offset + num_out * num_channels - num_samples
+
+        for channel, callbacks in list(self._subscribers.items()):
+            channel_samples = np.ascontiguousarray(result[:, channel])
+            for callback in callbacks:
+                callback(channel_samples, channel)
+        return result
+
+    def __call__(self, samples, context=None):
+        return self.process(samples)
+
+
+class BlockPower(object):
+    """The power of a block of raw samples, as measured by :class:`Squelch`
+
+    These are passed to the :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`
+    callback in place of quiet blocks if requested.
+
+    Attributes:
+        power (float): The mean power of the normalized I/Q values
+        power_db (float): :attr:`power` in dB relative to full scale
+        num_bytes (int): The size of the raw block
+    """
+
+    __slots__ = ('power', 'power_db', 'num_bytes')
+
+    def __init__(self, power, power_db, num_bytes):
+        self.power = power
+        self.power_db = power_db
+        self.num_bytes = num_bytes
+
+    def __repr__(self):
+        return '<{self.__class__.__name__} power_db={self.power_db:.1f} num_bytes={self.num_bytes}>'.format(
+            self=self,
+        )
+
+
+class Squelch(object):
+    """Energy squelch with hysteresis computed on the raw 8-bit data
+
+    The block power is computed from a histogram of the raw byte values and
+    a 256 entry table of their squared deviation from the midpoint, so it is
+    measured before (and without) converting the samples.
+
+    The squelch opens when the power reaches ``threshold`` and closes when
+    it drops below ``threshold - hysteresis``.
+
+    Arguments:
+        threshold (float): The opening level in dB relative to full scale
+            (the power of the normalized I and Q values)
+        hysteresis (:obj:`float`, optional): The closing level below
+            ``threshold`` in dB.  Default is ``3``
+        quiet_blocks (:obj:`str`, optional): What
+            :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async` does with blocks
+            while the squelch is closed: ``'skip'`` (the default) drops them,
+            ``'power'`` passes a :class:`BlockPower` to the callback instead
+            of the samples
+
+    Attributes:
+        is_open (bool): The current squelch state
+        last_power (BlockPower): The measurement of the last block
+    """
+
+    def __init__(self, threshold, hysteresis=3., quiet_blocks='skip'):
+        if quiet_blocks not in ('skip', 'power'):
+            raise ValueError('quiet_blocks must be "skip" or "power"')
+        if hysteresis < 0:
+            raise ValueError('hysteresis must not be negative')
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.quiet_blocks = quiet_blocks
+        self.is_open = False
+        self.last_power = None
+        self._table = [((i - 127.5) / 127.5) ** 2 for i in range(256)]
+        if has_numpy:
+            self._table = np.array(self._table)
+
+    def measure(self, data):
+        """Measure the power of a block of raw bytes
+
+        Arguments:
+            data: The raw bytes (any object supporting the buffer protocol)
+
+        Returns:
+            BlockPower:
+        """
+        if has_numpy:
+            values = np.frombuffer(data, dtype=np.uint8)
+            num_bytes = values.size
+            total = float(np.bincount(values, minlength=256).dot(self._table))
+        else:
+            values = memoryview(data).cast('B')
+            num_bytes = len(values)
+            total = sum(map(self._table.__getitem__, values))
+        power = total / num_bytes if num_bytes else 0.
+        power_db = 10 * math.log10(power) if power > 0 else -math.inf
+        return BlockPower(power, power_db, num_bytes)
+
+    def update(self, data):
+        """Measure a block and update the squelch state
+
+        Arguments:
+            data: The raw bytes
+
+        Returns:
+            bool: :attr:`is_open`
+        """
+        block_power = self.last_power = self.measure(data)
+        if self.is_open:
+            self.is_open = block_power.power_db >= self.threshold - self.hysteresis
+        else:
+            self.is_open = block_power.power_db >= self.threshold
+        return self.is_open
+
+    def reset(self):
+        self.is_open = False
+        self.last_power = None
+
+
+class Deemphasis(Stage):
+    """Single pole lowpass (de-emphasis) filter for real samples
+
+    Computes ``y[n] = alpha * x[n] + (1 - alpha) * y[n-1]`` with
+    ``alpha = 1 - exp(-1 / (sample_rate * time_constant))``.  The last output
+    is carried across blocks.
+
+    The recursion is evaluated with vectorized operations: the block is
+    split into chunks short enough to use the closed form of the recursion
+    without loss of precision, and the chunk boundary values are combined by
+    a short geometric sum.
+
+    Arguments:
+        sample_rate (float): The sample rate in Hz
+        time_constant (:obj:`float`, optional): The filter time constant in
+            seconds. Default is ``75e-6`` (``50e-6`` is used outside of the
+            Americas and South Korea)
+    """
+
+    MAX_GAIN = 16.
+    """The largest factor the chunked closed form may scale values by"""
+
+    def __init__(self, sample_rate, time_constant=75e-6):
+        super(Deemphasis, self).__init__()
+        self.sample_rate = float(sample_rate)
+        self.time_constant = float(time_constant)
+        self.alpha = -np.expm1(-1 / (self.sample_rate * self.time_constant))
+        self._powers = {}
+        self.reset()
+
+    def reset(self, initial=0.):
+        """Clear the state carried across blocks
+
+        Arguments:
+            initial (:obj:`float`, optional): The previous output assumed
+                for the next block.  Default is ``0``
+        """
+        self._last = float(initial)
+
+    def _get_powers(self, dtype):
+        powers = self._powers.get(dtype)
+        if powers is not None:
+            return powers
+        decay = 1 - self.alpha
+        if decay > 0:
+            chunk_size = int(np.log(self.MAX_GAIN) / -np.log(decay))
+        else:
+            chunk_size = 1
+        chunk_size = min(max(chunk_size, 1), 4096)
+        n = np.arange(chunk_size)
+        # decay ** -n (for the cumulative sum) and decay ** (n + 1) (for
+        # the contribution of the previous chunk)
+        powers = (
+            chunk_size,
+            (decay ** -n.astype(np.float64)).astype(dtype) if decay > 0 else None,
+            (decay ** (n + 1.)).astype(dtype),
+        )
+        self._powers[dtype] = powers
+        return powers
+
+    def process(self, samples):
+        """Filter a block of real samples in place
+
+        Arguments:
+            samples (numpy.ndarray): A block of real samples
+
+        Returns:
+            numpy.ndarray: ``samples``
+        """
+        num_samples = len(samples)
+        if not num_samples:
+            return samples
+        alpha = self.alpha
+        decay = 1 - alpha
+        chunk_size, inv_powers, powers = self._get_powers(samples.dtype)
+        if decay <= 0:
+            self._last = float(samples[-1])
+            return samples
+
+        num_full = num_samples // chunk_size * chunk_size
+        if num_full:
+            chunks = samples[:num_full].reshape(-1, chunk_size)
+            # zero state response of each chunk
+            chunks *= inv_powers
+            np.cumsum(chunks, axis=1, out=chunks)
+            chunks *= powers / decay * alpha
+
+            # output at the end of each chunk including the previous chunks
+            chunk_decay = decay ** chunk_size
+            ends = chunks[:, -1].astype(np.float64)
+            num_chunks = len(ends)
+            carry = ends.copy()
+            weight = chunk_decay
+            shift = 1
+            while shift < num_chunks and weight > 1e-17:
+                carry[shift:] += weight * ends[:-shift]
+                weight *= chunk_decay
+                shift += 1
+            carry += self._last * chunk_decay ** np.arange(1, num_chunks + 1)
+
+            # add the decayed output of the previous chunk to each chunk
+            prev_ends = np.empty(num_chunks, dtype=np.float64)
+            prev_ends[0] = self._last
+            prev_ends[1:] = carry[:-1]
+            chunks += np.multiply.outer(prev_ends.astype(samples.dtype), powers)
+            self._last = float(carry[-1])
+
+        num_remaining = num_samples - num_full
+        if num_remaining:
+            tail = samples[num_full:]
+            tail *= inv_powers[:num_remaining]
+            np.cumsum(tail, out=tail)
+            tail *= powers[:num_remaining] / decay * alpha
+            tail += samples.dtype.type(self._last) * powers[:num_remaining]
+            self._last = float(tail[-1])
+        return samples
+
+
+class FMDemodulator(Stage):
+    """Quadrature FM demodulator
+
+    The output is the phase difference between consecutive samples
+    (``angle(x[n] * conj(x[n-1]))``).  The last sample of each block is kept,
+    so no output is lost at the block boundaries.
+
+    By default the output is written into the memory of the input block
+    (as a real array of the same length), so no new arrays are allocated.
+
+    Arguments:
+        sample_rate (:obj:`float`, optional): The sample rate in Hz.  Required
+            for ``deviation`` and ``deemphasis``
+        deviation (:obj:`float`, optional): The peak frequency deviation in
+            Hz.  If given, the output is scaled so this deviation gives an
+            amplitude of 1.  Otherwise the output is in radians per sample
+        deemphasis (:obj:`float`, optional): The de-emphasis time constant
+            in seconds (e.g. ``75e-6``, see :class:`Deemphasis`).  If not
+            given, no de-emphasis is applied
+    """
+
+    def __init__(self, sample_rate=None, deviation=None, deemphasis=None):
+        super(FMDemodulator, self).__init__()
+        if (deviation is not None or deemphasis is not None) and sample_rate is None:
+            raise ValueError('sample_rate is required for deviation and deemphasis')
+        self.sample_rate = sample_rate
+        self.deviation = deviation
+        self.gain = 1.
+        if deviation is not None:
+            self.gain = sample_rate / (2 * np.pi * deviation)
+        self.deemphasis = None
+        if deemphasis is not None:
+            self.deemphasis = Deemphasis(sample_rate, deemphasis)
+        self._scratch = None
+        self.reset()
+
+    def reset(self):
+        self._last = None
+        if self.deemphasis is not None:
+            self.deemphasis.reset()
+
+    def process(self, samples, out=None):
+        """Demodulate a block of complex samples
+
+        Arguments:
+            samples (numpy.ndarray): A C-contiguous block of complex samples
+            out (optional): A real array of the same length to write into.
+                If not given, the memory of ``samples`` is reused (and the
+                samples are overwritten)
+
+        Returns:
+            numpy.ndarray: The demodulated (real) values
+        """
+        num_samples = len(samples)
+        real_dtype = samples.real.dtype
+        if out is None:
+            out = samples.view(real_dtype)[:num_samples]
+        if not num_samples:
+            return out
+        scratch = self._scratch
+        if scratch is None or scratch.shape != samples.shape or scratch.dtype != samples.dtype:
+            scratch = self._scratch = np.empty_like(samples)
+
+        # x[n] * conj(x[n-1]), using the last sample of the previous block
+        np.conjugate(samples[:-1], out=scratch[1:])
+        # (the first output after a reset is zero)
+        scratch[0] = np.conjugate(samples[0] if self._last is None else self._last)
+        self._last = samples[-1].copy()
+        scratch *= samples
+        np.arctan2(scratch.imag, scratch.real, out=out)
+        if self.gain != 1:
+            out *= real_dtype.type(self.gain)
+        if self.deemphasis is not None:
+            self.deemphasis.process(out)
+        return out
+
+
+class AMDemodulator(Stage):
+    """Envelope (AM) demodulator
+
+    The output is the magnitude of the samples with the carrier removed.
+    The carrier level is tracked by a single pole lowpass filter of the
+    envelope (see :class:`Deemphasis`) whose state is carried across blocks,
+    so there are no steps at the block boundaries.
+
+    By default the output is written into the memory of the input block
+    (as a real array of the same length), so no new arrays are allocated.
+
+    Arguments:
+        remove_carrier (:obj:`bool`, optional): Subtract the carrier level
+            from the envelope. Default is True
+        carrier_time_constant (:obj:`float`, optional): The time constant
+            of the carrier level estimate in samples.  It should be long
+            compared to the period of the lowest audio frequency.
+            Default is ``4096``
+
+    Attributes:
+        carrier (Deemphasis): The filter tracking the carrier level
+    """
+
+    def __init__(self, remove_carrier=True, carrier_time_constant=4096):
+        super(AMDemodulator, self).__init__()
+        self.remove_carrier = remove_carrier
+        self.carrier = Deemphasis(1., carrier_time_constant)
+        self._scratch = None
+        self._carrier_scratch = None
+        self.reset()
+
+    def reset(self):
+        self.carrier.reset()
+        self._started = False
+
+    def process(self, samples, out=None):
+        """Demodulate a block of complex samples
+
+        Arguments:
+            samples (numpy.ndarray): A C-contiguous block of complex samples
+            out (optional): A real array of the same length to write into.
+                If not given, the memory of ``samples`` is reused (and the
+                samples are overwritten)
+
+        Returns:
+            numpy.ndarray: The demodulated (real) values
+        """
+        num_samples = len(samples)
+        real_dtype = samples.real.dtype
+        if out is None:
+            out = samples.view(real_dtype)[:num_samples]
+        scratch = self._scratch
+        if scratch is None or scratch.shape != out.shape or scratch.dtype != real_dtype:
+            scratch = self._scratch = np.empty(num_samples, dtype=real_dtype)
+        np.abs(samples, out=scratch)
+        if self.remove_carrier and num_samples:
+            carrier = self._carrier_scratch
+            if carrier is None or carrier.shape != scratch.shape or carrier.dtype != real_dtype:
+                carrier = self._carrier_scratch = np.empty_like(scratch)
+            if not self._started:
+                # start from the first envelope value instead of zero
+                self.carrier.reset(scratch[0])
+                self._started = True
+            carrier[...] = scratch
+            self.carrier.process(carrier)
+            scratch -= carrier
+        out[...] = scratch
+        return out
@@ -0,0 +1,488 @@
+"""
+This module contains a manager for reading from several devices at once.
+
+:class:`MultiRtlSdr` opens a set of devices by serial number, starts their
+async reads together and groups the blocks read at the same time into a
+single 2-D array (one row per device).  The blocks are matched by
+:class:`ChannelAligner` using the sample counters and arrival times of their
+:class:`~rtlsdr.buffers.BlockInfo`.
+
+Example:
+    .. code-block:: python
+
+       from rtlsdr.multi import MultiRtlSdr
+
+       # the devices share a reference clock, so dithering is disabled
+       multi = MultiRtlSdr(['00000001', '00000002'], dithering_enabled=False)
+       multi.configure(sample_rate=2.048e6, center_freq=1090e6, gain=40)
+
+       def on_samples(samples, multi):
+           # samples.shape == (2, 256*1024)
+           print(multi.block_infos[0].sample_index, multi.aligner.skew)
+
+       multi.read_samples_async(on_samples, 256*1024, dtype='complex64')
+
+Notes:
+    The blocks are aligned to within a block of each other using the time
+    they were received, which includes some USB scheduling jitter.  Phase
+    coherent applications still need to measure the remaining sample delay
+    between the devices (for example by cross correlation).
+
+    This requires NumPy
+"""
+
+from __future__ import division
+import queue
+import threading
+import collections
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+from .rtlsdr import RtlSdr
+
+
+class _Group(object):
+    __slots__ = ('index', 'slot', 'infos', 'remaining', 'writers', 'discarded')
+
+    def __init__(self, index, slot, num_channels):
+        self.index = index
+        self.slot = slot
+        self.infos = [None] * num_channels
+        self.remaining = num_channels
+        # the number of channels copying into the slot without the lock
+        self.writers = 0
+        self.discarded = False
+
+
+class ChannelAligner(object):
+    """Group blocks from several channels by the time they were read
+
+    The blocks of each channel are added with :meth:`add` (from any thread).
+    The first blocks are matched by their arrival times, after which blocks
+    are grouped by their sample counters.  Groups missing a block from any of
+    the channels are dropped.  If the arrival times of a group differ by more
+    than ``max_skew``, the channels are matched again.
+
+    Completed groups are copied into preallocated arrays and read with
+    :meth:`get`.
+
+    Arguments:
+        num_channels (int): The number of channels
+        num_samples (int): The number of samples in each block
+        num_buffers (:obj:`int`, optional): The number of group arrays.
+            Default is ``4``
+        max_skew (:obj:`float`, optional): The maximum difference (in
+            seconds) between the arrival times of the blocks in a group.
+            Defaults to half the duration of a block
+
+    Attributes:
+        buffers (numpy.ndarray): The group arrays with the shape
+            ``(num_buffers, num_channels, num_samples)``.  These are
+            allocated with the data type of the first block added.
+        num_groups (int): The number of groups completed
+        dropped (int): The number of groups dropped because a block was
+            missing or no array was free
+        resyncs (int): The number of times the channels were matched again
+        skew (float): The arrival time difference of the last group
+    """
+
+    def __init__(self, num_channels, num_samples, num_buffers=4, max_skew=None):
+        if not has_numpy:
+            raise ImportError('ChannelAligner requires NumPy')
+        if num_channels < 1:
+            raise ValueError('num_channels must be at least 1')
+        if num_buffers < 1:
+            raise ValueError('num_buffers must be at least 1')
+        self.num_channels = num_channels
+        self.num_samples = int(num_samples)
+        self.num_buffers = num_buffers
+        self.max_skew = max_skew
+        self.buffers = None
+        self.num_groups = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.skew = 0.
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._free = collections.deque(range(num_buffers))
+        self._current = None
+        self._start_matching()
+
+    def _start_matching(self):
+        self._offsets = None
+        self._pending = [
+            collections.deque(maxlen=self.num_buffers) for _ in range(self.num_channels)
+        ]
+        self._groups = {}
+        self._positions = [-1] * self.num_channels
+        self._last_index = -1
+
+    def add(self, channel, samples, info):
+        """Add a block of samples
+
+        Arguments:
+            channel (int): The channel index
+            samples (numpy.ndarray): The block.  It is copied, so it may be
+                reused after this returns.
+            info (rtlsdr.buffers.BlockInfo): The metadata of the block
+        """
+        if len(samples) != self.num_samples:
+            raise ValueError('Expected %d samples, got %d' % (self.num_samples, len(samples)))
+        with self._lock:
+            if self.buffers is None:
+                self.buffers = np.empty(
+                    (self.num_buffers, self.num_channels, self.num_samples),
+                    dtype=samples.dtype,
+                )
+            if self._offsets is None:
+                self._pending[channel].append((info, np.array(samples)))
+                self._match()
+                return
+            group = self._reserve(channel, info)
+            if group is None:
+                return
+            if group.slot is not None:
+                group.writers += 1
+        # each channel only writes its own row, so this is done unlocked
+        if group.slot is not None:
+            self.buffers[group.slot, channel] = samples
+        with self._lock:
+            if group.slot is not None:
+                group.writers -= 1
+                if group.discarded and not group.writers:
+                    # dropped while copying, so the slot is free now
+                    self._free.append(group.slot)
+            self._complete(group, channel, info)
+
+    def _match(self):
+        # match the first blocks of each channel by their arrival times
+        pending = self._pending
+        if not all(pending):
+            return
+        start_time = max(items[0][0].time for items in pending)
+        first_info = pending[0][0][0]
+        tolerance = first_info.num_samples / first_info.sample_rate / 2
+        starts = []
+        for items in pending:
+            for i, (info, data) in enumerate(items):
+                if info.time >= start_time - tolerance:
+                    starts.append(i)
+                    break
+            else:
+                # wait for a newer block
+                return
+        self._offsets = [items[i][0].sample_index for items, i in zip(pending, starts)]
+        self._pending = None
+        for channel, (items, i) in enumerate(zip(pending, starts)):
+            for info, data in list(items)[i:]:
+                if self._offsets is None:
+                    # matched again while adding
+                    return
+                group = self._reserve(channel, info)
+                if group is None:
+                    continue
+                if group.slot is not None:
+                    self.buffers[group.slot, channel] = data
+                self._complete(group, channel, info)
+
+    def _reserve(self, channel, info):
+        index = (info.sample_index - self._offsets[channel]) // self.num_samples
+        if index < 0:
+            return None
+        self._positions[channel] = index
+        group = self._groups.get(index)
+        if group is None:
+            if index <= self._last_index:
+                # already completed or dropped
+                return None
+            slot = self._free.popleft() if self._free else None
+            group = self._groups[index] = _Group(index, slot, self.num_channels)
+            self._last_index = index
+        return group
+
+    def _complete(self, group, channel, info):
+        if self._groups.get(group.index) is not group:
+            # dropped while copying
+            return
+        group.infos[channel] = info
+        group.remaining -= 1
+        if not group.remaining:
+            del self._groups[group.index]
+            if group.slot is None:
+                self.dropped += 1
+            else:
+                times = [info.time for info in group.infos]
+                self.skew = max(times) - min(times)
+                max_skew = self.max_skew
+                if max_skew is None:
+                    max_skew = info.num_samples / info.sample_rate / 2
+                if self.skew > max_skew:
+                    self._discard(group)
+                    self.dropped += 1
+                    self._resync()
+                    return
+                self.num_groups += 1
+                self._ready.put((group.slot, group.infos))
+        self._drop_stale()
+
+    def _drop_stale(self):
+        # every channel has moved past these groups, so they can't be completed
+        position = min(self._positions)
+        for index in [index for index in self._groups if index < position]:
+            self._discard(self._groups.pop(index))
+            self.dropped += 1
+
+    def _resync(self):
+        for group in self._groups.values():
+            self._discard(group)
+        self.resyncs += 1
+        self._start_matching()
+
+    def _discard(self, group):
+        # the slot can't be reused while a channel is still copying into it
+        group.discarded = True
+        if group.slot is not None and not group.writers:
+            self._free.append(group.slot)
+
+    def get(self, timeout=None):
+        """Wait for the oldest completed group
+
+        The group must be returned with :meth:`release` when its data is no
+        longer needed.
+
+        Arguments:
+            timeout (:obj:`float`, optional): The maximum time to wait in
+                seconds. If None (the default), wait until a group is ready
+
+        Returns:
+            tuple: The samples as an array with the shape
+            ``(num_channels, num_samples)`` and a list with the
+            :class:`~rtlsdr.buffers.BlockInfo` of each row, or None if the
+            timeout expired
+        """
+        try:
+            slot, infos = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self._current = slot
+        return self.buffers[slot], infos
+
+    def release(self):
+        """Return the group given by the last call to :meth:`get` so its array
+        can be reused
+        """
+        with self._lock:
+            if self._current is not None:
+                self._free.append(self._current)
+                self._current = None
+
+
+class MultiRtlSdr(object):
+    """Open several devices and read from them at the same time
+
+    Arguments:
+        serial_numbers (list): The serial numbers of the devices (see
+            :meth:`~rtlsdr.rtlsdr.BaseRtlSdr.get_device_index_by_serial`)
+        test_mode_enabled (:obj:`bool`, optional): Passed to each device
+        dithering_enabled (:obj:`bool`, optional): Passed to each device.
+            Set to False when the devices share a reference clock so their
+            PLLs stay phase coherent
+        device_class (optional): The class used to open the devices.
+            Defaults to :class:`~rtlsdr.rtlsdr.RtlSdr`
+
+    Attributes:
+        devices (list): The device instances, in the order of
+            ``serial_numbers`` (and of the rows of each group)
+        aligner (ChannelAligner): The aligner used by the last call to
+            :meth:`read_samples_async`
+        block_infos (list): The :class:`~rtlsdr.buffers.BlockInfo` of each
+            row of the group passed to the callback
+    """
+
+    def __init__(self, serial_numbers, test_mode_enabled=False,
+                 dithering_enabled=True, device_class=None):
+        serial_numbers = list(serial_numbers)
+        if not serial_numbers:
+            raise ValueError('At least one serial number is required')
+        if len(set(serial_numbers)) != len(serial_numbers):
+            raise ValueError('Serial numbers must be unique')
+        if device_class is None:
+            device_class = RtlSdr
+        self.serial_numbers = serial_numbers
+        self.devices = []
+        self.aligner = None
+        self.block_infos = None
+        self.read_async_canceling = False
+        self._error = None
+        try:
+            for serial_number in serial_numbers:
+                self.devices.append(device_class(
+                    serial_number=serial_number,
+                    test_mode_enabled=test_mode_enabled,
+                    dithering_enabled=dithering_enabled,
+                ))
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __getitem__(self, index):
+        return self.devices[index]
+
+    def configure(self, **settings):
+        """Apply the same settings to every device
+
+        Arguments:
+            **settings: Property names and values (such as ``center_freq``,
+                ``sample_rate`` or ``gain``)
+
+        Examples:
+            >>> multi.configure(sample_rate=2.048e6, center_freq=100e6, gain='auto')
+        """
+        for name in settings:
+            if not isinstance(getattr(type(self.devices[0]), name, None), property):
+                raise ValueError('Unknown setting "%s"' % (name))
+        for sdr in self.devices:
+            for name, value in settings.items():
+                setattr(sdr, name, value)
+
+    def read_samples_async(self, callback, num_samples=RtlSdr.DEFAULT_READ_SIZE,
+                           context=None, num_buffers=4, max_skew=None, **kwargs):
+        """Read from all of the devices and pass the aligned blocks to a
+        callback
+
+        Each device is read by :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`
+        in its own thread.  The reads are started together, and the grouped
+        blocks are passed to the callback from the calling thread.  This
+        returns after :meth:`cancel_read_async` is called (or when an error
+        occurs in any of the devices, which is then raised).
+
+        Arguments:
+            callback: A function or method called with each group with the
+                signature ``callback(samples, context)``.  ``samples`` has the
+                shape ``(num_devices, num_samples)`` and is reused after the
+                callback returns. The metadata of the rows is in
+                :attr:`block_infos`
+            num_samples (int): The number of samples read from each device
+                per group. Defaults to
+                :attr:`~rtlsdr.rtlsdr.BaseRtlSdr.DEFAULT_READ_SIZE`
+            context (Optional): Object to be passed as an argument to the
+                callback.  If not given, this object is used
+            num_buffers (:obj:`int`, optional): Passed to
+                :class:`ChannelAligner`
+            max_skew (:obj:`float`, optional): Passed to
+                :class:`ChannelAligner`
+            **kwargs: Passed to the
+                :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async` call of each
+                device (such as ``dtype`` or ``buf_num``)
+        """
+        num_samples = int(num_samples)
+        sample_rates = set(sdr.sample_rate for sdr in self.devices)
+        if len(sample_rates) > 1:
+            raise ValueError('All devices must use the same sample rate')
+        if context is None:
+            context = self
+        aligner = self.aligner = ChannelAligner(
+            len(self.devices), num_samples, num_buffers, max_skew,
+        )
+        self.read_async_canceling = False
+        self._error = None
+        barrier = threading.Barrier(len(self.devices))
+        threads = []
+        for index, serial_number in enumerate(self.serial_numbers):
+            thread = threading.Thread(
+                target=self._read_device,
+                args=(index, aligner, barrier, num_samples, kwargs),
+                name='rtlsdr-multi-%s' % (serial_number),
+            )
+            thread.daemon = True
+            threads.append(thread)
+        try:
+            for thread in threads:
+                thread.start()
+            while not self.read_async_canceling:
+                group = aligner.get(timeout=.1)
+                if group is None:
+                    continue
+                samples, self.block_infos = group
+                try:
+                    callback(samples, context)
+                finally:
+                    aligner.release()
+        finally:
+            barrier.abort()
+            self._stop_devices(threads)
+        if self._error is not None:
+            raise self._error
+
+    def _read_device(self, index, aligner, barrier, num_samples, kwargs):
+        sdr = self.devices[index]
+
+        def on_samples(samples, context):
+            try:
+                aligner.add(index, samples, sdr.block_info)
+            except Exception as exc:
+                self._set_error(exc)
+
+        try:
+            # start the reads as close together as possible
+            barrier.wait()
+            if not self.read_async_canceling:
+                sdr.read_samples_async(on_samples, num_samples, **kwargs)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as exc:
+            self._set_error(exc)
+
+    def _set_error(self, exc):
+        if self._error is None:
+            self._error = exc
+        self.read_async_canceling = True
+
+    def _stop_devices(self, threads):
+        self.read_async_canceling = True
+        while True:
+            running = [
+                (sdr, thread) for sdr, thread in zip(self.devices, threads)
+                if thread.is_alive()
+            ]
+            if not running:
+                break
+            for sdr, thread in running:
+                # reads that haven't started exit on their own, and started
+                # ones are canceled until librtlsdr reports them as running
+                # (librtlsdr fails to cancel before then, which is ignored
+                # once read_async_canceling is set)
+                if sdr.read_async_running:
+                    sdr.read_async_canceling = True
+                    try:
+                        sdr.cancel_read_async()
+                    except IOError as exc:
+                        if self._error is None:
+                            self._error = exc
+                thread.join(.1)
+
+    def cancel_read_async(self):
+        """Stop the reads started by :meth:`read_samples_async`
+
+        This may be called from the callback or from another thread.
+        """
+        self.read_async_canceling = True
+
+    def close(self):
+        """Close all of the devices
+        """
+        for sdr in self.devices:
+            sdr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
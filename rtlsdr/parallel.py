@@ -0,0 +1,391 @@
+"""
+This module contains helpers to spread the processing of a sample stream
+over several CPU cores.
+
+:class:`OrderedExecutor` runs block processing in a thread pool (which
+helps since NumPy releases the GIL for large operations) and is used by the
+``workers`` option of :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`.
+
+:class:`ProcessOffload` runs a user function on each block in a pool of
+worker processes.  The raw blocks are passed through a
+:mod:`multiprocessing.shared_memory` ring, so the sample data is never
+pickled.  Results are delivered in the order the blocks were read.
+
+Example:
+    .. code-block:: python
+
+       import numpy as np
+       from rtlsdr import RtlSdr
+       from rtlsdr.parallel import ProcessOffload
+
+       def block_power(samples):
+           # runs in a worker process
+           return float(np.mean(np.abs(samples) ** 2))
+
+       def on_result(power, offload):
+           print(10 * np.log10(power))
+
+       sdr = RtlSdr()
+       with ProcessOffload(block_power, 256*1024, callback=on_result) as offload:
+           sdr.read_bytes_async(offload, 256*1024)
+
+Notes:
+    This requires NumPy
+"""
+
+from __future__ import division
+import collections
+import multiprocessing
+from ctypes import memmove
+from concurrent.futures import ThreadPoolExecutor
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # pragma: no cover
+    shared_memory = None
+
+from .conversion import LUTConverter
+
+
+class OrderedExecutor(object):
+    """Run tasks in a thread pool and deliver the results in submission order
+
+    At most ``max_in_flight`` tasks are queued or running at once. When the
+    limit is reached, :meth:`submit` waits for the oldest task.
+
+    Results are delivered from the thread calling :meth:`submit`,
+    :meth:`poll` or :meth:`flush`.
+
+    Arguments:
+        num_workers (:obj:`int`, optional): The number of worker threads.
+            Defaults to :func:`os.cpu_count`
+        max_in_flight (:obj:`int`, optional): The maximum number of pending
+            tasks. Defaults to twice ``num_workers``
+        callback (optional): Called with each result.  If not given, the
+            results are kept in :attr:`results`
+
+    Attributes:
+        results (collections.deque): The results waiting to be read if no
+            ``callback`` is given
+        num_submitted (int): The number of tasks submitted
+        num_completed (int): The number of results delivered
+        waits (int): The number of times :meth:`submit` had to wait because
+            ``max_in_flight`` tasks were pending
+    """
+
+    def __init__(self, num_workers=None, max_in_flight=None, callback=None):
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        if max_in_flight is None:
+            max_in_flight = num_workers * 2
+        if num_workers < 1 or max_in_flight < 1:
+            raise ValueError('num_workers and max_in_flight must be at least 1')
+        self.num_workers = num_workers
+        self.max_in_flight = max_in_flight
+        self.callback = callback
+        self.results = collections.deque()
+        self.num_submitted = 0
+        self.num_completed = 0
+        self.waits = 0
+        self.closed = False
+        self.executor = ThreadPoolExecutor(num_workers)
+        self._pending = collections.deque()
+
+    @property
+    def num_pending(self):
+        """int: The number of tasks whose results have not been delivered"""
+        return len(self._pending)
+
+    def submit(self, func, *args):
+        """Queue ``func(*args)`` to run in the pool
+
+        Any results that are ready are delivered first.
+
+        Arguments:
+            func: The task
+            *args: The arguments for ``func``
+        """
+        if self.closed:
+            raise ValueError('OrderedExecutor is closed')
+        self.poll()
+        if len(self._pending) >= self.max_in_flight:
+            self.waits += 1
+            self._deliver_next()
+        self._pending.append(self.executor.submit(func, *args))
+        self.num_submitted += 1
+
+    def poll(self):
+        """Deliver the results that are ready (in order)
+
+        Returns:
+            int: The number of results delivered
+        """
+        count = 0
+        while self._pending and self._pending[0].done():
+            self._deliver_next()
+            count += 1
+        return count
+
+    def flush(self):
+        """Wait for all submitted tasks and deliver their results
+        """
+        while self._pending:
+            self._deliver_next()
+
+    def _deliver_next(self):
+        value = self._pending.popleft().result()
+        self.num_completed += 1
+        if self.callback is not None:
+            self.callback(value)
+        else:
+            self.results.append(value)
+
+    def close(self, deliver=True):
+        """Stop the worker threads
+
+        Arguments:
+            deliver (:obj:`bool`, optional): If True (the default), deliver
+                the results of the pending tasks first.  Otherwise they are
+                waited for and discarded.
+        """
+        if self.closed:
+            return
+        try:
+            if deliver:
+                self.flush()
+        finally:
+            self.closed = True
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# per-process state of the ProcessOffload workers
+_worker = None
+
+
+class _WorkerState(object):
+    def __init__(self, shm_name, slot_size, dtype, func):
+        try:
+            self.shm = shared_memory.SharedMemory(name=shm_name, track=False)
+        except TypeError:
+            # Python < 3.13
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+        self.slot_size = slot_size
+        self.dtype = dtype
+        self.func = func
+        self.converter = LUTConverter()
+        self.scratch = None
+
+    def run(self, slot, num_bytes):
+        data = np.ndarray(
+            (num_bytes,), dtype=np.uint8, buffer=self.shm.buf,
+            offset=slot * self.slot_size,
+        )
+        if self.dtype is None:
+            return self.func(data)
+        num_samples = self.converter.get_output_length(num_bytes, self.dtype)
+        scratch = self.scratch
+        if scratch is None or len(scratch) < num_samples:
+            scratch = self.scratch = np.empty(num_samples, dtype=self.dtype)
+        samples = self.converter.convert(data, self.dtype, scratch[:num_samples])
+        return self.func(samples)
+
+
+def _init_worker(shm_name, slot_size, dtype, func):
+    global _worker
+    _worker = _WorkerState(shm_name, slot_size, dtype, func)
+
+
+def _run_worker(slot, num_bytes):
+    return _worker.run(slot, num_bytes)
+
+
+class ProcessOffload(object):
+    """Process blocks of raw samples in a pool of worker processes
+
+    Each block passed to :meth:`submit` is copied into a free slot of a
+    shared memory ring and only the slot index is sent to a worker.  The
+    worker converts the raw data to samples (in a reused array) and calls
+    ``func(samples)``.  The return values are passed to ``callback`` in the
+    order the blocks were submitted.
+
+    An instance can be used directly as the callback of
+    :meth:`~rtlsdr.rtlsdr.RtlSdr.read_bytes_async`.
+
+    Arguments:
+        func: The function called in the worker processes with each block
+            of samples.  Its return value is sent back to this process, so
+            it should be small compared to the block (such as a spectrum,
+            decimated audio or a detection result).  With the ``spawn``
+            start method it must be importable by the workers.
+        num_bytes (int): The maximum size of the raw blocks
+        num_workers (:obj:`int`, optional): The number of worker processes.
+            Defaults to :func:`os.cpu_count`
+        num_slots (:obj:`int`, optional): The number of blocks in the shared
+            memory ring (the maximum number of blocks being processed at
+            once).  Defaults to twice ``num_workers``
+        dtype (optional): The data type the raw blocks are converted to
+            (see :class:`~rtlsdr.conversion.SampleConverter`).  If None,
+            ``func`` is given the raw bytes as a ``uint8`` array.  The
+            default is ``'complex64'``
+        callback (optional): Called with each result with the signature
+            ``callback(result, offload)``.  If not given, the results are
+            kept in :attr:`results`
+        mp_context (optional): The :mod:`multiprocessing` context used to
+            start the workers. Defaults to the default context
+
+    Attributes:
+        results (collections.deque): The results waiting to be read if no
+            ``callback`` is given
+        num_submitted (int): The number of blocks submitted
+        num_completed (int): The number of results delivered
+        waits (int): The number of times :meth:`submit` had to wait for a
+            result because all of the slots were in use
+
+    Notes:
+        The data passed to ``func`` is only valid until it returns.
+    """
+
+    def __init__(self, func, num_bytes, num_workers=None, num_slots=None,
+                 dtype='complex64', callback=None, mp_context=None):
+        if not has_numpy:
+            raise ImportError('ProcessOffload requires NumPy')
+        if shared_memory is None: # pragma: no cover
+            raise ImportError('ProcessOffload requires multiprocessing.shared_memory')
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        if num_slots is None:
+            num_slots = num_workers * 2
+        if num_workers < 1 or num_slots < 1:
+            raise ValueError('num_workers and num_slots must be at least 1')
+        if dtype is not None:
+            dtype = LUTConverter.resolve_dtype(dtype, None)
+        self.func = func
+        self.num_bytes = int(num_bytes)
+        self.num_slots = num_slots
+        self.dtype = dtype
+        self.callback = callback
+        self.results = collections.deque()
+        self.num_submitted = 0
+        self.num_completed = 0
+        self.waits = 0
+        self.closed = False
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.num_bytes * num_slots)
+        self._free_slots = collections.deque(range(num_slots))
+        self._pending = collections.deque()
+        if mp_context is None:
+            mp_context = multiprocessing
+        try:
+            self.pool = mp_context.Pool(
+                num_workers, initializer=_init_worker,
+                initargs=(self.shm.name, self.num_bytes, dtype, func),
+            )
+        except Exception:
+            self.shm.close()
+            self.shm.unlink()
+            raise
+
+    def submit(self, data, num_bytes=None):
+        """Copy a block into the shared memory ring and queue it for a worker
+
+        Any results that are ready are delivered first.  If all of the slots
+        are in use, this waits for the oldest result.
+
+        Arguments:
+            data: The raw block (a ``ctypes`` array or pointer, or any object
+                supporting the buffer protocol)
+            num_bytes (:obj:`int`, optional): The size of the block. Defaults
+                to ``len(data)``
+        """
+        if self.closed:
+            raise ValueError('ProcessOffload is closed')
+        if num_bytes is None:
+            num_bytes = len(data)
+        if num_bytes > self.num_bytes:
+            raise ValueError('Block of %d bytes is larger than num_bytes' % (num_bytes))
+        self.poll()
+        if not self._free_slots:
+            self.waits += 1
+            self._deliver_next()
+        slot = self._free_slots.popleft()
+        offset = slot * self.num_bytes
+        if isinstance(data, (bytes, bytearray, memoryview)) or has_numpy and isinstance(data, np.ndarray):
+            self.shm.buf[offset:offset+num_bytes] = memoryview(data).cast('B')[:num_bytes]
+        else:
+            dest = np.ndarray((num_bytes,), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+            memmove(dest.ctypes.data, data, num_bytes)
+        result = self.pool.apply_async(_run_worker, (slot, num_bytes))
+        self._pending.append((slot, result))
+        self.num_submitted += 1
+
+    def __call__(self, data, context=None):
+        """Same as :meth:`submit` with the signature of the callbacks used by
+        :meth:`~rtlsdr.rtlsdr.RtlSdr.read_bytes_async`
+        """
+        self.submit(data)
+
+    def poll(self):
+        """Deliver the results that are ready (in order)
+
+        Returns:
+            int: The number of results delivered
+        """
+        count = 0
+        while self._pending and self._pending[0][1].ready():
+            self._deliver_next()
+            count += 1
+        return count
+
+    def flush(self):
+        """Wait for all submitted blocks and deliver their results
+        """
+        while self._pending:
+            self._deliver_next()
+
+    def _deliver_next(self):
+        slot, result = self._pending.popleft()
+        try:
+            value = result.get()
+        finally:
+            self._free_slots.append(slot)
+        self.num_completed += 1
+        if self.callback is not None:
+            self.callback(value, self)
+        else:
+            self.results.append(value)
+
+    def close(self):
+        """Deliver the remaining results, stop the workers and free the
+        shared memory
+        """
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self.pool.close()
+            self.pool.join()
+            self.shm.close()
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
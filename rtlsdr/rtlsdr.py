@@ -16,6 +16,10 @@
 
 
 from __future__ import division, print_function
+import time
+import queue
+import threading
+import collections
 from ctypes import *
 from .librtlsdr import (
     librtlsdr,
@@ -24,6 +28,12 @@ from .librtlsdr import (
     tuner_bandwidth_supported,
     tuner_set_bandwidth_supported,
 )
+from .conversion import LUTConverter, REAL_DTYPES, get_dtype_name
+from .buffers import (
+    SampleBufferPool, ReadBufferRing, AsyncReadRing, BlockAssembler, BlockInfo,
+)
+from .dsp import IQCorrector, Decimator, FrequencyShifter, Resampler, Squelch
+from .parallel import OrderedExecutor
 
 
 # see if NumPy is available
@@ -57,9 +67,28 @@ class BaseRtlSdr(object):
         DEFAULT_READ_SIZE (int): Default number of samples or bytes to read
             if no arguments are supplied for :meth:`read_bytes`
             or :meth:`read_samples`.  Default value is ``1024``
+        READ_BUFFER_COUNT (int): Number of buffers in :attr:`read_buffers`.
+            Default value is ``4``
+        DEFAULT_SAMPLE_DTYPE (str): Default complex data type used by
+            :meth:`packed_bytes_to_iq` if NumPy is available:
+            ``'complex128'``
+        REAL_SAMPLE_DTYPE (str): Default real data type used by the
+            ``'real'`` format of :meth:`~rtlsdr.rtlsdraio.RtlSdrAio.stream`:
+            ``'float32'``
+        converter: The :class:`~rtlsdr.conversion.SampleConverter` used by
+            :meth:`packed_bytes_to_iq`.  Defaults to an instance of
+            :class:`~rtlsdr.conversion.LUTConverter`
         gain_values (list(int)): The valid gain parameters supported by the device
             (in tenths of dB). These are stored as returned by ``librtlsdr``.
         valid_gains_db (list(float)): The valid gains in dB
+        read_buffers: The :class:`~rtlsdr.buffers.ReadBufferRing` used by
+            :meth:`read_bytes` and :meth:`lease_bytes` (created on first use)
+        iq_corrector: The :class:`~rtlsdr.dsp.IQCorrector` applied to samples
+            if :attr:`iq_correction` is enabled (otherwise ``None``)
+        frequency_shifter: The :class:`~rtlsdr.dsp.FrequencyShifter` applied
+            to samples if :attr:`frequency_shift` is set (otherwise ``None``)
+        block_info: The :class:`~rtlsdr.buffers.BlockInfo` of the block most
+            recently read, or of the block being passed to an async callback
 
     """
     # some default values for various parameters
@@ -67,14 +96,27 @@ class BaseRtlSdr(object):
     DEFAULT_FC = 80e6
     DEFAULT_RS = 1.024e6
     DEFAULT_READ_SIZE = 1024
+    DEFAULT_SAMPLE_DTYPE = 'complex128'
+    REAL_SAMPLE_DTYPE = 'float32'
+    READ_BUFFER_COUNT = 4
 
     CRYSTAL_FREQ = 28800000
 
+    converter = LUTConverter()
+
     gain_values = []
     valid_gains_db = []
     buffer = []
+    read_buffers = None
+    iq_corrector = None
+    frequency_shifter = None
+    _direct_sampling = 0
     num_bytes_read = c_int32(0)
     device_opened = False
+    block_info = None
+    _block_sequence = 0
+    _block_sample_index = 0
+    _tuning_state = None
 
     @staticmethod
     def get_device_index_by_serial(serial):
@@ -185,10 +227,11 @@ class BaseRtlSdr(object):
                            % (result))
 
         # reset buffers
-        result = librtlsdr.rtlsdr_reset_buffer(self.dev_p)
-        if result < 0:
-            raise LibUSBError(result, 'Could not reset buffer')
+        self.reset_buffer()
 
+        self._direct_sampling = 0
+        self._tuning_state = None
+        self.reset_block_counters()
         self.device_opened = True
         self.init_device_values()
 
@@ -225,6 +268,7 @@ class BaseRtlSdr(object):
         if result < 0:
             self.close()
             raise LibUSBError(result, 'Could not set center_freq to %d Hz' % (freq))
+        self._tuning_state = None
 
         return
 
@@ -249,6 +293,7 @@ class BaseRtlSdr(object):
         if result < 0:
             self.close()
             raise LibUSBError(result, 'Could not set freq. offset to %d ppm' % (err_ppm))
+        self._tuning_state = None
 
         return
 
@@ -268,6 +313,10 @@ class BaseRtlSdr(object):
         if result < 0:
             self.close()
             raise LibUSBError(result, 'Could not set sample rate to %d Hz' % (rate))
+        self._tuning_state = None
+
+        if self.frequency_shifter is not None:
+            self.frequency_shifter.sample_rate = self.get_sample_rate()
 
         return
 
@@ -333,6 +382,7 @@ class BaseRtlSdr(object):
         if result < 0:
             self.close()
             raise LibUSBError(result, 'Could not set gain to %d' % (gain))
+        self._tuning_state = None
 
         return
 
@@ -377,6 +427,7 @@ class BaseRtlSdr(object):
         result = librtlsdr.rtlsdr_set_tuner_gain_mode(self.dev_p, int(enabled))
         if result < 0:
             raise LibUSBError(result, 'Could not get gain mode')
+        self._tuning_state = None
 
         return
 
@@ -425,6 +476,13 @@ class BaseRtlSdr(object):
         Arguments:
             direct: If False or 0, disable direct sampling.  If 'i' or 1,
                 use ADC I input.  If 'q' or 2, use ADC Q input.
+
+        Notes:
+            librtlsdr still delivers interleaved I/Q data in direct sampling
+            mode, with the ADC samples of the selected input in the matching
+            byte of each pair.  Samples are complex by default; a real
+            ``dtype`` gives the values of the selected branch, one per I/Q
+            pair (see :meth:`packed_bytes_to_iq`).
         """
 
         # convert parameter
@@ -444,8 +502,19 @@ class BaseRtlSdr(object):
         if result < 0:
             raise LibUSBError(result, 'Could not set direct sampling')
 
+        self._direct_sampling = direct
+        self._tuning_state = None
         return result
 
+    def get_direct_sampling(self):
+        """Get the direct sampling mode
+
+        Returns:
+            int: ``0`` if disabled, ``1`` for the ADC I input or ``2`` for the
+            ADC Q input
+        """
+        return self._direct_sampling
+
     def set_dithering(self, enabled):
         """Enable/disable PLL dithering.
 
@@ -459,6 +528,83 @@ class BaseRtlSdr(object):
 
         return result
 
+    def reset_buffer(self):
+        """Discard any data buffered by the device
+
+        This is done when the device is opened, and should be done again if
+        the device was left idle (or used by another reader) before reading.
+        """
+        result = librtlsdr.rtlsdr_reset_buffer(self.dev_p)
+        if result < 0:
+            raise LibUSBError(result, 'Could not reset buffer')
+
+    def set_iq_correction(self, enabled, **kwargs):
+        """Enable/disable DC offset and I/Q imbalance correction
+
+        When enabled, the samples produced by :meth:`read_samples` (and
+        :meth:`RtlSdr.read_samples_async`) are corrected in place by an
+        :class:`~rtlsdr.dsp.IQCorrector` which keeps its estimates across
+        calls.
+
+        Arguments:
+            enabled (bool):
+            **kwargs: Keyword arguments for :class:`~rtlsdr.dsp.IQCorrector`
+
+        Notes:
+            This requires NumPy and only applies to complex samples.
+            Enabling it again resets the current estimates.
+        """
+        if enabled:
+            self.iq_corrector = IQCorrector(**kwargs)
+        else:
+            self.iq_corrector = None
+
+    def get_iq_correction(self):
+        """Get the DC offset and I/Q imbalance correction state
+
+        Returns:
+            bool:
+        """
+        return self.iq_corrector is not None
+
+    def set_frequency_shift(self, shift):
+        """Set the frequency shift applied to the samples
+
+        When set, the samples produced by :meth:`read_samples` (and
+        :meth:`RtlSdr.read_samples_async`) are shifted in place by a
+        :class:`~rtlsdr.dsp.FrequencyShifter`.  The phase is continuous
+        across reads.  This can be used to move a signal away from the
+        DC spike while tuned to ``center_freq - shift``.
+
+        Arguments:
+            shift (float): The frequency shift in Hz.  To move a signal at
+                ``center_freq + offset`` to zero, use ``-offset``.
+                If 0, the shift is disabled.
+
+        Notes:
+            This requires NumPy and only applies to complex samples.
+            It is applied after the :attr:`iq_correction` and before
+            decimation.  Without I/Q correction, each chunk of samples is
+            shifted right after it is converted (see
+            :meth:`~rtlsdr.dsp.FrequencyShifter.get_chunk_processor`).
+        """
+        if not shift:
+            self.frequency_shifter = None
+        elif self.frequency_shifter is None:
+            self.frequency_shifter = FrequencyShifter(shift, self.get_sample_rate())
+        else:
+            self.frequency_shifter.frequency = shift
+
+    def get_frequency_shift(self):
+        """Get the frequency shift applied to the samples
+
+        Returns:
+            float: The shift in Hz (0 if disabled)
+        """
+        if self.frequency_shifter is None:
+            return 0.
+        return self.frequency_shifter.frequency
+
     def set_gpio_output(self, gpio):
         """Set GPIO pin to output mode.
         
@@ -579,8 +725,12 @@ class BaseRtlSdr(object):
     def read_bytes(self, num_bytes=DEFAULT_READ_SIZE):
         """Read specified number of bytes from tuner.
 
-        Does not attempt to unpack complex samples (see :meth:`read_samples`),
-        and data may be unsafe as buffer is reused.
+        Does not attempt to unpack complex samples (see :meth:`read_samples`).
+
+        The data is read into the next buffer of :attr:`read_buffers` and is
+        valid until that buffer is reused (after :attr:`READ_BUFFER_COUNT`
+        further reads).  Use :meth:`lease_bytes` to hold on to the data for
+        longer without copying it.
 
         Arguments:
             num_bytes (:obj:`int`, optional): The number of bytes to read.
@@ -590,16 +740,83 @@ class BaseRtlSdr(object):
             ctypes.Array[c_ubyte]:
                 A buffer of len(num_bytes) containing the raw samples read.
         """
-        # FIXME: librtlsdr may not be able to read an arbitrary number of bytes
+        num_bytes = int(num_bytes)
+        index, buffer = self._get_read_buffers().acquire(num_bytes)
+        self._read_into(buffer, num_bytes)
+        self.block_info = self._get_block_info(num_bytes)
+        return buffer
+
+    def lease_bytes(self, num_bytes=DEFAULT_READ_SIZE):
+        """Read specified number of bytes from tuner into a leased buffer
 
+        This is the same as :meth:`read_bytes`, but the buffer used is
+        excluded from reuse until the returned lease is released.
+
+        Arguments:
+            num_bytes (:obj:`int`, optional): The number of bytes to read.
+                Defaults to :attr:`DEFAULT_READ_SIZE`.
+
+        Returns:
+            rtlsdr.buffers.BufferLease: The lease whose
+            :attr:`~rtlsdr.buffers.BufferLease.data` is a zero-copy view of
+            the raw samples read
+
+        Raises:
+            BufferError: If all of the :attr:`read_buffers` are leased
+
+        Examples:
+            >>> with sdr.lease_bytes(1024) as lease:
+            >>>     process(lease.data)
+        """
         num_bytes = int(num_bytes)
+        lease = self._get_read_buffers().lease(num_bytes)
+        try:
+            self._read_into(lease.buffer, num_bytes)
+        except Exception:
+            lease.release()
+            raise
+        self.block_info = self._get_block_info(num_bytes)
+        return lease
+
+    def reset_block_counters(self):
+        """Restart the :attr:`~rtlsdr.buffers.BlockInfo.sequence` and
+        :attr:`~rtlsdr.buffers.BlockInfo.sample_index` of :attr:`block_info`
+        from zero
+
+        This is done when the device is opened and at the start of each
+        async read.
+        """
+        self._block_sequence = 0
+        self._block_sample_index = 0
+
+    def _get_block_info(self, num_bytes):
+        # the tuning values are cached until one of them is set
+        state = self._tuning_state
+        if state is None:
+            state = self._tuning_state = (
+                self.get_center_freq(), self.get_sample_rate(), self.get_gain(),
+            )
+        num_samples = num_bytes // 2
+        info = BlockInfo(
+            self._block_sequence, self._block_sample_index, num_samples,
+            time.monotonic(), *state
+        )
+        self._block_sequence += 1
+        self._block_sample_index += num_samples
+        return info
+
+    def _get_read_buffers(self):
+        ring = self.read_buffers
+        if ring is None:
+            ring = self.read_buffers = ReadBufferRing(self.READ_BUFFER_COUNT)
+        return ring
+
+    def _read_into(self, buffer, num_bytes):
+        # FIXME: librtlsdr may not be able to read an arbitrary number of bytes
 
-        # create buffer, as necessary
-        if len(self.buffer) != num_bytes:
-            array_type = (c_ubyte*num_bytes)
-            self.buffer = array_type()
+        self.buffer = buffer
 
-        result = librtlsdr.rtlsdr_read_sync(self.dev_p, self.buffer, num_bytes,\
+        result = librtlsdr.rtlsdr_read_sync(self.dev_p, buffer, num_bytes,\
                                             byref(self.num_bytes_read))
         if result < 0:
             self.close()
@@ -610,49 +827,212 @@ class BaseRtlSdr(object):
             raise IOError('Short read, requested %d bytes, received %d'\
                           % (num_bytes, self.num_bytes_read.value))
 
-        return self.buffer
-
-    def read_samples(self, num_samples=DEFAULT_READ_SIZE):
+    def read_samples(self, num_samples=DEFAULT_READ_SIZE, dtype=None, out=None):
         """Read specified number of complex samples from tuner.
 
         Real and imaginary parts are normalized to be in the range [-1, 1].
-        Data is safe after this call (will not get overwritten by another one).
+        Data is safe after this call (will not get overwritten by another one)
+        unless ``out`` is given.
 
         Arguments:
             num_samples (:obj:`int`, optional): Number of samples to read.
                 Defaults to :attr:`DEFAULT_READ_SIZE`.
+            dtype (optional): The data type of the returned samples
+                (see :meth:`packed_bytes_to_iq`).
+            out (optional): An existing array to write the samples into
+                (see :meth:`packed_bytes_to_iq`).  When reused for every call,
+                no new sample arrays are allocated.
 
         Returns:
             The samples read as either a :class:`list` or :class:`numpy.ndarray`
             (if available).
         """
-        num_bytes = 2*num_samples
+        if dtype is None and out is None:
+            dtype = self.DEFAULT_SAMPLE_DTYPE
+        dtype = self.converter.resolve_dtype(dtype, out)
+        num_bytes = num_samples * self.converter.get_bytes_per_sample(dtype)
 
         raw_data = self.read_bytes(num_bytes)
-        iq = self.packed_bytes_to_iq(raw_data)
 
+        return self._convert_samples(raw_data, dtype, out)
+
+    def iter_samples(self, num_samples=DEFAULT_READ_SIZE, prefetch=2, dtype=None,
+                     buffer_pool=None):
+        """Iterate over blocks of samples read by a background thread
+
+        This is similar to calling :meth:`read_samples` in a loop, but up to
+        ``prefetch`` blocks are read ahead while the previous ones are being
+        processed.  The raw data is read into a private
+        :class:`~rtlsdr.buffers.ReadBufferRing`, so no byte buffers are
+        allocated after the first blocks.
+
+        The reader thread is stopped when the generator is closed, either by
+        leaving the loop (once the generator is garbage collected) or by
+        calling its ``close()`` method.
+
+        Arguments:
+            num_samples (:obj:`int`, optional): Number of samples in each
+                block.  Defaults to :attr:`DEFAULT_READ_SIZE`.
+            prefetch (:obj:`int`, optional): The maximum number of blocks
+                read ahead of the consumer. Default is ``2``
+            dtype (optional): The data type of the samples
+                (see :meth:`read_samples`)
+            buffer_pool (optional): If given, samples are written into
+                preallocated arrays (see :meth:`RtlSdr.read_samples_async`).
+
+        Yields:
+            The samples of each block. The :class:`~rtlsdr.buffers.BlockInfo`
+            of the block is available as :attr:`block_info`.
+
+        Examples:
+            >>> from contextlib import closing
+            >>> with closing(sdr.iter_samples(256*1024, prefetch=4)) as blocks:
+            >>>     for samples in blocks:
+            >>>         process(samples)
+        """
+        if prefetch < 1:
+            raise ValueError('prefetch must be at least 1')
+        if dtype is None:
+            if isinstance(buffer_pool, SampleBufferPool):
+                dtype = buffer_pool.dtype
+            else:
+                dtype = self.DEFAULT_SAMPLE_DTYPE
+        dtype = self.converter.resolve_dtype(dtype, None)
+        num_bytes = int(num_samples * self.converter.get_bytes_per_sample(dtype))
+        if buffer_pool is not None and not isinstance(buffer_pool, SampleBufferPool):
+            num_output = self.converter.get_output_length(num_bytes, dtype)
+            buffer_pool = SampleBufferPool(buffer_pool, num_output, dtype)
+
+        # one slot being read, ``prefetch`` queued and one being converted
+        ring = ReadBufferRing(prefetch + 2)
+        blocks = queue.Queue(prefetch)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    blocks.put(item, timeout=.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read_blocks():
+            try:
+                while not stopped.is_set():
+                    lease = ring.lease(num_bytes)
+                    try:
+                        self._read_into(lease.buffer, num_bytes)
+                    except Exception:
+                        lease.release()
+                        raise
+                    if not put((lease, self._get_block_info(num_bytes))):
+                        lease.release()
+            except Exception as exc:
+                put(exc)
+
+        def drain():
+            while True:
+                try:
+                    item = blocks.get_nowait()
+                except queue.Empty:
+                    return
+                if not isinstance(item, Exception):
+                    item[0].release()
+
+        self.reset_block_counters()
+        reader = threading.Thread(target=read_blocks, name='rtlsdr-prefetch')
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                item = blocks.get()
+                if isinstance(item, Exception):
+                    raise item
+                lease, info = item
+                try:
+                    out = buffer_pool.next_buffer() if buffer_pool is not None else None
+                    iq = self._convert_samples(lease.buffer, dtype, out)
+                finally:
+                    lease.release()
+                self.block_info = info
+                yield iq
+        finally:
+            stopped.set()
+            drain()
+            reader.join()
+            drain()
+
+    def _process_samples(self, iq):
+        """Apply the enabled processing stages to converted samples
+        """
+        if not has_numpy or not isinstance(iq, np.ndarray) or iq.dtype.kind != 'c':
+            return iq
+        if self.iq_corrector is not None:
+            iq = self.iq_corrector.process(iq)
+        if self.frequency_shifter is not None:
+            iq = self.frequency_shifter.process(iq)
         return iq
 
-    def packed_bytes_to_iq(self, bytes):
+    def _convert_samples(self, bytes, dtype, out=None):
+        """Convert raw bytes with :meth:`packed_bytes_to_iq` and apply the
+        enabled processing stages
+
+        Without I/Q correction, the frequency shift is applied to each chunk
+        of samples right after it is converted rather than in a second pass
+        over the block.  This requires a :attr:`converter` supporting it
+        (see :attr:`~rtlsdr.conversion.SampleConverter.PROCESS_CHUNKS`) and
+        :meth:`packed_bytes_to_iq` not to be overridden.
+        """
+        shifter = self.frequency_shifter
+        converter = self.converter
+        if (shifter is None or self.iq_corrector is not None or not has_numpy
+                or not _processes_chunks(converter)
+                or type(self).packed_bytes_to_iq is not BaseRtlSdr.packed_bytes_to_iq
+                or np.dtype(dtype).kind != 'c'):
+            return self._process_samples(self.packed_bytes_to_iq(bytes, dtype, out))
+        num_samples = converter.get_output_length(len(bytes), dtype)
+        process_chunk = shifter.get_chunk_processor(num_samples, dtype)
+        return converter.convert(bytes, dtype, out, process_chunk)
+
+    def packed_bytes_to_iq(self, bytes, dtype=None, out=None):
         """Unpack a sequence of bytes to a sequence of normalized complex numbers
 
-        This is called automatically by :meth:`read_samples`.
+        This is called automatically by :meth:`read_samples`.  The conversion
+        is performed by :attr:`converter`.
+
+        Arguments:
+            bytes: The raw interleaved I/Q data
+            dtype (optional): The data type to produce.  For complex types
+                (``'complex64'`` or ``'complex128'``) the conversion is
+                performed directly in the matching floating point precision,
+                so ``'complex64'`` uses half the memory bandwidth.
+                The integer types ``'int8'`` and ``'int16'`` produce
+                interleaved I/Q values with the offset removed
+                (see :class:`~rtlsdr.conversion.SampleConverter`).
+                The real types ``'float32'`` and ``'float64'`` produce one
+                normalized value per I/Q pair from the branch selected by
+                :meth:`set_direct_sampling` (the Q byte for ``'q'``,
+                otherwise the I byte).
+                If not given, :attr:`DEFAULT_SAMPLE_DTYPE` is used (or the
+                dtype of ``out`` if given).
+            out (optional): An existing array to write the samples into
+                instead of allocating a new one.  It must be C-contiguous
+                and have a length of ``len(bytes) // 2`` (or ``len(bytes)``
+                for integer types).
 
         Returns:
             The unpacked iq values as either a :class:`list` or
-            :class:`numpy.ndarray` (if available).
-        """
-        if has_numpy:
-            # use NumPy array
-            data = np.ctypeslib.as_array(bytes)
-            iq = data.astype(np.float64).view(np.complex128)
-            iq /= 127.5
-            iq -= (1 + 1j)
-        else:
-            # use normal list
-            iq = [complex(i/(255/2) - 1, q/(255/2) - 1) for i, q in zip(bytes[::2], bytes[1::2])]
-
-        return iq
+            :class:`numpy.ndarray` (if available).  If ``out`` was given,
+            it will be returned.
+        """
+        if dtype is None and out is None:
+            dtype = self.DEFAULT_SAMPLE_DTYPE
+        if self._direct_sampling == 2:
+            dtype = self.converter.resolve_dtype(dtype, out)
+            if get_dtype_name(dtype) in REAL_DTYPES:
+                return self.converter.convert(bytes, dtype, out, branch=1)
+        return self.converter.convert(bytes, dtype, out)
 
     center_freq = fc = property(get_center_freq, set_center_freq,
         doc="""int: Get/Set the center frequency of the device (in Hz)""")
@@ -668,6 +1048,15 @@ class BaseRtlSdr(object):
         """)
     freq_correction = property(get_freq_correction, set_freq_correction,
         doc="""int: Get/Set frequency offset of the tuner (in PPM)""")
+    direct_sampling = property(get_direct_sampling, set_direct_sampling,
+        doc="""int: Get/Set the direct sampling mode
+        (see :meth:`set_direct_sampling`)""")
+    frequency_shift = property(get_frequency_shift, set_frequency_shift,
+        doc="""float: Get/Set the frequency shift applied to the samples (in Hz)
+        (see :meth:`set_frequency_shift`)""")
+    iq_correction = property(get_iq_correction, set_iq_correction,
+        doc="""bool: Get/Set DC offset and I/Q imbalance correction
+        (see :meth:`set_iq_correction`)""")
     bandwidth = property(get_bandwidth, set_bandwidth,
         doc="""int: Get/Set bandwidth value (in Hz)
 
@@ -685,10 +1074,55 @@ class RtlSdr(BaseRtlSdr):
     """
     DEFAULT_ASYNC_BUF_NUMBER = 0 # librtlsdr will use the default (15)
     DEFAULT_READ_SIZE = 1024
+    ASYNC_BUFFER_TIME = .5
+    """The total time (in seconds) of data buffered by librtlsdr when the
+    transfer buffers are chosen from a target latency
+    (see :meth:`get_async_buffer_params`)"""
+    MAX_ASYNC_BUF_NUMBER = 128
+    MAX_ASYNC_BUF_LENGTH = 16 * 32 * 512 * 4 # 4x the librtlsdr default
 
     read_async_canceling = False
+    read_async_running = False
+    """Whether ``rtlsdr_read_async`` has been called by the current async
+    read (and not returned yet), so it can be canceled"""
+    _samples_dtype = None
+    _samples_stages = None
+    _samples_squelch = None
+    _samples_scratch = None
+    _samples_buffer_pool = None
+    _async_ring = None
+    _async_error = None
+    _samples_parallel = None
+
+    def get_async_buffer_params(self, latency):
+        """Choose the number and length of the USB transfer buffers for a
+        target latency
+
+        The transfer length is the amount of data received in ``latency``
+        at the current sample rate (rounded to a multiple of 512 bytes, or
+        of 16384 bytes for larger transfers).  Enough transfers are queued to
+        hold :attr:`ASYNC_BUFFER_TIME` seconds of data.
 
-    def read_bytes_async(self, callback, num_bytes=DEFAULT_READ_SIZE, context=None):
+        Arguments:
+            latency (float): The maximum time in seconds that data should
+                wait in a transfer buffer before it is passed on
+
+        Returns:
+            tuple: ``(buf_num, buf_len)``
+        """
+        if latency <= 0:
+            raise ValueError('latency must be positive')
+        bytes_per_second = self.get_sample_rate() * 2
+        buf_len = int(bytes_per_second * latency)
+        granularity = 16384 if buf_len >= 16384 else 512
+        buf_len = buf_len // granularity * granularity
+        buf_len = min(max(buf_len, 512), self.MAX_ASYNC_BUF_LENGTH)
+        buf_num = -(-int(bytes_per_second * self.ASYNC_BUFFER_TIME) // buf_len)
+        buf_num = min(max(buf_num, 2), self.MAX_ASYNC_BUF_NUMBER)
+        return buf_num, buf_len
+
+    def read_bytes_async(self, callback, num_bytes=DEFAULT_READ_SIZE, context=None,
+                         ring_size=None, buf_num=None, buf_len=None, latency=None):
         """Continuously read bytes from tuner
 
         Arguments:
@@ -699,12 +1133,44 @@ class RtlSdr(BaseRtlSdr):
             context (Optional): Object to be passed as an argument to the callback.
                 If not supplied or None, the :class:`RtlSdr` instance
                 will be used.
+            ring_size (Optional): If given, the data is copied into a
+                :class:`~rtlsdr.buffers.AsyncReadRing` with this number of
+                slots and the callback is called from a separate consumer
+                thread.  This keeps a slow callback from stalling the USB
+                transfers.  Blocks that arrive while the ring is full are
+                dropped and counted in :attr:`overruns`.
+            buf_num (Optional): The number of USB transfer buffers used by
+                librtlsdr. Defaults to :attr:`DEFAULT_ASYNC_BUF_NUMBER`
+            buf_len (Optional): The length of each USB transfer in bytes
+                (a multiple of 512). Defaults to ``num_bytes``.  If it differs
+                from ``num_bytes``, the transfers are split or joined into
+                blocks of ``num_bytes`` for the callback.
+            latency (Optional): If given, ``buf_num`` and ``buf_len`` are
+                chosen from this target latency in seconds (see
+                :meth:`get_async_buffer_params`)
 
         Notes:
             As with :meth:`~BaseRtlSdr.read_bytes`, the data passed to the
-            callback may by overwritten.
+            callback may by overwritten.  When ``ring_size`` is used, it is
+            valid until the callback returns.
+
+            Exceptions raised by the callback in the consumer thread cancel
+            the read and are raised again from this method.
+
+            The :class:`~rtlsdr.buffers.BlockInfo` of each block is
+            available as :attr:`~BaseRtlSdr.block_info` during the callback.
         """
         num_bytes = int(num_bytes)
+        if latency is not None:
+            if buf_num is not None or buf_len is not None:
+                raise ValueError('latency can not be combined with buf_num or buf_len')
+            buf_num, buf_len = self.get_async_buffer_params(latency)
+        if buf_num is None:
+            buf_num = self.DEFAULT_ASYNC_BUF_NUMBER
+        if buf_len is None:
+            buf_len = num_bytes
+        elif buf_len <= 0 or buf_len % 512:
+            raise ValueError('buf_len must be a positive multiple of 512')
 
         # we don't call the provided callback directly, but add a layer inbetween
         # to convert the raw buffer to a safer type
@@ -712,24 +1178,104 @@ class RtlSdr(BaseRtlSdr):
         # save requested callback
         self._callback_bytes = callback
 
-        # convert Python callback function to a librtlsdr callback
-        rtlsdr_callback = rtlsdr_read_async_cb_t(self._bytes_converter_callback)
-
         # use this object as context if none provided
         if not context:
             context = self
 
+        self.reset_block_counters()
+        ring = None
+        consumer = None
+        if ring_size:
+            ring = self._async_ring = AsyncReadRing(ring_size, num_bytes)
+            self._async_error = None
+            consumer = threading.Thread(
+                target=self._ring_consumer, args=(ring, context),
+                name='rtlsdr-async-consumer',
+            )
+            consumer.daemon = True
+            block_callback = self._ring_producer_callback
+        else:
+            block_callback = self._bytes_converter_callback
+        if buf_len != num_bytes:
+            block_callback = BlockAssembler(num_bytes, block_callback).feed
+
+        # convert Python callback function to a librtlsdr callback
+        rtlsdr_callback = rtlsdr_read_async_cb_t(block_callback)
+
         self.read_async_canceling = False
-        result = librtlsdr.rtlsdr_read_async(self.dev_p, rtlsdr_callback,\
-                    context, self.DEFAULT_ASYNC_BUF_NUMBER, num_bytes)
+        if consumer is not None:
+            consumer.start()
+        self.read_async_running = True
+        try:
+            result = librtlsdr.rtlsdr_read_async(self.dev_p, rtlsdr_callback,\
+                        context, buf_num, buf_len)
+        finally:
+            self.read_async_running = False
+            if ring is not None:
+                ring.close()
+                consumer.join()
         if result < 0:
             self.close()
-            raise LibUSBError(result, 'Could not read %d bytes' % (num_bytes))
+            raise LibUSBError(result, 'Could not read %d bytes' % (buf_len))
 
         self.read_async_canceling = False
 
+        if ring is not None and self._async_error is not None:
+            error, self._async_error = self._async_error, None
+            raise error
+
         return
 
+    def _ring_producer_callback(self, raw_buffer, num_bytes, context):
+        """Copies the raw buffer used in ``rtlsdr_read_async`` into the
+        :class:`~rtlsdr.buffers.AsyncReadRing`
+
+        This is used by :meth:`read_bytes_async` instead of
+        :meth:`_bytes_converter_callback` when ``ring_size`` is given.
+        """
+        if self.read_async_canceling:
+            return
+        self._async_ring.put(raw_buffer, num_bytes, self._get_block_info(num_bytes))
+
+    def _ring_consumer(self, ring, context):
+        """Target of the consumer thread started by :meth:`read_bytes_async`
+
+        Passes each block in the ring to the callback until the ring is
+        closed and empty.
+        """
+        while True:
+            item = ring.get()
+            if item is None:
+                return
+            values, self.block_info = item
+            try:
+                if not self.read_async_canceling:
+                    self._callback_bytes(values, context)
+            except Exception as exc:
+                self._async_error = exc
+                ring.close()
+                self.cancel_read_async()
+            finally:
+                ring.release()
+
+    @property
+    def overruns(self):
+        """int: The number of blocks dropped because the ring buffer of the
+        current (or last) async read was full (see ``ring_size`` in
+        :meth:`read_bytes_async`)
+        """
+        ring = self._async_ring
+        return ring.overruns if ring is not None else 0
+
+    @property
+    def underruns(self):
+        """int: The number of times the consumer thread of the current (or
+        last) async read had to wait for data (see ``ring_size`` in
+        :meth:`read_bytes_async`)
+        """
+        ring = self._async_ring
+        return ring.underruns if ring is not None else 0
+
     def _bytes_converter_callback(self, raw_buffer, num_bytes, context):
         """Converts the raw buffer used in ``rtlsdr_read_async`` to a usable type
 
@@ -759,9 +1305,14 @@ class RtlSdr(BaseRtlSdr):
         if self.read_async_canceling:
             return
 
+        self.block_info = self._get_block_info(num_bytes)
         self._callback_bytes(values, context)
 
-    def read_samples_async(self, callback, num_samples=DEFAULT_READ_SIZE, context=None):
+    def read_samples_async(self, callback, num_samples=DEFAULT_READ_SIZE, context=None,
+                           dtype=None, buffer_pool=None, decimation=None, taps=None,
+                           output_rate=None, squelch=None, stages=None, ring_size=None,
+                           buf_num=None, buf_len=None, latency=None,
+                           workers=None, max_in_flight=None, parallel_stages=None):
         """Continuously read 'samples' from the tuner
 
         This is a combination of :meth:`read_samples` and :meth:`read_bytes_async`
@@ -774,15 +1325,177 @@ class RtlSdr(BaseRtlSdr):
             context (Optional): Object to be passed as an argument to the callback.
                 If not supplied or None, the :class:`RtlSdr` instance
                 will be used.
+            dtype (Optional): The data type of the samples
+                (see :meth:`~BaseRtlSdr.packed_bytes_to_iq`).
+            buffer_pool (Optional): If given, samples are written into
+                preallocated arrays instead of new ones for each callback.
+                This can be either the number of arrays to allocate or a
+                :class:`~rtlsdr.buffers.SampleBufferPool` instance.
+            decimation (Optional): If given, the samples are lowpass filtered
+                and decimated before being passed to the callback.  This can
+                be either the decimation factor or a
+                :class:`~rtlsdr.dsp.Decimator` instance.  The full rate
+                samples are converted into a single reused array, so only
+                the decimated samples are allocated.  ``num_samples`` is the
+                number of samples read (before decimation) and must be a
+                multiple of the factor.
+            taps (Optional): The FIR filter taps used if ``decimation`` is
+                given as a factor (see :class:`~rtlsdr.dsp.Decimator`).
+            output_rate (Optional): If given, the samples are resampled to
+                this rate (in Hz) before being passed to the callback (after
+                any ``decimation``).  This can also be a
+                :class:`~rtlsdr.dsp.Resampler` instance.
+            squelch (Optional): If given, the power of each block is measured
+                on the raw data and blocks are only converted and passed to
+                the callback while it is above the threshold.  This can be
+                either the threshold in dB relative to full scale or a
+                :class:`~rtlsdr.dsp.Squelch` instance (which can also pass
+                the power of quiet blocks to the callback).
+            stages (Optional): A sequence of additional
+                :class:`~rtlsdr.dsp.Stage` instances (such as
+                :class:`~rtlsdr.dsp.FMDemodulator`) applied in order after any
+                decimation and resampling.  The output of the last one is
+                passed to the callback.  This can not be combined with
+                ``buffer_pool``.
+            ring_size (Optional): Decouple the callback from the USB
+                transfers with a ring buffer of this number of blocks
+                (see :meth:`read_bytes_async`)
+            buf_num (Optional): The number of USB transfer buffers
+                (see :meth:`read_bytes_async`)
+            buf_len (Optional): The length of each USB transfer in bytes.
+                Defaults to the number of bytes read for each callback
+                (see :meth:`read_bytes_async`)
+            latency (Optional): Choose ``buf_num`` and ``buf_len`` from a
+                target latency in seconds (see :meth:`read_bytes_async`)
+            workers (Optional): If given, the blocks are converted in a pool of
+                this many threads (see :class:`~rtlsdr.parallel.OrderedExecutor`).
+                Each raw block is copied before it is handed to the pool.
+                The callback is still called in the order the blocks were read.
+            max_in_flight (Optional): The maximum number of blocks being
+                converted at once when ``workers`` is used. Defaults to twice
+                ``workers``.  Unless there are processing stages, the blocks
+                are converted directly into the arrays of ``buffer_pool``,
+                which must then have more than ``max_in_flight`` arrays
+            parallel_stages (Optional): A sequence of functions applied to the
+                samples in the worker threads after conversion, with the
+                signature ``func(samples) -> samples``.  These run on several
+                blocks at once, so they must not keep state between blocks.
+                Requires ``workers``.  They can't be combined with
+                :attr:`iq_correction` or :attr:`frequency_shift`, which
+                must be applied before them but can only run in order on
+                the delivering thread.
+
+        Notes:
+            When ``buffer_pool`` is used, the samples passed to the callback
+            are only valid until their array is reused, which happens after
+            :attr:`~rtlsdr.buffers.SampleBufferPool.num_buffers` callbacks.
+            Data that must be kept longer should be copied.
+
+            Decimation and resampling require NumPy and a complex or real
+            ``dtype``.  When resampling, the number of samples passed to
+            the callback may vary by one between calls unless the ratio
+            divides ``num_samples`` exactly (which is required if
+            ``buffer_pool`` is used).
+
+            With ``workers``, the stateful processing (I/Q correction,
+            frequency shift, decimation, resampling and ``stages``) is applied
+            in order after the parallel conversion.
         """
 
-        num_bytes = 2*num_samples
+        if parallel_stages and not workers:
+            raise ValueError('parallel_stages requires workers')
+        if parallel_stages and (self.iq_corrector is not None or self.frequency_shifter is not None):
+            raise ValueError('parallel_stages can not be used with iq_correction or frequency_shift')
+        if dtype is None:
+            if isinstance(buffer_pool, SampleBufferPool):
+                dtype = buffer_pool.dtype
+            else:
+                dtype = self.DEFAULT_SAMPLE_DTYPE
+        num_bytes = num_samples * self.converter.get_bytes_per_sample(dtype)
+        num_output = self.converter.get_output_length(num_bytes, dtype)
+
+        extra_stages = list(stages or [])
+        stages = []
+        if decimation is not None:
+            if not isinstance(decimation, Decimator):
+                decimation = Decimator(decimation, taps)
+            if num_output % decimation.factor:
+                raise ValueError('num_samples must be a multiple of the decimation factor')
+            num_output //= decimation.factor
+            stages.append(decimation)
+        if output_rate is not None:
+            if not isinstance(output_rate, Resampler):
+                in_rate = self.get_sample_rate()
+                if decimation is not None:
+                    in_rate /= decimation.factor
+                output_rate = Resampler(in_rate, output_rate)
+            resampled_length = num_output * output_rate.up
+            if buffer_pool is not None and resampled_length % output_rate.down:
+                raise ValueError('num_samples must give a constant resampled length to use buffer_pool')
+            num_output = resampled_length // output_rate.down
+            stages.append(output_rate)
+
+        scratch = None
+        if stages:
+            # the full rate samples are only needed until the first stage
+            # has produced its (new) output array
+            scratch = np.empty(self.converter.get_output_length(num_bytes, dtype), dtype=dtype)
+        if extra_stages:
+            if buffer_pool is not None:
+                raise ValueError('buffer_pool can not be used with stages')
+            stages.extend(extra_stages)
+        if stages and np.dtype(dtype).kind not in 'cf':
+            raise ValueError('Processing stages are not supported for dtype "%s"' % (dtype))
+
+        if buffer_pool is not None and not isinstance(buffer_pool, SampleBufferPool):
+            buffer_pool = SampleBufferPool(buffer_pool, num_output, dtype)
 
         self._callback_samples = callback
-        self.read_bytes_async(self._samples_converter_callback, num_bytes, context)
+        self._samples_dtype = dtype
+        self._samples_buffer_pool = buffer_pool
+        self._samples_stages = stages
+        if squelch is not None and not isinstance(squelch, Squelch):
+            squelch = Squelch(squelch)
+        self._samples_squelch = squelch
+        self._samples_scratch = scratch
+        self._samples_parallel = None
+        if workers:
+            self._init_parallel(workers, max_in_flight, parallel_stages, num_bytes)
+        try:
+            self.read_bytes_async(
+                self._samples_converter_callback, num_bytes, context, ring_size=ring_size,
+                buf_num=buf_num, buf_len=buf_len, latency=latency,
+            )
+        finally:
+            if self._samples_parallel is not None:
+                self._samples_parallel.close(deliver=False)
+                self._samples_parallel = None
 
         return
 
+    def _init_parallel(self, workers, max_in_flight, parallel_stages, num_bytes):
+        parallel = OrderedExecutor(workers, max_in_flight, callback=self._deliver_parallel)
+        pool = self._samples_buffer_pool
+        if pool is not None and not self._samples_stages:
+            # every pending block is converted into its own pool array, and
+            # the last delivered one stays valid
+            if pool.num_buffers < parallel.max_in_flight + 1:
+                parallel.close(deliver=False)
+                raise ValueError(
+                    'buffer_pool needs at least %d arrays for max_in_flight=%d' % (
+                        parallel.max_in_flight + 1, parallel.max_in_flight,
+                    )
+                )
+        # one more raw slot than pending blocks, so one is always free
+        num_slots = parallel.max_in_flight + 1
+        self._parallel_raw = [np.empty(num_bytes, dtype=np.uint8) for _ in range(num_slots)]
+        self._parallel_free = collections.deque(range(num_slots))
+        self._parallel_scratch = None
+        if self._samples_scratch is not None:
+            self._parallel_scratch = [np.empty_like(self._samples_scratch) for _ in range(num_slots)]
+        self._parallel_stages = list(parallel_stages or [])
+        self._samples_parallel = parallel
+
     def _samples_converter_callback(self, buffer, context):
         """Converts the raw buffer used in ``rtlsdr_read_async`` to a usable type
 
@@ -804,8 +1517,72 @@ class RtlSdr(BaseRtlSdr):
             overridden by subclasses.
 
         """
-        iq = self.packed_bytes_to_iq(buffer)
+        squelch = self._samples_squelch
+        parallel = self._samples_parallel
+        if squelch is not None and not squelch.update(buffer):
+            if squelch.quiet_blocks == 'power':
+                if parallel is not None:
+                    # keep the order of the converted blocks
+                    parallel.submit(
+                        _passthrough, None, squelch.last_power, context, self.block_info,
+                    )
+                else:
+                    self._callback_samples(squelch.last_power, context)
+            return
+
+        pool = self._samples_buffer_pool
+        stages = self._samples_stages
+        if parallel is not None:
+            slot = self._parallel_free.popleft()
+            num_bytes = len(buffer)
+            memmove(self._parallel_raw[slot].ctypes.data, buffer, num_bytes)
+            if stages:
+                out = self._parallel_scratch[slot] if self._parallel_scratch else None
+            else:
+                out = pool.next_buffer() if pool is not None else None
+            parallel.submit(
+                self._convert_parallel, slot, num_bytes, out, context, self.block_info,
+            )
+            return
 
+        if stages:
+            out = self._samples_scratch
+        else:
+            out = pool.next_buffer() if pool is not None else None
+        iq = self._convert_samples(buffer, self._samples_dtype, out)
+        self._callback_samples(self._apply_sample_stages(iq), context)
+
+    def _apply_sample_stages(self, iq):
+        stages = self._samples_stages
+        if stages:
+            pool = self._samples_buffer_pool
+            for stage in stages[:-1]:
+                iq = stage.process(iq)
+            if pool is not None:
+                iq = stages[-1].process(iq, pool.next_buffer())
+            else:
+                iq = stages[-1].process(iq)
+        return iq
+
+    def _convert_parallel(self, slot, num_bytes, out, context, info):
+        # runs in a worker thread
+        iq = self.packed_bytes_to_iq(self._parallel_raw[slot][:num_bytes], self._samples_dtype, out)
+        for func in self._parallel_stages:
+            iq = func(iq)
+        return slot, iq, context, info
+
+    def _deliver_parallel(self, result):
+        # called in order from the thread submitting the blocks
+        slot, iq, context, info = result
+        if slot is not None:
+            self._parallel_free.append(slot)
+        if self.read_async_canceling:
+            return
+        self.block_info = info
+        if slot is not None:
+            # the shift runs here (rather than in the workers) so its phase
+            # follows the order of the blocks
+            iq = self._apply_sample_stages(self._process_samples(iq))
         self._callback_samples(iq, context)
 
     def cancel_read_async(self):
@@ -829,6 +1606,23 @@ class RtlSdr(BaseRtlSdr):
         self.read_async_canceling = True
 
 
+def _passthrough(*args):
+    return args
+
+
+def _processes_chunks(converter):
+    # PROCESS_CHUNKS only applies if it was declared along with (or below)
+    # the convert() method in use, which may not accept process_chunk
+    if not getattr(converter, 'PROCESS_CHUNKS', False):
+        return False
+    for cls in type(converter).__mro__:
+        if 'PROCESS_CHUNKS' in vars(cls):
+            return True
+        if 'convert' in vars(cls):
+            return False
+    return False
+
+
 class LibUSBError(IOError):
     _errno_map = {
         -1:  ('LIBUSB_ERROR_IO', 'Input/output error'),
@@ -28,8 +28,11 @@ Example:
 
 """
 
+import ctypes
 import logging
 import asyncio
+import threading
+import collections
 
 
 from .rtlsdr import RtlSdr
@@ -44,6 +47,10 @@ class AsyncCallbackIter:
 
     The queued data can be iterated using ``async for``
 
+    Data passed to the callback is added to a queue from the calling thread.
+    The event loop is only woken once for any number of items added between
+    its iterations (using :meth:`asyncio.AbstractEventLoop.call_soon_threadsafe`).
+
     Arguments:
         func_start: A callable which should take a single callback that will be
             passed data. Will be run in a separate thread in case it blocks.
@@ -53,15 +60,48 @@ class AsyncCallbackIter:
             that will be buffered.
         loop (optional): The ``asyncio.event_loop`` to use. If not supplied,
             :func:`asyncio.get_event_loop` will be used.
-
+        policy (:obj:`str`, optional): What to do when data arrives while the
+            queue is full. One of :attr:`POLICIES`:
+
+            * ``'drop-newest'`` (the default): discard the new data
+            * ``'drop-oldest'``: discard the oldest queued data
+            * ``'block'``: wait in the calling thread until there is room
+
+    Attributes:
+        dropped_newest (int): The number of items discarded by the
+            ``'drop-newest'`` policy
+        dropped_oldest (int): The number of items discarded by the
+            ``'drop-oldest'`` policy
+        blocked (int): The number of times the ``'block'`` policy made the
+            calling thread wait
+        wakeups (int): The number of times the event loop was woken for new
+            data
     '''
 
-    def __init__(self, func_start, func_stop=None, queue_size=20, *, loop=None):
-        self.queue = asyncio.Queue(queue_size)
+    POLICIES = ('drop-newest', 'drop-oldest', 'block')
+
+    def __init__(self, func_start, func_stop=None, queue_size=20, *, loop=None,
+                 policy='drop-newest'):
+        if policy not in self.POLICIES:
+            raise ValueError('policy must be one of %s' % (', '.join(self.POLICIES)))
+        if queue_size < 1:
+            raise ValueError('queue_size must be at least 1')
+        self.queue_size = queue_size
+        self.policy = policy
         self.loop = loop if loop else asyncio.get_event_loop()
         self.func_stop = func_stop
         self.func_start = func_start
 
+        self.items = collections.deque()
+        self.dropped_newest = 0
+        self.dropped_oldest = 0
+        self.blocked = 0
+        self.wakeups = 0
+        self._cond = threading.Condition()
+        self._wakeup_scheduled = False
+        self._ready = asyncio.Event()
+        self._stopping = False
+
         self.running = False
 
     async def add_to_queue(self, *args):
@@ -70,17 +110,51 @@ class AsyncCallbackIter:
         Arguments:
             *args: Arguments to be added
 
-        This method is a :obj:`~asyncio.coroutine`
+        This method is a :obj:`~asyncio.coroutine`.  Since it runs on the
+        event loop, the ``'block'`` policy drops the new item instead of
+        waiting.
         '''
-        try:
-            self.queue.put_nowait(args)
-        except asyncio.QueueFull:
-            log.info('extra callback data lost')
+        self._put(args, block=False)
+
+    def _put(self, item, block=True):
+        schedule = False
+        with self._cond:
+            if self._stopping:
+                return
+            if len(self.items) >= self.queue_size:
+                if self.policy == 'drop-oldest':
+                    self.items.popleft()
+                    self.dropped_oldest += 1
+                elif self.policy == 'block' and block:
+                    self.blocked += 1
+                    self._cond.wait_for(
+                        lambda: len(self.items) < self.queue_size or self._stopping
+                    )
+                    if self._stopping:
+                        return
+                else:
+                    self.dropped_newest += 1
+                    log.info('extra callback data lost')
+                    return
+            self.items.append(item)
+            if not self._wakeup_scheduled:
+                self._wakeup_scheduled = schedule = True
+        if schedule:
+            if block:
+                self.loop.call_soon_threadsafe(self._wakeup)
+            else:
+                self._wakeup()
+
+    def _wakeup(self):
+        with self._cond:
+            self._wakeup_scheduled = False
+        self.wakeups += 1
+        self._ready.set()
 
     def _callback(self, *args):
         if not self.running:
             return
-        asyncio.run_coroutine_threadsafe(self.add_to_queue(*args), self.loop)
+        self._put(args)
 
     async def start(self):
         '''Start the execution
@@ -94,11 +168,13 @@ class AsyncCallbackIter:
 
         assert(not self.running)
 
+        # set first so the earliest callbacks are not ignored
+        self.running = True
+
         # start legacy async function
         future = self.loop.run_in_executor(None, self.func_start, self._callback)
         asyncio.ensure_future(future, loop=self.loop)
         self.executor_task = future
-        self.running = True
 
     async def stop(self):
         '''Stop the running executor task
@@ -113,17 +189,13 @@ class AsyncCallbackIter:
 
         self.running = False
 
-        # send a signal to stop
-        iter_stopped = False
-        while not iter_stopped:
-            try:
-                self.queue.put_nowait((StopAsyncIteration(),))
-                iter_stopped = True
-            except asyncio.QueueFull:
-                try:
-                    self.queue.task_done()
-                except ValueError:
-                    pass
+        # send a signal to stop (after any queued data) and release a
+        # producer waiting for room
+        with self._cond:
+            self._stopping = True
+            self.items.append((StopAsyncIteration(),))
+            self._cond.notify_all()
+        self._ready.set()
         if self.func_stop:
             # stop legacy async function
             await self.loop.run_in_executor(None, self.func_stop)
@@ -133,8 +205,16 @@ class AsyncCallbackIter:
         return self
 
     async def __anext__(self):
-        val = await self.queue.get()
-        self.queue.task_done()
+        while True:
+            with self._cond:
+                if self.items:
+                    val = self.items.popleft()
+                    self._cond.notify()
+                    break
+                # cleared while holding the lock, so an item added after
+                # this will schedule a new wakeup
+                self._ready.clear()
+            await self._ready.wait()
 
         if isinstance(val[0], StopAsyncIteration):
             raise StopAsyncIteration
@@ -145,10 +225,239 @@ class AsyncCallbackIter:
         return val[0]
 
 
+class ChannelIter:
+    '''Iterate over the samples of a single :class:`~rtlsdr.dsp.Channelizer`
+    channel using ``async for``
+
+    The iterator subscribes to the channel on creation.  The channelizer may
+    be run from another thread (such as the one used by
+    :meth:`RtlSdrAio.stream_channels`).
+
+    Arguments:
+        channelizer: The :class:`~rtlsdr.dsp.Channelizer` instance
+        channel (int): The channel number
+        queue_size (:obj:`int`, optional): The maximum number of blocks
+            that will be buffered.
+        loop (optional): The ``asyncio.event_loop`` to use. If not supplied,
+            :func:`asyncio.get_event_loop` will be used.
+    '''
+
+    def __init__(self, channelizer, channel, queue_size=20, *, loop=None):
+        self.queue = asyncio.Queue(queue_size)
+        self.loop = loop if loop else asyncio.get_event_loop()
+        self.channelizer = channelizer
+        self.channel = channel
+        self.closed = False
+        channelizer.subscribe(channel, self._callback)
+
+    def _callback(self, samples, channel):
+        self.loop.call_soon_threadsafe(self._put, samples)
+
+    def _put(self, samples):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(samples)
+        except asyncio.QueueFull:
+            log.info('extra channel %d data lost', self.channel)
+
+    def close(self):
+        '''Unsubscribe from the channel and end the iteration
+
+        This must be called from the event loop thread.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self.channelizer.unsubscribe(self.channel, self._callback)
+        if self.queue.full():
+            # make room for the stop signal
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(StopAsyncIteration())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        val = await self.queue.get()
+        self.queue.task_done()
+
+        if isinstance(val, StopAsyncIteration):
+            raise StopAsyncIteration
+        return val
+
+
+class StreamBroadcast:
+    '''Share the blocks of one async iterator between several subscribers
+
+    Every subscriber (see :meth:`subscribe`) receives the same block objects,
+    so no copies are made per subscriber.  NumPy arrays are marked as
+    read-only, so one subscriber can not modify the data seen by the others.
+    ``ctypes`` byte buffers (the ``'bytes'`` format of :meth:`RtlSdrAio.stream`)
+    point into memory reused by ``librtlsdr``, so they are copied once into
+    :class:`bytes` objects.
+
+    Each subscriber has its own queue.  If a subscriber falls more than its
+    ``max_lag`` blocks behind, its oldest blocks are dropped (and counted)
+    without affecting the other subscribers.
+
+    Arguments:
+        source: The async iterator to read from (such as the one returned by
+            :meth:`RtlSdrAio.stream`)
+        loop (optional): The ``asyncio.event_loop`` to use. If not supplied,
+            :func:`asyncio.get_event_loop` will be used.
+
+    Attributes:
+        subscribers (list): The active :class:`BroadcastSubscriber` instances
+        closed (bool): Whether the source has ended or :meth:`close` was called
+    '''
+
+    def __init__(self, source, *, loop=None):
+        self.source = source
+        self.loop = loop if loop else asyncio.get_event_loop()
+        self.subscribers = []
+        self.closed = False
+        self.pump_task = asyncio.ensure_future(self._pump(), loop=self.loop)
+
+    def subscribe(self, max_lag=20):
+        '''Add a subscriber
+
+        Only blocks read after this call are passed to the subscriber.
+
+        Arguments:
+            max_lag (:obj:`int`, optional): The maximum number of blocks
+                queued for the subscriber
+
+        Returns:
+            BroadcastSubscriber: An async iterator over the blocks
+        '''
+        subscriber = BroadcastSubscriber(self, max_lag)
+        if self.closed:
+            subscriber._close()
+        else:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        '''Remove a subscriber and end its iteration
+
+        Arguments:
+            subscriber: The :class:`BroadcastSubscriber` to remove
+        '''
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        subscriber._close()
+
+    def close(self):
+        '''Stop passing blocks to the subscribers
+
+        Subscribers can still read any blocks already queued for them.
+        This must be called from the event loop thread.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber._close()
+
+    @staticmethod
+    def _make_read_only(data):
+        if isinstance(data, ctypes.Array):
+            return bytes(data)
+        flags = getattr(data, 'flags', None)
+        if flags is not None and flags.writeable:
+            data.flags.writeable = False
+        return data
+
+    async def _pump(self):
+        try:
+            async for block in self.source:
+                if self.closed:
+                    break
+                if isinstance(block, tuple):
+                    block = (self._make_read_only(block[0]),) + block[1:]
+                else:
+                    block = self._make_read_only(block)
+                for subscriber in self.subscribers:
+                    subscriber._put(block)
+        finally:
+            self.close()
+
+
+class BroadcastSubscriber:
+    '''An async iterator over the blocks of a :class:`StreamBroadcast`
+
+    Created by :meth:`StreamBroadcast.subscribe`.
+
+    Attributes:
+        max_lag (int): The maximum number of queued blocks
+        received (int): The number of blocks queued for this subscriber
+        dropped (int): The number of blocks dropped because the subscriber
+            fell more than :attr:`max_lag` blocks behind
+    '''
+
+    def __init__(self, broadcast, max_lag=20):
+        if max_lag < 1:
+            raise ValueError('max_lag must be at least 1')
+        self.broadcast = broadcast
+        self.max_lag = max_lag
+        self.items = collections.deque()
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    @property
+    def lag(self):
+        '''int: The number of blocks waiting to be read'''
+        return len(self.items)
+
+    def _put(self, block):
+        if len(self.items) >= self.max_lag:
+            self.items.popleft()
+            self.dropped += 1
+        self.items.append(block)
+        self.received += 1
+        self._ready.set()
+
+    def _close(self):
+        self.closed = True
+        self._ready.set()
+
+    def close(self):
+        '''Unsubscribe and end the iteration
+
+        Any queued blocks are discarded.  This must be called from the event
+        loop thread.
+        '''
+        self.broadcast.unsubscribe(self)
+        self.items.clear()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.items:
+            if self.closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        return self.items.popleft()
+
+
 class RtlSdrAio(RtlSdr):
     DEFAULT_READ_SIZE = 128*1024
 
-    def stream(self, num_samples_or_bytes=DEFAULT_READ_SIZE, format='samples', loop=None):
+    channel_iters = ()
+    broadcaster = None
+
+    def stream(self, num_samples_or_bytes=DEFAULT_READ_SIZE, format='samples', loop=None, dtype=None,
+               decimation=None, taps=None, output_rate=None, squelch=None,
+               stages=None, ring_size=None, buf_num=None, buf_len=None, latency=None,
+               with_info=False, queue_size=20, policy='drop-newest',
+               workers=None, max_in_flight=None, parallel_stages=None):
         """Start async streaming from SDR and return an async iterator (Python 3.5+).
 
         The :meth:`read_samples_async` method is called in an  :class:`~concurrent.futures.Excecutor`
@@ -163,31 +472,188 @@ class RtlSdrAio(RtlSdr):
         Arguments:
             num_samples_or_bytes (int): The number of bytes/samples that will be
                 returned each iteration
-            format (:obj:`str`, optional): Specifies whether raw data ("bytes")
-                or IQ samples ("samples") will be returned
+            format (:obj:`str`, optional): Specifies whether raw data ("bytes"),
+                IQ samples ("samples"), interleaved integer IQ samples
+                ("int8" or "int16") or real samples of the direct sampling
+                branch ("real") will be returned
             loop (optional): An asyncio event loop
+            dtype (optional): The data type of the samples if ``format`` is
+                "samples" or "real"
+                (see :meth:`~rtlsdr.rtlsdr.BaseRtlSdr.packed_bytes_to_iq`).
+                For "real", this defaults to
+                :attr:`~rtlsdr.rtlsdr.BaseRtlSdr.REAL_SAMPLE_DTYPE`
+            decimation (optional): The decimation factor (or
+                :class:`~rtlsdr.dsp.Decimator`) applied if ``format`` is
+                "samples" or "real"
+                (see :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`)
+            taps (optional): The filter taps used for ``decimation``
+            output_rate (optional): The sample rate (or
+                :class:`~rtlsdr.dsp.Resampler`) to resample to if ``format``
+                is "samples" or "real"
+            squelch (optional): The squelch threshold in dB (or
+                :class:`~rtlsdr.dsp.Squelch`) used to skip quiet blocks
+                unless ``format`` is "bytes"
+                (see :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`)
+            stages (optional): Additional :class:`~rtlsdr.dsp.Stage`
+                instances (such as :class:`~rtlsdr.dsp.FMDemodulator`)
+                applied if ``format`` is "samples" or "real"
+            ring_size (optional): The number of blocks in the ring buffer
+                between the USB transfers and the iterator
+                (see :meth:`~rtlsdr.rtlsdr.RtlSdr.read_bytes_async`)
+            buf_num (optional): The number of USB transfer buffers
+            buf_len (optional): The length of each USB transfer in bytes
+            latency (optional): Choose ``buf_num`` and ``buf_len`` from a
+                target latency in seconds
+                (see :meth:`~rtlsdr.rtlsdr.RtlSdr.get_async_buffer_params`)
+            with_info (:obj:`bool`, optional): If True, the iterator yields
+                tuples of the data and its :class:`~rtlsdr.buffers.BlockInfo`
+            queue_size (:obj:`int`, optional): The maximum number of blocks
+                buffered by the iterator
+            policy (:obj:`str`, optional): What to do with new blocks while
+                the queue is full (see :class:`AsyncCallbackIter`)
+            workers (optional): Convert blocks in a pool of this many threads
+                unless ``format`` is "bytes"
+                (see :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`)
+            max_in_flight (optional): The maximum number of blocks being
+                converted at once by ``workers``
+            parallel_stages (optional): Stateless functions applied to each
+                block in the ``workers`` threads (not with
+                :attr:`~rtlsdr.rtlsdr.BaseRtlSdr.iq_correction` or
+                :attr:`~rtlsdr.rtlsdr.BaseRtlSdr.frequency_shift`)
 
         Returns:
             An ``asynchronous iterator`` to yield sample data
         """
+        read_kwargs = dict(
+            ring_size=ring_size, buf_num=buf_num, buf_len=buf_len, latency=latency,
+        )
+        sample_kwargs = dict(
+            read_kwargs, workers=workers, max_in_flight=max_in_flight,
+            parallel_stages=parallel_stages,
+        )
         if format == 'samples':
-            func_start = self.read_samples_async
+            func_start = lambda cb: self.read_samples_async(
+                cb, num_samples_or_bytes, dtype=dtype, decimation=decimation, taps=taps,
+                output_rate=output_rate, squelch=squelch, stages=stages,
+                **sample_kwargs
+            )
+        elif format in ('int8', 'int16'):
+            func_start = lambda cb: self.read_samples_async(
+                cb, num_samples_or_bytes, dtype=format, squelch=squelch,
+                **sample_kwargs
+            )
+        elif format == 'real':
+            func_start = lambda cb: self.read_samples_async(
+                cb, num_samples_or_bytes, dtype=dtype or self.REAL_SAMPLE_DTYPE,
+                decimation=decimation, taps=taps, output_rate=output_rate,
+                squelch=squelch, stages=stages, **sample_kwargs
+            )
         elif format == 'bytes':
-            func_start = self.read_bytes_async
+            func_start = lambda cb: self.read_bytes_async(
+                cb, num_samples_or_bytes, **read_kwargs
+            )
         else:
             raise ValueError('format "%s" not supported' % format)
 
-        self.async_iter = AsyncCallbackIter(func_start=lambda cb: func_start(cb, num_samples_or_bytes),
+        if with_info:
+            func_start = self._wrap_info_callback(func_start)
+
+        self.async_iter = AsyncCallbackIter(func_start=func_start,
                                             func_stop=self.cancel_read_async,
-                                            loop=loop)
+                                            queue_size=queue_size,
+                                            loop=loop, policy=policy)
         asyncio.ensure_future(self.async_iter.start(), loop=loop)
 
         return self.async_iter
 
+    def _wrap_info_callback(self, func_start):
+        # pair each block with its metadata before it is queued
+        def start(cb):
+            def info_callback(data, context):
+                cb((data, self.block_info), context)
+            return func_start(info_callback)
+        return start
+
+    def broadcast(self, num_samples_or_bytes=DEFAULT_READ_SIZE, format='samples',
+                  loop=None, **kwargs):
+        """Start async streaming and share the blocks between several
+        async iterators
+
+        This calls :meth:`stream` with the given arguments and returns a
+        :class:`StreamBroadcast` for it.  Each call to
+        :meth:`StreamBroadcast.subscribe` gives an independent async iterator
+        over the same (read-only) blocks.
+
+        Arguments:
+            num_samples_or_bytes (int): The number of samples or bytes in each
+                block (see :meth:`stream`)
+            format (str): The data format (see :meth:`stream`)
+            loop (optional): The ``asyncio.event_loop`` to use
+            **kwargs: Passed to :meth:`stream`
+
+        Returns:
+            StreamBroadcast:
+
+        Examples:
+            >>> broadcast = sdr.broadcast(256*1024)
+            >>> recorder = broadcast.subscribe(max_lag=100)
+            >>> monitor = broadcast.subscribe(max_lag=2)
+        """
+        async_iter = self.stream(num_samples_or_bytes, format, loop=loop, **kwargs)
+        self.broadcaster = StreamBroadcast(async_iter, loop=async_iter.loop)
+        return self.broadcaster
+
+    def stream_channels(self, channelizer, channels, num_samples=DEFAULT_READ_SIZE,
+                        loop=None, dtype=None, queue_size=20):
+        """Start async streaming through a channelizer and return an async
+        iterator for each of the given channels
+
+        This works like :meth:`stream`, but the samples are passed to
+        ``channelizer`` (in the executor thread), and the iterators yield the
+        samples of their channel.  Other subscriptions to ``channelizer``
+        (see :meth:`~rtlsdr.dsp.Channelizer.subscribe`) are also called.
+
+        Calling :meth:`stop` will stop streaming and end the iterators.
+
+        Arguments:
+            channelizer: The :class:`~rtlsdr.dsp.Channelizer` to use
+            channels: The channel numbers to iterate over
+            num_samples (int): The number of samples read (before
+                channelizing) for each block
+            loop (optional): An asyncio event loop
+            dtype (optional): The complex data type of the samples
+            queue_size (:obj:`int`, optional): The maximum number of blocks
+                buffered for each channel
+
+        Returns:
+            list: A :class:`ChannelIter` for each of the ``channels``
+        """
+        loop = loop if loop else asyncio.get_event_loop()
+        self.channel_iters = [
+            ChannelIter(channelizer, channel, queue_size, loop=loop) for channel in channels
+        ]
+        func_start = lambda cb: self.read_samples_async(channelizer, num_samples, dtype=dtype)
+
+        self.async_iter = AsyncCallbackIter(func_start=func_start,
+                                            func_stop=self.cancel_read_async,
+                                            loop=loop)
+        asyncio.ensure_future(self.async_iter.start(), loop=loop)
+
+        return list(self.channel_iters)
+
     def stop(self):
         """Stop async stream
 
         Stops the ``read_samples_async`` and ``Excecutor`` task created by
-        :meth:`stream`.
+        :meth:`stream` (or :meth:`stream_channels` or :meth:`broadcast`).
         """
-        return asyncio.ensure_future(self.async_iter.stop(), loop=self.async_iter.loop)
+        return asyncio.ensure_future(self._stop(), loop=self.async_iter.loop)
+
+    async def _stop(self):
+        await self.async_iter.stop()
+        if self.broadcaster is not None:
+            self.broadcaster.close()
+            self.broadcaster = None
+        for channel_iter in self.channel_iters:
+            channel_iter.close()
+        self.channel_iters = ()
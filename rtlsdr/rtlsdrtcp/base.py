@@ -7,12 +7,7 @@ import errno
 import traceback
 import json
 
-
-has_numpy = True
-try:
-    import numpy as np
-except ImportError:
-    has_numpy = False
+from ..conversion import LUTConverter, REAL_DTYPES, get_dtype_name
 
 
 DEFAULT_READ_SIZE = 1024
@@ -43,6 +38,10 @@ class RtlSdrTcpBase(object):
     """
     # Use port 1235 as default since rtl_tcp uses 1234
     DEFAULT_PORT = 1235
+    DEFAULT_SAMPLE_DTYPE = 'complex128'
+
+    converter = LUTConverter()
+    _direct_sampling = 0
 
     def __init__(self, device_index=0, test_mode_enabled=False,
                  hostname='127.0.0.1', port=None):
@@ -55,21 +54,18 @@ class RtlSdrTcpBase(object):
         self.device_ready = False
         self.server_thread = None
 
-    def packed_bytes_to_iq(self, bytes):
-        """A direct copy of :meth:`rtlsdr.BaseRtlSdr.packed_bytes_to_iq`
+    def packed_bytes_to_iq(self, bytes, dtype=None, out=None):
+        """Same as :meth:`rtlsdr.BaseRtlSdr.packed_bytes_to_iq` (using the
+        :attr:`converter` of this instance)
         """
 
-        if has_numpy:
-            # use NumPy array
-            data = np.ctypeslib.as_array(bytes)
-            iq = data.astype(np.float64).view(np.complex128)
-            iq /= 127.5
-            iq -= (1 + 1j)
-        else:
-            # use normal list
-            iq = [complex(i/(255/2) - 1, q/(255/2) - 1) for i, q in zip(bytes[::2], bytes[1::2])]
-
-        return iq
+        if dtype is None and out is None:
+            dtype = self.DEFAULT_SAMPLE_DTYPE
+        if self._direct_sampling == 2:
+            dtype = self.converter.resolve_dtype(dtype, out)
+            if get_dtype_name(dtype) in REAL_DTYPES:
+                return self.converter.convert(bytes, dtype, out, branch=1)
+        return self.converter.convert(bytes, dtype, out)
 
 
 API_METHODS = (
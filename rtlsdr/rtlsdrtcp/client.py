@@ -117,6 +117,10 @@ class RtlSdrTcpClient(RtlSdrTcpBase):
 
     def set_direct_sampling(self, value):
         self._communicate_method('set_direct_sampling', value)
+        # kept to select the branch of real samples (see packed_bytes_to_iq)
+        if isinstance(value, str):
+            value = {'i': 1, 'q': 2}.get(value.lower(), 0)
+        self._direct_sampling = int(value or 0)
 
     def set_bias_tee(self, value):
         self._communicate_method('set_bias_tee', value)
@@ -124,9 +128,9 @@ class RtlSdrTcpClient(RtlSdrTcpBase):
     def read_bytes(self, num_bytes=DEFAULT_READ_SIZE):
         return self._communicate_method('read_bytes', num_bytes)
 
-    def read_samples(self, num_samples=DEFAULT_READ_SIZE):
+    def read_samples(self, num_samples=DEFAULT_READ_SIZE, dtype=None, out=None):
         raw_data = self._communicate_method('read_samples', num_samples)
-        iq = self.packed_bytes_to_iq(raw_data)
+        iq = self.packed_bytes_to_iq(raw_data, dtype, out)
         return iq
 
     def read_samples_async(self, *args):
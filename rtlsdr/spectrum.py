@@ -0,0 +1,259 @@
+"""
+This module contains a streaming power spectral density estimator.
+
+:class:`WelchPSD` splits a stream of sample blocks into (optionally
+overlapping) windowed segments and averages their periodograms (Welch's
+method).  Segments may span block boundaries, so no samples are discarded.
+
+An instance can be passed directly as the callback for
+:meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`, or fed from
+:meth:`~rtlsdr.rtlsdraio.RtlSdrAio.stream`.
+
+Example:
+    .. code-block:: python
+
+       import numpy as np
+       from rtlsdr import RtlSdr
+       from rtlsdr.spectrum import WelchPSD
+
+       sdr = RtlSdr()
+
+       def on_psd(psd, estimator):
+           print(10 * np.log10(psd).max())
+
+       estimator = WelchPSD(
+           nfft=1024, noverlap=512, num_averages=16,
+           sample_rate=sdr.sample_rate, center_freq=sdr.center_freq,
+           callback=on_psd,
+       )
+       sdr.read_samples_async(estimator, 64*1024)
+
+Notes:
+    This requires NumPy
+"""
+
+from __future__ import division
+
+has_numpy = True
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import as_strided
+except ImportError:
+    has_numpy = False
+
+
+class WelchPSD(object):
+    """Incremental Welch power spectral density estimate
+
+    The scaling matches :func:`matplotlib.mlab.psd` (power per unit
+    frequency).  Complex input produces a two-sided spectrum ordered from
+    ``-sample_rate / 2`` to ``sample_rate / 2``. Real input (such as a
+    demodulated signal) produces a one-sided spectrum from 0 to
+    ``sample_rate / 2``.
+
+    Arguments:
+        nfft (:obj:`int`, optional): The length of each segment (and FFT).
+            Default is ``1024``
+        noverlap (:obj:`int`, optional): The number of samples shared by
+            consecutive segments. Default is ``0``
+        window (optional): The window applied to each segment as an array of
+            length ``nfft``.  If not given, a Hann window is used
+        sample_rate (:obj:`float`, optional): The sample rate used to scale
+            the estimate and for :attr:`frequencies`.  Default is ``2``
+            (the default of :func:`matplotlib.mlab.psd`)
+        center_freq (:obj:`float`, optional): Offset added to
+            :attr:`frequencies`.  Default is ``0``
+        num_averages (:obj:`int`, optional): The number of segments averaged
+            for each estimate.  If None (the default), all segments since the
+            last call to :meth:`reset` are averaged.
+        callback (optional): A function called for each completed estimate
+            with the signature ``callback(psd, estimator)``
+
+    Attributes:
+        psd (numpy.ndarray): The latest estimate.  This array is reused for
+            every estimate and should be copied if it needs to be kept.
+        num_segments (int): The number of segments in the current average
+        CHUNK_SIZE (int): The maximum number of segments transformed at a time
+    """
+
+    CHUNK_SIZE = 16
+
+    def __init__(self, nfft=1024, noverlap=0, window=None, sample_rate=2.,
+                 center_freq=0., num_averages=None, callback=None):
+        if not has_numpy:
+            raise ImportError('WelchPSD requires NumPy')
+        nfft = int(nfft)
+        if nfft < 1:
+            raise ValueError('nfft must be at least 1')
+        if not 0 <= noverlap < nfft:
+            raise ValueError('noverlap must be in the range [0, nfft)')
+        if num_averages is not None and num_averages < 1:
+            raise ValueError('num_averages must be at least 1')
+        if window is None:
+            window = np.hanning(nfft)
+        window = np.asarray(window, dtype=np.float64)
+        if window.shape != (nfft,):
+            raise ValueError('window must have a length of nfft')
+        self.nfft = nfft
+        self.noverlap = int(noverlap)
+        self.window = window
+        self.sample_rate = float(sample_rate)
+        self.center_freq = float(center_freq)
+        self.num_averages = num_averages
+        self.callback = callback
+        self.psd = None
+        self._is_complex = None
+        self._windows = {}
+        self._data = None
+        self._frames = None
+        self._power = None
+        self._accum = None
+        self.reset()
+
+    @property
+    def step(self):
+        """int: The number of samples between the start of each segment"""
+        return self.nfft - self.noverlap
+
+    @property
+    def frequencies(self):
+        """numpy.ndarray: The frequency of each bin in :attr:`psd`
+
+        This is only available after the first call to :meth:`update` (since
+        it depends on whether the samples are real or complex)
+        """
+        if self._is_complex is None:
+            return None
+        if self._is_complex:
+            freqs = np.fft.fftshift(np.fft.fftfreq(self.nfft, 1 / self.sample_rate))
+        else:
+            freqs = np.fft.rfftfreq(self.nfft, 1 / self.sample_rate)
+        return freqs + self.center_freq
+
+    def reset(self):
+        """Discard any partial segments and the current average
+        """
+        self._tail = None
+        self._skip = 0
+        self.num_segments = 0
+        if self._accum is not None:
+            self._accum[...] = 0
+
+    def _get_buffer(self, name, shape, dtype):
+        buf = getattr(self, name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            setattr(self, name, buf)
+        return buf
+
+    def _get_window(self, dtype):
+        window = self._windows.get(dtype)
+        if window is None:
+            window = self._windows[dtype] = self.window.astype(dtype)
+        return window
+
+    def _init_output(self, samples):
+        is_complex = samples.dtype.kind == 'c'
+        if is_complex == self._is_complex:
+            return
+        self._is_complex = is_complex
+        num_bins = self.nfft if is_complex else self.nfft // 2 + 1
+        self._accum = np.zeros(num_bins, dtype=np.float64)
+        self.psd = np.zeros(num_bins, dtype=np.float64)
+        self.num_segments = 0
+
+    def update(self, samples):
+        """Add a block of samples to the estimate
+
+        Arguments:
+            samples: The samples (real or complex)
+
+        Returns:
+            numpy.ndarray: :attr:`psd` if an estimate was completed from
+            this block (or, if :attr:`num_averages` is None, if any segments
+            were added), otherwise None
+        """
+        samples = np.asarray(samples)
+        self._init_output(samples)
+        nfft, step = self.nfft, self.step
+
+        # join the unused samples from the previous block with this one
+        tail = self._tail
+        num_tail = 0 if tail is None else len(tail)
+        data = self._get_buffer('_data', (num_tail + len(samples),), samples.dtype)
+        if num_tail:
+            data[:num_tail] = tail
+        data[num_tail:] = samples
+
+        start_index = self._skip
+        completed = False
+        if len(data) >= start_index + nfft:
+            num_frames = (len(data) - start_index - nfft) // step + 1
+            itemsize = data.itemsize
+            frames = as_strided(
+                data[start_index:], shape=(num_frames, nfft),
+                strides=(step * itemsize, itemsize), writeable=False,
+            )
+            completed = self._add_frames(frames)
+            start_index += num_frames * step
+
+        if start_index < len(data):
+            self._tail = data[start_index:].copy()
+            self._skip = 0
+        else:
+            self._tail = None
+            self._skip = start_index - len(data)
+
+        if self.num_averages is None and self.num_segments:
+            self._finish_estimate(reset=False)
+            completed = True
+        return self.psd if completed else None
+
+    def __call__(self, samples, context=None):
+        """Same as :meth:`update` with the signature of the callbacks used by
+        :meth:`~rtlsdr.rtlsdr.RtlSdr.read_samples_async`
+        """
+        return self.update(samples)
+
+    def _add_frames(self, frames):
+        completed = False
+        window = self._get_window(frames.real.dtype)
+        num_frames = len(frames)
+        index = 0
+        while index < num_frames:
+            count = min(num_frames - index, self.CHUNK_SIZE)
+            if self.num_averages is not None:
+                count = min(count, self.num_averages - self.num_segments)
+            chunk = self._get_buffer('_frames', (self.CHUNK_SIZE, self.nfft), frames.dtype)[:count]
+            np.multiply(frames[index:index+count], window, out=chunk)
+            if self._is_complex:
+                spectrum = np.fft.fft(chunk, axis=1)
+            else:
+                spectrum = np.fft.rfft(chunk, axis=1)
+            power = self._get_buffer('_power', spectrum.shape, spectrum.real.dtype)
+            np.multiply(spectrum.real, spectrum.real, out=power)
+            power += spectrum.imag * spectrum.imag
+            self._accum += power.sum(axis=0)
+            self.num_segments += count
+            index += count
+            if self.num_averages is not None and self.num_segments == self.num_averages:
+                self._finish_estimate(reset=True)
+                completed = True
+        return completed
+
+    def _finish_estimate(self, reset):
+        psd = self.psd
+        scale = 1 / (self.sample_rate * np.dot(self.window, self.window) * self.num_segments)
+        np.multiply(self._accum, scale, out=psd)
+        if self._is_complex:
+            # order the bins from -sample_rate/2 to sample_rate/2
+            psd[...] = np.fft.fftshift(psd)
+        else:
+            # one-sided, so fold in the power of the negative frequencies
+            end_index = -1 if self.nfft % 2 == 0 else None
+            psd[1:end_index] *= 2
+        if reset:
+            self._accum[...] = 0
+            self.num_segments = 0
+        if self.callback is not None:
+            self.callback(psd, self)
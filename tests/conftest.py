@@ -61,5 +61,8 @@ def librtlsdr_override(request,
 def use_numpy(request, monkeypatch):
     if not request.param:
         monkeypatch.setattr('rtlsdr.rtlsdr.has_numpy', False)
-        monkeypatch.setattr('rtlsdr.rtlsdrtcp.base.has_numpy', False)
+        monkeypatch.setattr('rtlsdr.conversion.has_numpy', False)
+        monkeypatch.setattr('rtlsdr.buffers.has_numpy', False)
+        monkeypatch.setattr('rtlsdr.dsp.has_numpy', False)
+        monkeypatch.setattr('rtlsdr.spectrum.has_numpy', False)
     return request.param
@@ -1,7 +1,7 @@
 import pytest
 
 
-@pytest.fixture(params=['samples', 'bytes'])
+@pytest.fixture(params=['samples', 'bytes', 'int8', 'int16', 'real'])
 def read_format(request):
     return request.param
 
@@ -24,12 +24,24 @@ async def test(read_format):
     print('  gain: %d dB' % sdr.gain)
 
 
+    if read_format == 'real':
+        sdr.set_direct_sampling('i')
+
     print('Streaming %s...' % (read_format))
 
     i = 0
     async_iter = sdr.stream(num_samples_or_bytes=num_samples, format=read_format)
     async for samples in async_iter:
-        assert len(samples) == num_samples
+        if read_format in ('int8', 'int16'):
+            # interleaved I/Q values
+            assert len(samples) == num_samples * 2
+            assert samples.dtype.name == read_format
+            samples = samples[::2] + 1j * samples[1::2]
+        elif read_format == 'real':
+            assert len(samples) == num_samples
+            assert samples.dtype.name == 'float32'
+        else:
+            assert len(samples) == num_samples
         if read_format == 'bytes':
             samples = sdr.packed_bytes_to_iq(samples)
         power = sum(abs(s)**2 for s in samples) / len(samples)
@@ -51,3 +63,170 @@ async def test(read_format):
     print('Done')
 
     sdr.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_channels():
+    pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import Channelizer
+
+    num_samples = 16*1024
+    sdr = RtlSdr()
+    channelizer = Channelizer(16)
+    channel_iters = sdr.stream_channels(channelizer, [0, -2], num_samples)
+    assert channelizer.channels == [0, 14]
+
+    num_blocks = 0
+    async for channel_samples in channel_iters[1]:
+        assert len(channel_samples) == num_samples // 16
+        num_blocks += 1
+        if num_blocks >= 3:
+            break
+    await sdr.stop()
+
+    assert channelizer.channels == []
+    # both iterators end after stop()
+    for channel_iter in channel_iters:
+        async for channel_samples in channel_iter:
+            pass
+
+    sdr.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_info():
+    from rtlsdr import RtlSdr
+    from rtlsdr.buffers import BlockInfo
+
+    num_samples = 1024
+    sdr = RtlSdr()
+    sdr.rs = 2.4e6
+    sdr.fc = 100e6
+
+    received = []
+    async for samples, info in sdr.stream(num_samples, with_info=True):
+        assert len(samples) == num_samples
+        assert isinstance(info, BlockInfo)
+        received.append(info)
+        if len(received) >= 5:
+            break
+    await sdr.stop()
+
+    assert [info.sequence for info in received] == list(range(5))
+    assert [info.sample_index for info in received] == [i * num_samples for i in range(5)]
+    assert all(info.center_freq == 100e6 for info in received)
+    sdr.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('policy', ['drop-newest', 'drop-oldest', 'block'])
+async def test_callback_iter_policies(policy):
+    import asyncio
+    import threading
+    from rtlsdr.rtlsdraio import AsyncCallbackIter
+
+    finished = threading.Event()
+    async_iter = AsyncCallbackIter(
+        func_start=lambda cb: finished.wait(), func_stop=finished.set,
+        queue_size=2, policy=policy,
+    )
+    try:
+        await async_iter.start()
+
+        if policy == 'block':
+            loop = asyncio.get_event_loop()
+            producer = loop.run_in_executor(
+                None, lambda: [async_iter._callback(i, None) for i in range(10)],
+            )
+            received = []
+            for _ in range(10):
+                received.append(await async_iter.__anext__())
+            await producer
+            assert received == list(range(10))
+            assert async_iter.blocked > 0
+            assert async_iter.dropped_newest == async_iter.dropped_oldest == 0
+        else:
+            # called from the loop thread, so all items arrive before the
+            # loop can run the wakeup
+            for i in range(10):
+                async_iter._callback(i, None)
+            await asyncio.sleep(0)
+            assert async_iter.wakeups == 1
+            received = [await async_iter.__anext__(), await async_iter.__anext__()]
+            if policy == 'drop-newest':
+                assert received == [0, 1]
+                assert async_iter.dropped_newest == 8
+            else:
+                assert received == [8, 9]
+                assert async_iter.dropped_oldest == 8
+
+        await async_iter.stop()
+        with pytest.raises(StopAsyncIteration):
+            await async_iter.__anext__()
+    finally:
+        finished.set()
+
+    with pytest.raises(ValueError):
+        AsyncCallbackIter(func_start=None, policy='foo')
+
+
+@pytest.mark.asyncio
+async def test_broadcast():
+    from rtlsdr import RtlSdr
+
+    num_samples = 1024
+    sdr = RtlSdr()
+    sdr.rs = 2.4e6
+
+    broadcast = sdr.broadcast(num_samples)
+    fast = broadcast.subscribe(max_lag=50)
+    slow = broadcast.subscribe(max_lag=2)
+
+    received = []
+    stopped = False
+    try:
+        async for samples in fast:
+            received.append(samples)
+            if len(received) >= 6:
+                break
+        assert all(not s.flags.writeable for s in received)
+        with pytest.raises(ValueError):
+            received[0][0] = 0
+
+        # the slow subscriber only keeps the latest blocks, which are the
+        # same objects given to the fast one
+        assert slow.lag == 2
+        assert slow.dropped == slow.received - 2 >= 4
+        assert fast.dropped == 0
+        latest = await slow.__anext__()
+        assert any(latest is s for s in received)
+
+        slow.close()
+        assert slow not in broadcast.subscribers
+        with pytest.raises(StopAsyncIteration):
+            await slow.__anext__()
+
+        await sdr.stop()
+        stopped = True
+        async for samples in fast:
+            pass
+        assert broadcast.closed
+        late = broadcast.subscribe()
+        with pytest.raises(StopAsyncIteration):
+            await late.__anext__()
+
+        # raw blocks are copied out of the buffers reused by librtlsdr
+        broadcast = sdr.broadcast(num_samples * 2, format='bytes')
+        subscriber = broadcast.subscribe()
+        stopped = False
+        first = await subscriber.__anext__()
+        second = await subscriber.__anext__()
+        assert type(first) is bytes and len(first) == num_samples * 2
+        assert first is not second
+        await sdr.stop()
+        stopped = True
+    finally:
+        if not stopped:
+            await sdr.stop()
+        sdr.close()
@@ -168,3 +168,61 @@ def test_error_codes(monkeypatch):
             assert exc.value.errno == errno
             assert err_id in str(exc.value)
             assert err_msg in str(exc.value)
+
+def test_sample_dtype():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    sdr = RtlSdr()
+    raw_data = sdr.read_bytes(2048)
+    expected = sdr.packed_bytes_to_iq(raw_data)
+    assert expected.dtype == np.complex128
+    for dtype in ['complex64', np.complex64, np.complex128]:
+        iq = sdr.packed_bytes_to_iq(raw_data, dtype)
+        assert iq.dtype == np.dtype(dtype)
+        assert np.allclose(iq, expected, atol=1e-6)
+    samples = sdr.read_samples(1024, dtype='complex64')
+    assert samples.dtype == np.complex64
+    assert len(samples) == 1024
+    with pytest.raises(ValueError):
+        sdr.packed_bytes_to_iq(raw_data, 'uint16')
+    sdr.close()
+
+def test_direct_sampling_real(use_numpy):
+    from rtlsdr import RtlSdr
+    from utils import check_generated_data
+    sdr = RtlSdr()
+    assert sdr.direct_sampling == 0
+    sdr.direct_sampling = 'i'
+    assert sdr.get_direct_sampling() == 1
+
+    # the data is still I/Q, so the samples stay complex by default
+    samples = sdr.read_samples(1024)
+    assert len(samples) == 1024
+    if use_numpy:
+        assert samples.dtype.name == sdr.DEFAULT_SAMPLE_DTYPE
+    assert sdr.block_info.num_samples == 1024
+
+    # real output takes the selected branch of each I/Q pair
+    samples = sdr.read_samples(1024, dtype='float32')
+    assert len(samples) == 1024
+    raw_values = [int(round((s + 1) * 127.5)) for s in samples]
+    check_generated_data(raw_values, 1)
+    if use_numpy:
+        assert samples.dtype.name == 'float32'
+    assert sdr.block_info.num_samples == 1024
+
+    sdr.direct_sampling = 'q'
+    samples = sdr.read_samples(1024, dtype='float64')
+    assert len(samples) == 1024
+    raw_values = [int(round((s + 1) * 127.5)) for s in samples]
+    check_generated_data(raw_values, 2)
+    if use_numpy:
+        import numpy as np
+        out = np.empty(1024, dtype='float32')
+        raw_data = sdr.read_bytes(2048)
+        assert sdr.packed_bytes_to_iq(raw_data, out=out) is out
+        assert np.allclose(out, sdr.packed_bytes_to_iq(raw_data, 'complex64').imag, atol=1e-6)
+
+    sdr.set_direct_sampling(False)
+    assert sdr.direct_sampling == 0
+    sdr.close()
@@ -0,0 +1,143 @@
+import time
+import threading
+
+import pytest
+
+from conftest import is_travisci
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_device_broker():
+    from rtlsdr.rtlsdr import RtlSdr
+    from rtlsdr.broker import DeviceBroker
+
+    serial_numbers = ['00000001', '00000002', '00000003']
+
+    attempts = []
+    open_hooks = []
+
+    class TunerSdr(RtlSdr):
+        # the emulated library reports the same tuner for every device
+        def get_tuner_type(self):
+            return 6 if self.serial_number == '00000003' else 5
+        def __init__(self, serial_number=None, **kwargs):
+            self.serial_number = serial_number
+            self.num_opens = 0
+            attempts.append(serial_number)
+            super(TunerSdr, self).__init__(serial_number=serial_number, **kwargs)
+        def open(self, *args, **kwargs):
+            self.num_opens += 1
+            for hook in open_hooks:
+                hook()
+            super(TunerSdr, self).open(*args, **kwargs)
+
+    class RetryBroker(DeviceBroker):
+        RETRY_DELAY = .1
+        MAX_RETRY_DELAY = .2
+
+    with pytest.raises(ValueError):
+        DeviceBroker(['00000001', '00000001'])
+
+    broker = RetryBroker(serial_numbers + ['99999999'], device_class=TunerSdr)
+    assert broker.available == serial_numbers
+    assert broker.devices['99999999'] is None
+    assert isinstance(broker.errors['99999999'], IOError)
+    assert broker.tuner_types == {'00000001': 5, '00000002': 5, '00000003': 6}
+
+    settings = {'sample_rate': 1.2e6, 'center_freq': 100e6}
+    with broker.lease(tuner_type='r828d', settings=settings) as lease:
+        assert lease.serial_number == '00000003'
+        assert lease.applied == ['sample_rate', 'center_freq']
+        assert lease.sdr.center_freq == 100e6
+        assert broker.num_leased == 1
+        assert '00000003' not in broker.available
+        with pytest.raises(TimeoutError):
+            broker.lease(tuner_type='R828D', timeout=.05)
+    assert lease.released
+    sdr = lease.sdr
+
+    # the device stays open and keeps its settings
+    lease = broker.lease('00000003', settings=settings)
+    assert lease.sdr is sdr
+    assert sdr.num_opens == 1
+    assert lease.applied == []
+    # changes made by the job are reapplied next time
+    lease.sdr.center_freq = 90e6
+    lease.release()
+    with broker.lease('00000003', settings=settings) as lease:
+        assert lease.applied == ['center_freq']
+
+    # values the device reports differently are still remembered
+    settings = {'center_freq': 100.0005e6, 'gain': 'auto'}
+    with broker.lease('00000003', settings=settings) as lease:
+        assert lease.applied == ['center_freq', 'gain']
+        assert lease.sdr.center_freq != settings['center_freq']
+    with broker.lease('00000003', settings=settings) as lease:
+        assert lease.applied == []
+
+    # the device needing the fewest changes is chosen
+    with broker.lease(tuner_type=5, settings={'sample_rate': 2.4e6}) as lease:
+        assert lease.serial_number == '00000001'
+    with broker.lease(tuner_type=5, settings={'sample_rate': 2.4e6}) as lease:
+        assert lease.serial_number == '00000001'
+        assert lease.applied == []
+
+    # wait for a lease to be released by another job
+    lease = broker.lease('00000002')
+    def release_later():
+        time.sleep(.05)
+        lease.release()
+    thread = threading.Thread(target=release_later)
+    thread.start()
+    with broker.lease('00000002', timeout=5) as second_lease:
+        assert lease.released
+        assert second_lease.sdr is lease.sdr
+    thread.join()
+
+    # devices closed after an error are opened again, without blocking
+    # the other leases
+    lease = broker.lease('00000002')
+    lease.sdr.close()
+    lease.release()
+    others = []
+    def lease_other():
+        thread = threading.Thread(target=lambda: others.append(broker.lease('00000001')))
+        thread.start()
+        thread.join(5)
+    open_hooks.append(lease_other)
+    with broker.lease('00000002') as lease:
+        assert lease.sdr.device_opened
+        assert lease.sdr is not second_lease.sdr
+    open_hooks.remove(lease_other)
+    assert len(others) == 1
+    others[0].release()
+
+    # devices that failed to open are only retried after a delay
+    time.sleep(.25)
+    with pytest.raises(IOError):
+        broker.lease('99999999')
+    num_attempts = attempts.count('99999999')
+    assert num_attempts > 1
+    with pytest.raises(IOError):
+        broker.lease('99999999')
+    with broker.lease():
+        pass
+    assert attempts.count('99999999') == num_attempts
+    time.sleep(.25)
+    with pytest.raises(IOError):
+        broker.lease('99999999')
+    assert attempts.count('99999999') == num_attempts + 1
+
+    with pytest.raises(ValueError):
+        broker.lease('00000004')
+    with pytest.raises(ValueError):
+        broker.lease(tuner_type='FC0012')
+    with pytest.raises(ValueError):
+        broker.lease(tuner_type='unknown tuner')
+    with pytest.raises(ValueError):
+        broker.lease(settings={'centre_freq': 100e6})
+
+    broker.close()
+    assert not any(sdr.device_opened for sdr in broker.devices.values() if sdr is not None)
+    with pytest.raises(ValueError):
+        broker.lease()
@@ -0,0 +1,405 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from conftest import is_travisci
+
+
+def test_sample_buffer_pool():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.buffers import SampleBufferPool
+
+    pool = SampleBufferPool(3, 1024, 'complex64')
+    assert pool.num_buffers == 3
+    bufs = [pool.next_buffer() for _ in range(6)]
+    assert all(b.dtype == np.complex64 and b.shape == (1024,) for b in bufs)
+    assert bufs[0] is bufs[3]
+    assert bufs[0] is not bufs[1]
+
+    with pytest.raises(ValueError):
+        SampleBufferPool(0, 1024)
+
+
+def test_out_param():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    raw_data = sdr.read_bytes(2048)
+    expected = sdr.packed_bytes_to_iq(raw_data)
+    for dtype in ['complex64', 'complex128']:
+        out = np.zeros(1024, dtype=dtype)
+        iq = sdr.packed_bytes_to_iq(raw_data, out=out)
+        assert iq is out
+        assert np.allclose(out, expected, atol=1e-6)
+
+    out = np.zeros(1024, dtype='complex64')
+    with pytest.raises(ValueError):
+        sdr.packed_bytes_to_iq(raw_data, 'complex128', out)
+    with pytest.raises(ValueError):
+        sdr.packed_bytes_to_iq(raw_data, out=out[:512])
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_no_alloc():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+
+    num_samples = 16384
+    sdr = RtlSdr()
+    out = np.empty(num_samples, dtype='complex128')
+
+    # warm up (read buffers and lookup table)
+    for _ in range(sdr.READ_BUFFER_COUNT):
+        sdr.read_samples(num_samples, out=out)
+
+    tracemalloc.start()
+    try:
+        start_size, _ = tracemalloc.get_traced_memory()
+        for _ in range(8):
+            iq = sdr.read_samples(num_samples, out=out)
+            assert iq is out
+        end_size, peak_size = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    sdr.close()
+
+    assert end_size - start_size < 4096
+    assert peak_size - start_size < out.nbytes // 8
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_buffer_pool():
+    pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.buffers import SampleBufferPool
+
+    num_samples = 4096
+    num_callbacks = 8
+    sdr = RtlSdr()
+    pool = SampleBufferPool(2, num_samples, 'complex64')
+    # warm up the lookup table
+    sdr.packed_bytes_to_iq(sdr.read_bytes(num_samples * 2), out=pool.buffers[0])
+
+    received = []
+    mem_sizes = []
+
+    def callback(samples, rtlsdr_obj):
+        # ctypes objects created by the emulated device form reference cycles
+        gc.collect()
+        mem_sizes.append(tracemalloc.get_traced_memory()[0])
+        received.append(samples)
+        if len(received) >= num_callbacks:
+            rtlsdr_obj.cancel_read_async()
+
+    tracemalloc.start()
+    try:
+        sdr.read_samples_async(callback, num_samples, buffer_pool=pool)
+    finally:
+        tracemalloc.stop()
+    sdr.close()
+
+    assert len(received) >= num_callbacks
+    assert all(any(s is b for b in pool.buffers) for s in received)
+
+    # no sample arrays should be created
+    steady = mem_sizes[2:]
+    assert max(steady) - min(steady) < 4096
+
+
+def test_read_buffer_ring():
+    from rtlsdr.buffers import ReadBufferRing
+
+    ring = ReadBufferRing(3)
+    indices = [ring.acquire(16)[0] for _ in range(4)]
+    assert indices == [0, 1, 2, 0]
+    assert len(ring.buffers[0]) == 16
+
+    # leased slots are skipped until released
+    lease = ring.lease(16)
+    assert lease.index == 1
+    assert ring.num_leased == 1
+    assert [ring.acquire(16)[0] for _ in range(3)] == [2, 0, 2]
+    with ring.lease(16) as lease2:
+        assert lease2.index == 0
+        assert len(lease2) == 16
+        assert ring.acquire(16)[0] == 2
+        with ring.lease(16):
+            with pytest.raises(BufferError):
+                ring.acquire(16)
+    assert lease2.released
+    lease.release()
+    lease.release()
+    assert ring.num_leased == 0
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_bytes_ring(use_numpy):
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    num_buffers = sdr.READ_BUFFER_COUNT
+    blocks = [sdr.read_bytes(512) for _ in range(num_buffers)]
+    assert len(set(id(b) for b in blocks)) == num_buffers
+    assert sdr.read_bytes(512) is blocks[0]
+
+    lease = sdr.lease_bytes(512)
+    assert lease.buffer is blocks[1]
+    if use_numpy:
+        from ctypes import addressof
+        assert lease.data.ctypes.data == addressof(lease.buffer)
+    else:
+        assert isinstance(lease.data, memoryview)
+    assert list(lease.data) == list(blocks[1])
+    expected = list(lease.data)
+    for _ in range(num_buffers * 2):
+        b = sdr.read_bytes(512)
+        assert b is not lease.buffer
+    assert list(lease.data) == expected
+    lease.release()
+
+    leases = [sdr.lease_bytes(512) for _ in range(num_buffers)]
+    with pytest.raises(BufferError):
+        sdr.read_bytes(512)
+    for lease in leases:
+        lease.release()
+    sdr.close()
+
+
+def test_async_read_ring():
+    import threading
+    from ctypes import c_ubyte
+    from rtlsdr.buffers import AsyncReadRing
+
+    ring = AsyncReadRing(2, 16)
+    assert ring.num_buffers == 2
+    assert ring.get(timeout=0.01) is None
+    assert ring.underruns == 1
+
+    data = [(c_ubyte*16)(*([i] * 16)) for i in range(3)]
+    assert ring.put(data[0], 16)
+    assert ring.put(data[1], 8)
+    assert not ring.put(data[2], 16)
+    assert ring.overruns == 1
+
+    values, info = ring.get()
+    assert list(values) == [0] * 16
+    assert info is None
+    ring.release()
+    values, info = ring.get()
+    assert list(values) == [1] * 8
+    ring.release()
+
+    # the consumer waits for the producer
+    received = []
+    def consume():
+        while True:
+            item = ring.get()
+            if item is None:
+                return
+            values, info = item
+            received.append((list(values), info))
+            ring.release()
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    assert ring.put(data[2], 16, 'info')
+    ring.close()
+    consumer.join()
+    assert received == [([2] * 16, 'info')]
+    assert not ring.put(data[0], 16)
+
+    with pytest.raises(ValueError):
+        AsyncReadRing(0, 16)
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_bytes_async_ring():
+    import time
+    import threading
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    sdr.sample_rate = 3.2e6
+    expected = list(sdr.read_bytes(1024))
+    producer_thread = threading.current_thread()
+
+    received = []
+    def callback(values, rtlsdr_obj):
+        assert threading.current_thread() is not producer_thread
+        received.append(list(values))
+        # slower than the device
+        time.sleep(0.05)
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+
+    sdr.read_bytes_async(callback, 1024, ring_size=2)
+    assert len(received) == 3
+    assert received[0] == expected
+    assert sdr.overruns > 0
+
+    def failing_callback(values, rtlsdr_obj):
+        raise RuntimeError('callback failed')
+
+    with pytest.raises(RuntimeError):
+        sdr.read_samples_async(failing_callback, 512, ring_size=4)
+    sdr.close()
+
+
+def test_block_assembler():
+    from ctypes import c_ubyte
+    from rtlsdr.buffers import BlockAssembler
+
+    data = list(range(256)) * 4
+    received = []
+    def callback(raw_buffer, num_bytes, context):
+        assert context == 'context'
+        received.append(list((c_ubyte*num_bytes).from_address(raw_buffer)))
+
+    assembler = BlockAssembler(100, callback)
+    offset = 0
+    for length in [30, 50, 250, 1, 19, 200, 300]:
+        transfer = (c_ubyte*length)(*data[offset:offset+length])
+        assembler.feed(transfer, length, 'context')
+        offset += length
+    assert len(received) == offset // 100
+    assert sum(received, []) == data[:len(received) * 100]
+    assert assembler.num_pending == offset % 100
+
+    assembler.reset()
+    assert assembler.num_pending == 0
+    with pytest.raises(ValueError):
+        BlockAssembler(0, callback)
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_bytes_async_transfer_length():
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    sdr.sample_rate = 2.4e6
+    # the emulated device restarts its data for every transfer
+    transfer = list(sdr.read_bytes(2048))
+
+    def read_blocks(num_bytes, num_blocks, **kwargs):
+        received = []
+        def callback(values, rtlsdr_obj):
+            received.append(list(values))
+            if len(received) >= num_blocks:
+                rtlsdr_obj.cancel_read_async()
+        sdr.read_bytes_async(callback, num_bytes, **kwargs)
+        return received[:num_blocks]
+
+    # assembled from smaller transfers
+    blocks = read_blocks(2048, 2, buf_num=4, buf_len=512)
+    assert blocks == [transfer[:512] * 4] * 2
+    # split from larger transfers
+    blocks = read_blocks(1024, 4, buf_len=2048)
+    assert blocks == [transfer[:1024], transfer[1024:]] * 2
+    blocks = read_blocks(1024, 2, buf_len=2048, ring_size=8)
+    assert blocks == [transfer[:1024], transfer[1024:]]
+
+    buf_num, buf_len = sdr.get_async_buffer_params(.01)
+    assert buf_len == 32768
+    assert buf_num * buf_len >= 2.4e6 * 2 * sdr.ASYNC_BUFFER_TIME
+    assert sdr.get_async_buffer_params(1e-6) == (sdr.MAX_ASYNC_BUF_NUMBER, 512)
+    assert sdr.get_async_buffer_params(10)[1] == sdr.MAX_ASYNC_BUF_LENGTH
+
+    blocks = read_blocks(1024, 2, latency=.001)
+    assert len(blocks) == 2 and all(len(b) == 1024 for b in blocks)
+
+    with pytest.raises(ValueError):
+        sdr.read_bytes_async(lambda *args: None, 1024, buf_len=1000)
+    with pytest.raises(ValueError):
+        sdr.read_bytes_async(lambda *args: None, 1024, buf_len=1024, latency=.01)
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_block_info():
+    import time
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    sdr.sample_rate = 2.4e6
+    sdr.center_freq = 100e6
+    assert sdr.block_info is None
+    sdr.read_bytes(1024)
+    info = sdr.block_info
+    assert (info.sequence, info.sample_index, info.num_samples) == (0, 0, 512)
+    assert info.center_freq == 100e6
+    assert info.sample_rate == sdr.sample_rate
+    assert info.time <= time.monotonic()
+    assert info.start_time == pytest.approx(info.time - 512 / info.sample_rate)
+
+    sdr.read_samples(256)
+    assert (sdr.block_info.sequence, sdr.block_info.sample_index) == (1, 512)
+
+    sdr.center_freq = 90e6
+    received = []
+    def callback(samples, rtlsdr_obj):
+        received.append(rtlsdr_obj.block_info)
+        if len(received) >= 4:
+            rtlsdr_obj.cancel_read_async()
+    sdr.read_samples_async(callback, 512)
+    assert [i.sequence for i in received] == [0, 1, 2, 3]
+    assert [i.sample_index for i in received] == [0, 512, 1024, 1536]
+    assert all(i.center_freq == 90e6 for i in received)
+    assert all(a.time <= b.time for a, b in zip(received, received[1:]))
+
+    # blocks dropped by the ring buffer leave gaps in the sequence
+    received = []
+    def slow_callback(values, rtlsdr_obj):
+        received.append(rtlsdr_obj.block_info)
+        time.sleep(.05)
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+    sdr.sample_rate = 3.2e6
+    sdr.read_bytes_async(slow_callback, 1024, ring_size=2)
+    sequences = [i.sequence for i in received]
+    assert sequences[-1] - sequences[0] + 1 - len(sequences) > 0
+    assert all(i.sample_index == i.sequence * 512 for i in received)
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_iter_samples():
+    import threading
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+
+    num_samples = 1024
+    sdr = RtlSdr()
+    sdr.sample_rate = 3.2e6
+    expected = sdr.read_samples(num_samples, dtype='complex64')
+
+    blocks = sdr.iter_samples(num_samples, prefetch=3, dtype='complex64')
+    received = []
+    for samples in blocks:
+        received.append(samples)
+        assert sdr.block_info.sequence == len(received) - 1
+        if len(received) == 5:
+            break
+    blocks.close()
+    assert not any(t.name == 'rtlsdr-prefetch' for t in threading.enumerate())
+    assert all(np.array_equal(s, expected) for s in received)
+    assert len(set(id(s) for s in received)) == 5
+
+    blocks = sdr.iter_samples(num_samples, buffer_pool=2, dtype='complex64')
+    first, second, third = next(blocks), next(blocks), next(blocks)
+    assert first is third and first is not second
+    blocks.close()
+
+    with pytest.raises(ValueError):
+        next(sdr.iter_samples(num_samples, prefetch=0))
+
+    # errors in the reader thread are raised from the iterator
+    def failing_read(buffer, num_bytes):
+        raise IOError('read failed')
+    sdr._read_into = failing_read
+    blocks = sdr.iter_samples(num_samples)
+    with pytest.raises(IOError):
+        next(blocks)
+    del sdr._read_into
+    sdr.close()
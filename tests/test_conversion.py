@@ -0,0 +1,150 @@
+import pytest
+
+
+def test_lut_converter():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.conversion import SampleConverter, LUTConverter
+
+    # every possible I/Q byte pair
+    raw_data = np.arange(65536, dtype=np.uint16).view(np.uint8)
+    arith_conv = SampleConverter()
+    lut_conv = LUTConverter()
+
+    for dtype in ['complex64', 'complex128']:
+        expected = arith_conv.convert(raw_data, dtype)
+        iq = lut_conv.convert(raw_data, dtype)
+        assert iq.dtype == np.dtype(dtype)
+        assert np.array_equal(iq, expected)
+
+        # tables should only be built once per dtype
+        assert LUTConverter.get_lut(dtype) is LUTConverter.get_lut(dtype)
+
+    with pytest.raises(ValueError):
+        lut_conv.convert(raw_data, 'uint16')
+
+
+def test_integer_formats(use_numpy):
+    from rtlsdr.conversion import LUTConverter
+
+    raw_data = bytearray(range(256))
+    conv = LUTConverter()
+    expected_int8 = [b - 128 for b in raw_data]
+    expected_int16 = [v * 256 for v in expected_int8]
+
+    iq = conv.convert(raw_data, 'int8')
+    assert len(iq) == conv.get_output_length(len(raw_data), 'int8') == 256
+    assert list(iq) == expected_int8
+    iq = conv.convert(raw_data, 'int16')
+    assert list(iq) == expected_int16
+
+    if use_numpy:
+        import numpy as np
+        out = np.zeros(256, dtype=np.int16)
+        assert conv.convert(raw_data, out=out) is out
+        assert list(out) == expected_int16
+        assert conv.convert(np.frombuffer(raw_data, np.uint8), 'int8').dtype == np.int8
+
+
+def test_custom_converter():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.conversion import SampleConverter, LUTConverter
+
+    class CountingConverter(SampleConverter):
+        num_calls = 0
+        def convert(self, bytes, dtype=None, out=None):
+            self.num_calls += 1
+            return super(CountingConverter, self).convert(bytes, dtype, out)
+
+    class CountingLUTConverter(LUTConverter):
+        num_calls = 0
+        def convert(self, bytes, dtype=None, out=None):
+            self.num_calls += 1
+            return super(CountingLUTConverter, self).convert(bytes, dtype, out)
+
+    sdr = RtlSdr()
+    assert isinstance(sdr.converter, LUTConverter)
+    sdr.converter = CountingConverter()
+    samples = sdr.read_samples(1024)
+    assert len(samples) == 1024
+    assert sdr.converter.num_calls == 1
+
+    # converters without process_chunk are shifted in a separate pass
+    sdr.frequency_shift = 100e3
+    for converter in [CountingConverter(), CountingLUTConverter()]:
+        sdr.converter = converter
+        sdr.frequency_shifter.reset()
+        samples = sdr.read_samples(1024)
+        assert len(samples) == 1024
+        assert converter.num_calls == 1
+    sdr.converter = LUTConverter()
+    sdr.frequency_shifter.reset()
+    assert np.allclose(sdr.read_samples(1024), samples)
+    sdr.close()
+
+
+def test_numpy_free_conversion(monkeypatch):
+    monkeypatch.setattr('rtlsdr.conversion.has_numpy', False)
+    from array import array
+    from rtlsdr.conversion import LUTConverter, IQArray
+
+    raw_data = bytearray(range(256)) * 2
+    expected = [
+        complex(i/(255/2) - 1, q/(255/2) - 1)
+        for i, q in zip(raw_data[::2], raw_data[1::2])
+    ]
+    conv = LUTConverter()
+
+    iq = conv.convert(raw_data)
+    assert isinstance(iq, IQArray)
+    assert iq.data.typecode == 'd'
+    assert len(iq) == len(expected)
+    assert iq == expected
+    assert iq.tolist() == expected
+    assert iq[3] == expected[3]
+    assert iq[-1] == expected[-1]
+    assert iq[10:20] == expected[10:20]
+    assert iq[::3] == expected[::3]
+    with pytest.raises(IndexError):
+        iq[len(expected)]
+
+    iq = conv.convert(raw_data, 'complex64')
+    assert iq.data.typecode == 'f'
+    assert all(abs(a - b) < 1e-6 for a, b in zip(iq, expected))
+
+    out = IQArray(array('d', bytes(len(raw_data) * 8)))
+    assert conv.convert(raw_data, out=out) is out
+    assert out == expected
+
+    # sequences of ints (as used by the tcp client)
+    assert conv.convert(tuple(raw_data)) == expected
+
+
+def test_real_format(use_numpy):
+    from rtlsdr.conversion import SampleConverter, LUTConverter
+
+    # one value per I/Q pair, from the I or Q byte
+    raw_data = bytearray(range(256))
+    for conv in [SampleConverter(), LUTConverter()]:
+        for dtype in ['float32', 'float64']:
+            assert conv.get_output_length(len(raw_data), dtype) == 128
+            assert conv.get_bytes_per_sample(dtype) == 2
+            for branch in [0, 1]:
+                expected = [b / 127.5 - 1 for b in raw_data[branch::2]]
+                samples = conv.convert(raw_data, dtype, branch=branch)
+                assert len(samples) == 128
+                assert all(abs(a - b) < 1e-6 for a, b in zip(samples, expected))
+            # a trailing half pair is ignored
+            assert len(conv.convert(raw_data[:-1], dtype, branch=1)) == 127
+        with pytest.raises(ValueError):
+            conv.convert(raw_data, 'float32', branch=2)
+
+    if use_numpy:
+        import numpy as np
+        samples = LUTConverter().convert(raw_data, 'float32', branch=1)
+        assert samples.dtype == np.float32
+        assert np.array_equal(samples, SampleConverter().convert(raw_data, 'float32', branch=1))
+        assert np.allclose(samples, LUTConverter().convert(raw_data, 'complex64').imag, atol=1e-6)
+        out = np.empty(128, dtype='float32')
+        assert LUTConverter().convert(raw_data, out=out, branch=1) is out
+        assert np.array_equal(out, samples)
@@ -0,0 +1,485 @@
+import pytest
+
+from conftest import is_travisci
+
+
+def make_imbalanced_signal(np, num_samples, gain=1.2, phase=0.1, dc=0.1-0.05j):
+    rng = np.random.RandomState(0)
+    i_values = rng.standard_normal(num_samples) * 0.2
+    q_values = rng.standard_normal(num_samples) * 0.2
+    imbalanced_q = gain * (q_values * np.cos(phase) + i_values * np.sin(phase))
+    return (i_values + 1j * imbalanced_q + dc).astype(np.complex128)
+
+
+def test_iq_corrector():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import IQCorrector
+
+    block_size = 16384
+    samples = make_imbalanced_signal(np, block_size * 16)
+
+    corrector = IQCorrector(alpha=0.2)
+    blocks = [samples[i:i+block_size] for i in range(0, samples.size, block_size)]
+    for block in blocks:
+        result = corrector.process(block)
+        assert result is block
+
+    assert corrector.dc_offset == pytest.approx(0.1-0.05j, abs=0.01)
+    assert corrector.gain_ratio == pytest.approx(1.2, rel=0.02)
+    assert corrector.phase_error == pytest.approx(0.1, abs=0.02)
+
+    last_block = blocks[-1]
+    assert abs(last_block.mean()) < 0.01
+    power_i = np.mean(last_block.real ** 2)
+    power_q = np.mean(last_block.imag ** 2)
+    assert power_q / power_i == pytest.approx(1, abs=0.05)
+    assert abs(np.mean(last_block.real * last_block.imag)) / power_i < 0.05
+
+    corrector.reset()
+    assert corrector.dc_offset == 0
+    assert corrector.gain_ratio == 1
+
+    with pytest.raises(ValueError):
+        IQCorrector(alpha=0)
+
+
+def test_decimator():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import Decimator
+
+    rng = np.random.RandomState(0)
+    samples = rng.standard_normal(10007) + 1j * rng.standard_normal(10007)
+
+    for factor in [1, 3, 10]:
+        decimator = Decimator(factor)
+        assert decimator.taps.sum() == pytest.approx(1)
+        expected = np.convolve(samples, decimator.taps)[:samples.size:factor]
+
+        # uneven block sizes should produce the same continuous output
+        blocks = []
+        start_index = 0
+        for block_size in [1000, 37, 5000, 2, 3968]:
+            block = samples[start_index:start_index+block_size]
+            num_out = decimator.get_output_length(block_size)
+            blocks.append(decimator.process(block))
+            assert len(blocks[-1]) == num_out
+            start_index += block_size
+        result = np.concatenate(blocks)
+        assert result.dtype == samples.dtype
+        assert np.allclose(result, expected)
+
+    decimator = Decimator(4, taps=[1])
+    out = np.empty(256, dtype=np.complex64)
+    block = samples[:1024].astype(np.complex64)
+    assert decimator.process(block, out) is out
+    assert np.array_equal(out, block[::4])
+    with pytest.raises(ValueError):
+        decimator.process(block, out[:10])
+
+    with pytest.raises(ValueError):
+        Decimator(0)
+
+
+def test_frequency_shifter():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import FrequencyShifter
+
+    shifter = FrequencyShifter(1000, 48000)
+    num_samples = 30001
+    expected = np.exp(2j * np.pi * 1000 / 48000 * np.arange(num_samples))
+
+    # the phase should be continuous across blocks of any size
+    samples = np.ones(num_samples, dtype=np.complex128)
+    start_index = 0
+    for block_size in [1000, 20000, 1000, 8001]:
+        block = samples[start_index:start_index+block_size]
+        assert shifter.process(block) is block
+        start_index += block_size
+    assert np.allclose(samples, expected)
+
+    samples = np.ones(1000, dtype=np.complex64)
+    shifter.reset()
+    shifter.process(samples)
+    assert samples.dtype == np.complex64
+    assert np.allclose(samples, expected[:1000], atol=1e-5)
+
+    shifter.frequency = 0
+    samples = np.ones(16, dtype=np.complex64)
+    shifter.process(samples)
+    assert np.all(samples == 1)
+    assert shifter.get_chunk_processor(16, np.complex64) is None
+
+    # shifting the chunks of a block as they are converted
+    from rtlsdr.conversion import LUTConverter
+    raw_data = np.random.randint(0, 256, 2 * num_samples).astype(np.uint8)
+    converter = LUTConverter()
+    shifter = FrequencyShifter(1000, 48000)
+    for dtype in [np.complex64, np.complex128]:
+        expected = shifter.process(converter.convert(raw_data, dtype))
+        shifter.reset()
+        process_chunk = shifter.get_chunk_processor(num_samples, dtype)
+        samples = converter.convert(raw_data, dtype, np.empty(num_samples, dtype), process_chunk)
+        assert np.array_equal(samples, expected)
+        assert shifter.phase == pytest.approx(2 * np.pi * 1000 / 48000 * num_samples % (2 * np.pi))
+        shifter.reset()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_frequency_shift_enabled():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    assert sdr.frequency_shift == 0
+    raw_data = np.ctypeslib.as_array(sdr.read_bytes(2048)).copy()
+    unshifted = sdr.packed_bytes_to_iq(raw_data)
+
+    sdr.frequency_shift = -100e3
+    assert sdr.frequency_shifter.sample_rate == sdr.sample_rate
+    samples = sdr.read_samples(1024)
+    expected = unshifted * np.exp(-2j * np.pi * 100e3 / sdr.sample_rate * np.arange(1024))
+    assert np.allclose(samples, expected)
+
+    # the same shift is applied after the I/Q correction
+    sdr.frequency_shifter.reset()
+    sdr.set_iq_correction(True, dc_correction=False, imbalance_correction=False)
+    samples = sdr.read_samples(1024)
+    assert np.allclose(samples, expected)
+    sdr.iq_correction = False
+
+    sdr.sample_rate = 2.4e6
+    assert sdr.frequency_shifter.sample_rate == sdr.sample_rate
+    sdr.frequency_shift = 0
+    assert sdr.frequency_shifter is None
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_decimation():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import Decimator
+
+    num_samples = 4096
+    factor = 8
+    sdr = RtlSdr()
+    raw_data = np.ctypeslib.as_array(sdr.read_bytes(num_samples * 2 * 3)).copy()
+    decimator = Decimator(factor)
+    expected = decimator.process(sdr.packed_bytes_to_iq(raw_data, 'complex64'))
+
+    received = []
+    def callback(samples, rtlsdr_obj):
+        received.append(samples.copy())
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+
+    # the emulated device restarts its data for every read
+    sdr.read_samples_async(
+        callback, num_samples * 3, dtype='complex64', decimation=factor, buffer_pool=2,
+    )
+    assert all(s.dtype == np.complex64 and len(s) == num_samples * 3 // factor for s in received)
+    assert np.allclose(received[0], expected, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        sdr.read_samples_async(callback, 1001, decimation=factor)
+    with pytest.raises(ValueError):
+        sdr.read_samples_async(callback, num_samples, dtype='int8', decimation=factor)
+    sdr.close()
+
+
+def test_resampler():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import Resampler
+
+    rng = np.random.RandomState(0)
+    samples = rng.standard_normal(20011) + 1j * rng.standard_normal(20011)
+
+    for in_rate, out_rate, ratio in [(2.4e6, 48e3, (1, 50)), (2.4e6, 250e3, (5, 48)), (1.024e6, 1.2e6, (75, 64))]:
+        resampler = Resampler(in_rate, out_rate)
+        assert (resampler.up, resampler.down) == ratio
+        assert resampler.actual_out_rate == out_rate
+        assert resampler.bank is Resampler.get_filter_bank(in_rate, out_rate)
+
+        # reference: zero stuff, filter with the prototype and decimate
+        up, down = ratio
+        prototype = resampler.bank.T.reshape(-1)
+        upsampled = np.zeros(samples.size * up, dtype=samples.dtype)
+        upsampled[::up] = samples
+        expected = np.convolve(upsampled, prototype)[:upsampled.size:down]
+
+        blocks = []
+        start_index = 0
+        for block_size in [3000, 17, 9000, 7994]:
+            num_out = resampler.get_output_length(block_size)
+            blocks.append(resampler.process(samples[start_index:start_index+block_size]))
+            assert len(blocks[-1]) == num_out
+            start_index += block_size
+        assert np.allclose(np.concatenate(blocks), expected)
+
+    with pytest.raises(ValueError):
+        Resampler(0, 48e3)
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_resampling():
+    pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+
+    sdr = RtlSdr()
+    sdr.sample_rate = 2.4e6
+    received = []
+    def callback(samples, rtlsdr_obj):
+        received.append(samples.copy())
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+
+    # 2.4 MHz / 10 = 240 kHz, resampled by 25/24 to 250 kHz
+    sdr.read_samples_async(
+        callback, 24000, decimation=10, output_rate=250e3, buffer_pool=2,
+    )
+    assert all(len(s) == 2500 for s in received)
+
+    with pytest.raises(ValueError):
+        sdr.read_samples_async(callback, 24010, output_rate=250e3, buffer_pool=2)
+    sdr.close()
+
+
+def test_channelizer():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import Channelizer
+
+    rng = np.random.RandomState(0)
+    num_samples = 20000
+    samples = rng.standard_normal(num_samples) + 1j * rng.standard_normal(num_samples)
+    num_channels = 8
+    channelizer = Channelizer(num_channels, 4)
+    prototype = channelizer.bank.reshape(-1)
+
+    received = {}
+    def callback(channel_samples, channel):
+        received.setdefault(channel, []).append(channel_samples)
+    channelizer.subscribe(1, callback)
+    channelizer.subscribe(-1, callback)
+    assert channelizer.channels == [1, 7]
+
+    blocks = []
+    start_index = 0
+    for block_size in [1000, 37, 9000, 9963]:
+        num_out = channelizer.get_output_length(block_size)
+        blocks.append(channelizer.process(samples[start_index:start_index+block_size]))
+        assert blocks[-1].shape == (num_out, num_channels)
+        start_index += block_size
+    result = np.concatenate(blocks)
+
+    # each channel is the same as shifting, filtering and decimating
+    t = np.arange(num_samples)
+    for channel in range(num_channels):
+        shifted = samples * np.exp(-2j * np.pi * channel * t / num_channels)
+        expected = np.convolve(shifted, prototype)[:num_samples:num_channels]
+        assert np.allclose(result[:, channel], expected)
+
+    assert np.array_equal(np.concatenate(received[1]), result[:, 1])
+    assert np.array_equal(np.concatenate(received[7]), result[:, 7])
+    assert channelizer.get_channel_frequency(-1, 2.4e6) == -300e3
+    assert channelizer.get_channel_frequency(7, 2.4e6) == -300e3
+
+    channelizer.unsubscribe(1, callback)
+    channelizer.unsubscribe(7, callback)
+    assert channelizer.channels == []
+
+
+def test_squelch(use_numpy):
+    from rtlsdr.dsp import Squelch, BlockPower
+
+    quiet = bytearray([127, 128]) * 512
+    # full scale values have a power of 0 dB
+    loud = bytearray([0, 255]) * 512
+    # -6 dB
+    medium = bytearray([64, 191]) * 512
+
+    squelch = Squelch(-3, hysteresis=10)
+    block_power = squelch.measure(loud)
+    assert isinstance(block_power, BlockPower)
+    assert block_power.num_bytes == 1024
+    assert block_power.power_db == pytest.approx(0)
+    assert squelch.measure(medium).power_db == pytest.approx(-6, abs=0.1)
+
+    assert squelch.update(quiet) is False
+    assert squelch.last_power.power_db < -40
+    assert squelch.update(medium) is False
+    assert squelch.update(loud) is True
+    # stays open until below threshold - hysteresis
+    assert squelch.update(medium) is True
+    assert squelch.update(quiet) is False
+
+    with pytest.raises(ValueError):
+        Squelch(-3, quiet_blocks='foo')
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_squelch(use_numpy):
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import Squelch, BlockPower
+
+    sdr = RtlSdr()
+    received = []
+    def callback(samples, rtlsdr_obj):
+        received.append(samples)
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+
+    # the emulated data (a ramp of all values) is at about -4.8 dB
+    sdr.read_samples_async(callback, 1024, squelch=-10)
+    assert all(len(s) == 1024 for s in received)
+
+    del received[:]
+    squelch = Squelch(0, quiet_blocks='power')
+    sdr.read_samples_async(callback, 1024, squelch=squelch)
+    assert all(isinstance(p, BlockPower) for p in received)
+    assert received[0].power_db == pytest.approx(-4.8, abs=0.1)
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_iq_correction_enabled():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import IQCorrector
+
+    sdr = RtlSdr()
+    assert sdr.iq_correction is False
+    sdr.iq_correction = True
+    assert isinstance(sdr.iq_corrector, IQCorrector)
+
+    iq = sdr.read_samples(4096)
+    assert abs(iq.mean()) < 1e-6
+
+    # integer samples are not corrected
+    iq = sdr.read_samples(4096, dtype='int8')
+    assert iq.dtype == np.int8
+
+    sdr.iq_correction = False
+    assert sdr.iq_corrector is None
+    sdr.close()
+
+
+def test_deemphasis():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import Deemphasis
+
+    sample_rate = 240e3
+    rng = np.random.RandomState(0)
+    samples = rng.standard_normal(10007)
+
+    alpha = 1 - np.exp(-1 / (sample_rate * 75e-6))
+    expected = np.empty_like(samples)
+    last = 0.
+    for i, value in enumerate(samples):
+        last = alpha * value + (1 - alpha) * last
+        expected[i] = last
+
+    for dtype, atol in [(np.float64, 1e-12), (np.float32, 1e-5)]:
+        deemphasis = Deemphasis(sample_rate)
+        blocks = np.array_split(samples.astype(dtype), [3, 100, 5000, 5001, 9000])
+        result = np.concatenate([deemphasis.process(block) for block in blocks])
+        assert result.dtype == dtype
+        assert np.allclose(result, expected, atol=atol)
+
+    # a constant input stays constant when starting from its value
+    deemphasis.reset(2.)
+    assert np.allclose(deemphasis.process(np.full(100, 2.)), 2.)
+
+
+def test_fm_demodulator():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import FMDemodulator
+
+    sample_rate = 240e3
+    t = np.arange(24000) / sample_rate
+    message = np.sin(2 * np.pi * 1e3 * t)
+    # start from a nonzero phase
+    phase = 1. + np.cumsum(2 * np.pi * 5e3 * message / sample_rate)
+    samples = np.exp(1j * phase).astype(np.complex64)
+    expected = np.angle(samples[1:] * np.conj(samples[:-1]))
+
+    demod = FMDemodulator()
+    result = []
+    for block in np.array_split(samples, [1000, 1001, 7000]):
+        block = block.copy()
+        out = demod.process(block)
+        # written into the memory of the input block
+        assert out.dtype == np.float32 and len(out) == len(block)
+        assert np.shares_memory(out, block)
+        result.append(out.copy())
+    result = np.concatenate(result)
+    assert result[0] == pytest.approx(0, abs=1e-6)
+    assert np.allclose(result[1:], expected, atol=1e-5)
+
+    demod = FMDemodulator(sample_rate, deviation=5e3)
+    out = np.empty(len(samples), dtype=np.float32)
+    assert demod.process(samples, out) is out
+    assert np.allclose(out[1:], message[1:], atol=1e-3)
+
+    demod = FMDemodulator(sample_rate, deviation=5e3, deemphasis=75e-6)
+    result = demod.process(samples.copy())
+    # the 1kHz tone is attenuated by the single pole response (2.1kHz corner)
+    expected_gain = 1 / np.sqrt(1 + (2 * np.pi * 1e3 * 75e-6) ** 2)
+    assert np.abs(result[1000:]).max() == pytest.approx(expected_gain, rel=0.01)
+
+    with pytest.raises(ValueError):
+        FMDemodulator(deviation=5e3)
+
+
+def test_am_demodulator():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.dsp import AMDemodulator
+
+    t = np.arange(24000) / 240e3
+    message = 0.5 * np.sin(2 * np.pi * 1e3 * t)
+    samples = ((1 + message) * np.exp(2j * np.pi * 10e3 * t)).astype(np.complex64)
+
+    demod = AMDemodulator()
+    block = samples.copy()
+    out = demod.process(block)
+    assert np.shares_memory(out, block)
+    # the carrier level settles within a few time constants
+    assert np.allclose(out[20000:], message[20000:], atol=0.02)
+
+    # the carrier estimate is carried across blocks
+    demod.reset()
+    blocks = np.array_split(samples, [3, 100, 5000, 5001, 9000])
+    result = np.concatenate([demod.process(block.copy()) for block in blocks])
+    assert np.allclose(result, out, atol=1e-5)
+
+    demod = AMDemodulator(remove_carrier=False)
+    assert np.allclose(demod.process(samples.copy()), 1 + message, atol=1e-4)
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_stages():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import FMDemodulator
+
+    num_samples = 4096
+    sdr = RtlSdr()
+    raw_data = np.ctypeslib.as_array(sdr.read_bytes(num_samples * 2)).copy()
+    expected = FMDemodulator().process(sdr.packed_bytes_to_iq(raw_data, 'complex64'))
+
+    received = []
+    def callback(samples, rtlsdr_obj):
+        received.append(samples)
+        if len(received) >= 3:
+            rtlsdr_obj.cancel_read_async()
+
+    sdr.read_samples_async(
+        callback, num_samples, dtype='complex64', stages=[FMDemodulator()],
+    )
+    assert all(s.dtype == np.float32 and len(s) == num_samples for s in received)
+    assert np.allclose(received[0], expected, atol=1e-6)
+    # each block is demodulated into its own array
+    assert not np.shares_memory(received[0], received[1])
+
+    with pytest.raises(ValueError):
+        sdr.read_samples_async(callback, num_samples, stages=[FMDemodulator()], buffer_pool=2)
+    sdr.close()
@@ -0,0 +1,184 @@
+import pytest
+
+from conftest import is_travisci
+
+
+def make_block(np, channel, sequence, num_samples):
+    return np.full(num_samples, channel * 1000 + sequence, dtype=np.complex64)
+
+def make_info(sequence, num_samples, time, sample_rate=1e3):
+    from rtlsdr.buffers import BlockInfo
+    return BlockInfo(
+        sequence, sequence * num_samples, num_samples, time, 1e6, sample_rate, 0,
+    )
+
+
+def test_channel_aligner():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.multi import ChannelAligner
+
+    # blocks of 0.1 seconds, channel 1 started two blocks after channel 0
+    num_samples = 100
+    aligner = ChannelAligner(2, num_samples, num_buffers=3)
+    for sequence in range(5):
+        aligner.add(0, make_block(np, 0, sequence, num_samples), make_info(
+            sequence, num_samples, 1 + sequence * .1,
+        ))
+    assert aligner.get(timeout=0) is None
+    for sequence in range(3):
+        aligner.add(1, make_block(np, 1, sequence, num_samples), make_info(
+            sequence, num_samples, 1.201 + sequence * .1,
+        ))
+        samples, infos = aligner.get(timeout=0)
+        assert samples.shape == (2, num_samples)
+        assert samples.dtype == np.complex64
+        assert np.all(samples[0] == sequence + 2)
+        assert np.all(samples[1] == 1000 + sequence)
+        assert [info.sequence for info in infos] == [sequence + 2, sequence]
+        aligner.release()
+    assert aligner.num_groups == 3
+    assert aligner.skew == pytest.approx(.001)
+
+    # a missing block drops its group
+    for channel, sequence, time in [(0, 5, 1.5), (1, 4, 1.601), (0, 6, 1.6)]:
+        aligner.add(channel, make_block(np, channel, sequence, num_samples), make_info(
+            sequence, num_samples, time,
+        ))
+    samples, infos = aligner.get(timeout=0)
+    assert [info.sequence for info in infos] == [6, 4]
+    assert np.all(samples[1] == 1004)
+    assert aligner.dropped == 1
+    aligner.release()
+
+    # too much skew matches the channels again
+    aligner.add(0, make_block(np, 0, 7, num_samples), make_info(7, num_samples, 1.7))
+    aligner.add(1, make_block(np, 1, 5, num_samples), make_info(5, num_samples, 2.0))
+    assert aligner.get(timeout=0) is None
+    assert aligner.resyncs == 1
+    aligner.add(1, make_block(np, 1, 6, num_samples), make_info(6, num_samples, 2.1))
+    for sequence in range(8, 12):
+        aligner.add(0, make_block(np, 0, sequence, num_samples), make_info(
+            sequence, num_samples, 1.8 + (sequence - 8) * .1,
+        ))
+        if sequence < 11:
+            assert aligner.get(timeout=0) is None
+    samples, infos = aligner.get(timeout=0)
+    assert [info.sequence for info in infos] == [11, 6]
+    assert np.all(samples[0] == 11)
+
+    with pytest.raises(ValueError):
+        aligner.add(0, make_block(np, 0, 10, 10), make_info(10, 10, 2.))
+
+
+def test_channel_aligner_discard_while_copying():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.multi import ChannelAligner
+
+    num_samples = 10
+    aligner = ChannelAligner(3, num_samples, num_buffers=3)
+
+    def add(channel, sequence, time, samples=None):
+        if samples is None:
+            samples = make_block(np, channel, sequence, num_samples)
+        aligner.add(channel, samples, make_info(sequence, num_samples, time, 1e3))
+
+    class SlowBlock(object):
+        # runs other channels while channel 0 copies into its group
+        def __len__(self):
+            return num_samples
+        def __array__(self, dtype=None, copy=None):
+            # completing group 1 with too much skew drops every group,
+            # including the one being copied into
+            add(2, 1, 1.5)
+            assert aligner.resyncs == 1
+            for sequence, time in [(10, 2.), (11, 2.01), (12, 2.02)]:
+                for channel in range(3):
+                    add(channel, sequence, time)
+            return make_block(np, 0, 2, num_samples)
+
+    for channel in range(3):
+        add(channel, 0, 1.)
+    aligner.get(timeout=0)
+    aligner.release()
+    add(0, 1, 1.01)
+    add(1, 1, 1.01)
+    add(0, 2, 1.02, SlowBlock())
+
+    groups = []
+    while True:
+        group = aligner.get(timeout=0)
+        if group is None:
+            break
+        samples, infos = group
+        groups.append([info.sequence for info in infos])
+        for channel, info in enumerate(infos):
+            assert np.all(samples[channel] == channel * 1000 + info.sequence)
+        aligner.release()
+    # the slot being copied into was not reused for the last group
+    assert groups == [[10] * 3, [11] * 3]
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_multi_rtlsdr():
+    np = pytest.importorskip('numpy')
+    import threading
+    from rtlsdr import RtlSdr
+    from rtlsdr.rtlsdr import librtlsdr
+    from rtlsdr.multi import MultiRtlSdr
+
+    num_samples = 1024
+    sdr = RtlSdr()
+    expected = sdr.read_samples(num_samples)
+    sdr.close()
+
+    with pytest.raises(ValueError):
+        MultiRtlSdr(['00000001', '00000001'])
+
+    with MultiRtlSdr(['00000001', '00000002', '00000003'], dithering_enabled=False) as multi:
+        assert len(multi) == 3
+        assert multi[1] is multi.devices[1]
+        assert librtlsdr.dithering == 0
+        multi.configure(center_freq=100e6, gain=10)
+        assert [sdr.center_freq for sdr in multi] == [100e6] * 3
+        with pytest.raises(ValueError):
+            multi.configure(centre_freq=100e6)
+
+        received = []
+        def callback(samples, context):
+            received.append((samples.copy(), [info.sequence for info in context.block_infos]))
+            if len(received) >= 4:
+                context.cancel_read_async()
+
+        multi.read_samples_async(callback, num_samples, max_skew=1.)
+        assert len(received) == 4
+        for samples, sequences in received:
+            assert samples.shape == (3, num_samples)
+            assert np.allclose(samples, expected)
+        assert not any(t.name.startswith('rtlsdr-multi') for t in threading.enumerate())
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_multi_rtlsdr_cancel_before_start():
+    pytest.importorskip('numpy')
+    import time
+    import threading
+    from rtlsdr import RtlSdr
+    from rtlsdr.multi import MultiRtlSdr
+
+    class SlowStartSdr(RtlSdr):
+        # the read of the last device starts after the others were canceled
+        def read_samples_async(self, *args, **kwargs):
+            if self.serial_number == '00000002':
+                time.sleep(.3)
+            return super(SlowStartSdr, self).read_samples_async(*args, **kwargs)
+        def __init__(self, serial_number=None, **kwargs):
+            self.serial_number = serial_number
+            super(SlowStartSdr, self).__init__(serial_number=serial_number, **kwargs)
+
+    with MultiRtlSdr(['00000001', '00000002'], device_class=SlowStartSdr) as multi:
+        timer = threading.Timer(.05, multi.cancel_read_async)
+        timer.start()
+        multi.read_samples_async(lambda *args: None, 1024)
+        timer.join()
+        assert all(sdr.device_opened for sdr in multi)
+        assert not any(sdr.read_async_running for sdr in multi)
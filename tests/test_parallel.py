@@ -0,0 +1,186 @@
+import time
+
+import pytest
+
+from conftest import is_travisci
+
+
+def block_sum(samples):
+    # later blocks finish first, so the results arrive out of order
+    time.sleep(0.02 * (samples.real[0] < 0))
+    return samples.sum()
+
+def raw_first_byte(data):
+    return int(data[0])
+
+
+def test_ordered_executor():
+    import threading
+    from rtlsdr.parallel import OrderedExecutor
+
+    def task(i):
+        # earlier tasks take longer
+        time.sleep(0.01 * (5 - i % 5))
+        return i, threading.current_thread()
+
+    received = []
+    with OrderedExecutor(3, max_in_flight=4, callback=received.append) as executor:
+        for i in range(12):
+            executor.submit(task, i)
+            assert executor.num_pending <= 4
+    assert [r[0] for r in received] == list(range(12))
+    assert len(set(r[1] for r in received)) > 1
+    assert executor.waits > 0
+    assert executor.num_submitted == executor.num_completed == 12
+    with pytest.raises(ValueError):
+        executor.submit(task, 0)
+
+    executor = OrderedExecutor(2)
+    executor.submit(task, 0)
+    executor.close(deliver=False)
+    assert executor.num_completed == 0 and not executor.results
+
+    with pytest.raises(ValueError):
+        OrderedExecutor(0)
+
+
+def test_process_offload():
+    np = pytest.importorskip('numpy')
+    from ctypes import c_ubyte
+    from rtlsdr.conversion import LUTConverter
+    from rtlsdr.parallel import ProcessOffload
+
+    num_bytes = 4096
+    rng = np.random.RandomState(0)
+    blocks = [rng.randint(0, 256, num_bytes).astype(np.uint8) for _ in range(12)]
+    for i, block in enumerate(blocks):
+        # alternate between slow (negative first sample) and fast blocks
+        block[0] = 0 if i % 2 == 0 else 255
+    converter = LUTConverter()
+    expected = [converter.convert(block, 'complex64').sum() for block in blocks]
+
+    received = []
+    def callback(result, offload):
+        received.append(result)
+
+    with ProcessOffload(block_sum, num_bytes, num_workers=2, num_slots=3,
+                        callback=callback) as offload:
+        for i, block in enumerate(blocks):
+            if i % 2:
+                block = (c_ubyte*num_bytes).from_buffer_copy(block)
+            offload.submit(block)
+    assert offload.closed
+    assert offload.num_submitted == offload.num_completed == len(blocks)
+    assert offload.waits > 0
+    assert np.allclose(received, expected, rtol=1e-4)
+
+    with ProcessOffload(raw_first_byte, num_bytes, num_workers=1, dtype=None) as offload:
+        offload(blocks[1], None)
+        offload.submit(blocks[0][:100].tobytes())
+        offload.flush()
+        assert list(offload.results) == [255, 0]
+        with pytest.raises(ValueError):
+            offload.submit(bytes(num_bytes + 1))
+    with pytest.raises(ValueError):
+        offload.submit(blocks[0])
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_process_offload_async():
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.parallel import ProcessOffload
+
+    num_bytes = 2048
+    sdr = RtlSdr()
+    expected = sdr.read_samples(num_bytes // 2, dtype='complex64').sum()
+
+    received = []
+    def callback(result, offload):
+        received.append(result)
+
+    def cancel_after(values, context):
+        offload(values, context)
+        if offload.num_submitted >= 4:
+            sdr.cancel_read_async()
+
+    with ProcessOffload(block_sum, num_bytes, num_workers=2, callback=callback) as offload:
+        sdr.read_bytes_async(cancel_after, num_bytes)
+    assert len(received) == 4
+    assert np.allclose(received, expected, rtol=1e-4)
+    sdr.close()
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_read_samples_async_workers():
+    import threading
+    np = pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.dsp import Decimator
+
+    num_samples = 4096
+    sdr = RtlSdr()
+    sdr.sample_rate = 3.2e6
+    raw_data = np.ctypeslib.as_array(sdr.read_bytes(num_samples * 2)).copy()
+    expected = sdr.packed_bytes_to_iq(raw_data, 'complex64')
+
+    def read_blocks(num_blocks, **kwargs):
+        received = []
+        def callback(samples, rtlsdr_obj):
+            received.append((samples.copy(), rtlsdr_obj.block_info.sequence))
+            if len(received) >= num_blocks:
+                rtlsdr_obj.cancel_read_async()
+        sdr.read_samples_async(callback, num_samples, dtype='complex64', **kwargs)
+        return received
+
+    received = read_blocks(
+        6, workers=3, max_in_flight=2, parallel_stages=[lambda iq: iq * 2],
+    )
+    assert len(received) == 6
+    assert [sequence for _, sequence in received] == list(range(6))
+    assert all(np.allclose(samples, expected * 2) for samples, _ in received)
+
+    # the stateful stages see the blocks in order
+    received = read_blocks(4, workers=2, decimation=4, buffer_pool=2)
+    decimator = Decimator(4)
+    for samples, _ in received:
+        assert np.allclose(samples, decimator.process(expected), atol=1e-6)
+
+    # each pending block is converted into its own pool array
+    lock = threading.Lock()
+    active, shared = set(), []
+    def slow_double(iq):
+        address = iq.ctypes.data
+        with lock:
+            if address in active:
+                shared.append(address)
+            active.add(address)
+        iq *= 2
+        time.sleep(.05)
+        with lock:
+            active.discard(address)
+        return iq
+    received = read_blocks(
+        8, workers=4, max_in_flight=4, buffer_pool=5, parallel_stages=[slow_double],
+    )
+    assert len(received) == 8
+    assert not shared
+    assert all(np.allclose(samples, expected * 2) for samples, _ in received)
+    with pytest.raises(ValueError):
+        read_blocks(1, workers=4, max_in_flight=4, buffer_pool=2)
+
+    with pytest.raises(ValueError):
+        sdr.read_samples_async(lambda *args: None, num_samples, parallel_stages=[abs])
+
+    # the stages would run before the shift
+    sdr.frequency_shift = 100e3
+    with pytest.raises(ValueError):
+        read_blocks(1, workers=2, parallel_stages=[abs])
+    received = read_blocks(2, workers=2)
+    assert len(received) == 2
+    sdr.frequency_shift = 0
+    sdr.iq_correction = True
+    with pytest.raises(ValueError):
+        read_blocks(1, workers=2, parallel_stages=[abs])
+    sdr.iq_correction = False
+    sdr.close()
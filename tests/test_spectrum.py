@@ -0,0 +1,87 @@
+import pytest
+
+from conftest import is_travisci
+
+
+def welch_reference(np, samples, nfft, noverlap=0, sample_rate=2.):
+    window = np.hanning(nfft)
+    step = nfft - noverlap
+    segments = [samples[i:i+nfft] * window for i in range(0, len(samples) - nfft + 1, step)]
+    scale = 1 / (sample_rate * (window ** 2).sum())
+    if np.iscomplexobj(samples):
+        power = np.mean([abs(np.fft.fft(s)) ** 2 for s in segments], axis=0) * scale
+        return np.fft.fftshift(power)
+    power = np.mean([abs(np.fft.rfft(s)) ** 2 for s in segments], axis=0) * scale
+    power[1:-1] *= 2
+    return power
+
+
+def test_welch_psd():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.spectrum import WelchPSD
+
+    rng = np.random.RandomState(0)
+    samples = rng.standard_normal(65536) + 1j * rng.standard_normal(65536)
+
+    # segments spanning block boundaries are not discarded
+    for nfft, noverlap in [(1024, 0), (1024, 512), (1000, 100)]:
+        estimator = WelchPSD(nfft, noverlap)
+        for block in np.array_split(samples, 13):
+            psd = estimator.update(block)
+        assert psd is estimator.psd
+        assert estimator.num_segments == (len(samples) - nfft) // (nfft - noverlap) + 1
+        assert np.allclose(psd, welch_reference(np, samples, nfft, noverlap))
+    freqs = estimator.frequencies
+    assert freqs[0] == -1 and freqs[len(freqs)//2] == 0
+
+    real_samples = samples.real.copy()
+    estimator = WelchPSD(1024, sample_rate=2.4e6, center_freq=1e6)
+    psd = estimator.update(real_samples)
+    assert psd.shape == (513,)
+    assert np.allclose(psd, welch_reference(np, real_samples, 1024, sample_rate=2.4e6))
+    assert estimator.frequencies[0] == 1e6
+
+    with pytest.raises(ValueError):
+        WelchPSD(1024, 1024)
+    with pytest.raises(ValueError):
+        WelchPSD(1024, window=np.ones(16))
+
+
+def test_welch_psd_averages():
+    np = pytest.importorskip('numpy')
+    from rtlsdr.spectrum import WelchPSD
+
+    rng = np.random.RandomState(0)
+    samples = rng.standard_normal(1024 * 40) + 1j * rng.standard_normal(1024 * 40)
+    estimates = []
+    def callback(psd, estimator):
+        estimates.append(psd.copy())
+
+    estimator = WelchPSD(1024, num_averages=8, callback=callback)
+    assert estimator.update(samples[:1024 * 7]) is None
+    assert estimator.update(samples[1024 * 7:]) is estimator.psd
+    assert len(estimates) == 5
+    for i, psd in enumerate(estimates):
+        expected = welch_reference(np, samples[1024 * 8 * i:1024 * 8 * (i + 1)], 1024)
+        assert np.allclose(psd, expected)
+    assert estimator.num_segments == 0
+
+
+@pytest.mark.skipif(not is_travisci(), reason='requires the emulated librtlsdr')
+def test_welch_psd_async():
+    pytest.importorskip('numpy')
+    from rtlsdr import RtlSdr
+    from rtlsdr.spectrum import WelchPSD
+
+    sdr = RtlSdr()
+    estimates = []
+    def callback(psd, estimator):
+        estimates.append(psd.copy())
+        if len(estimates) >= 3:
+            sdr.cancel_read_async()
+
+    estimator = WelchPSD(256, num_averages=4, callback=callback)
+    sdr.read_samples_async(estimator, 1024)
+    assert len(estimates) >= 3
+    assert all(psd.shape == (256,) for psd in estimates)
+    sdr.close()
@@ -23,6 +23,14 @@ def test(use_numpy):
     client = RtlSdrTcpClient(port=port)
     try:
         generic_test(client, test_async=False, test_exceptions=False, use_numpy=use_numpy)
+
+        # real samples are taken from the direct sampling branch
+        from utils import check_generated_data
+        client.set_direct_sampling('q')
+        samples = client.read_samples(512, dtype='float32')
+        assert len(samples) == 512
+        check_generated_data([int(round((s + 1) * 127.5)) for s in samples], 2)
+        client.set_direct_sampling(0)
         with pytest.raises(NotImplementedError):
             generic_test(client, test_async=True, test_exceptions=False, use_numpy=use_numpy)
     finally:
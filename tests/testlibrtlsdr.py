@@ -20,7 +20,6 @@ class p_rtlsdr_dev(object):
         pass
 
 class LibRtlSdr(object):
-    async_callback = None
     async_generator = None
     NUM_FAKE_DEVICES = 32
     def __init__(self):
@@ -33,6 +32,7 @@ class LibRtlSdr(object):
         self.gain_mode = 0
         self.agc_mode = 0
         self.direct_sampling = 0
+        self.async_generators = {}
     def rtlsdr_get_device_count(self):
         if ERROR_CODE != 0:
             return ERROR_CODE
@@ -150,44 +150,45 @@ class LibRtlSdr(object):
         if buf is None:
             array_type = (c_ubyte*data_len)
             buf = array_type()
-        direct_sampling = self.direct_sampling
-        if direct_sampling == 0:
-            iq = iter_test_bytes()
-            for i in range(data_len):
-                buf[i] = next(iq)
-        else:
-            iq = iter_test_samples()
-            buf_index = 0
-            for x in range(data_len):
-                i, q = next(iq)
-                if direct_sampling == 1:
-                    buf[x] = i
-                elif direct_sampling == 2:
-                    buf[x] = q
-                buf_index += 1
+        # like librtlsdr, the data stays interleaved I/Q in direct sampling
+        # mode (see utils.check_generated_data for the branches)
+        iq = iter_test_bytes()
+        for i in range(data_len):
+            buf[i] = next(iq)
         return buf
     def rtlsdr_read_async(self, dev_p, callback, context, buf_num, num_bytes):
         if ERROR_CODE != 0:
             return ERROR_CODE
-        self.async_callback = callback
-        self.async_context = context
-        self.async_generator = AsyncGenerator(self, num_bytes)
-        self.async_generator.run()
-        self.async_generator = None
-        return ERROR_CODE
-    def rtlsdr_cancel_async(self, *args):
-        if self.async_generator is not None:
-            self.async_generator.running = False
-        return ERROR_CODE
+        # keep the generator per device so several can read at once
+        generator = AsyncGenerator(self, num_bytes, callback, context)
+        self.async_generators[id(dev_p)] = generator
+        self.async_generator = generator
+        try:
+            generator.run()
+        finally:
+            del self.async_generators[id(dev_p)]
+            self.async_generator = None
+        return ERROR_CODE
+    def rtlsdr_cancel_async(self, dev_p):
+        if ERROR_CODE != 0:
+            return ERROR_CODE
+        # like librtlsdr, fail unless the read is running
+        generator = self.async_generators.get(id(dev_p))
+        if generator is None or not generator.running:
+            return -2
+        generator.running = False
+        return 0
 
 class AsyncGenerator(object):
     """Simple object to emulate `rtlsdr_read_async` behavior.
     Used by :meth:`DummyRtlSdr.read_bytes_async`
     and :meth:`DummyRtlSdr.read_samples_async`
     """
-    def __init__(self, libobj, num_bytes):
+    def __init__(self, libobj, num_bytes, callback, context):
         self.libobj = libobj
         self.num_bytes = num_bytes
+        self.callback = callback
+        self.context = context
         num_samples = num_bytes / 2
 
         # Guess how long it SHOULD take to read based off of the sample rate
@@ -199,7 +200,7 @@ class AsyncGenerator(object):
         self.running = True
         while self.running:
             buf = libobj._generate_fake_data(self.num_bytes)
-            libobj.async_callback(buf, self.num_bytes, libobj.async_context)
+            self.callback(buf, self.num_bytes, self.context)
             time.sleep(self.timeout)
 
 librtlsdr = LibRtlSdr()
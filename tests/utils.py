@@ -119,13 +119,14 @@ def generic_test(sdr, test_async=True, test_exceptions=True, use_numpy=True):
     check_generated_data(samples, use_numpy=use_numpy)
     print('read %s samples' % (len(samples)))
 
+    # the raw data is still I/Q, with the ADC samples in one branch
     sdr.set_direct_sampling('i')
     samples = sdr.read_bytes(1024)
-    check_generated_data(samples, 1, use_numpy=use_numpy)
+    check_generated_data(list(samples)[0::2], 1, use_numpy=use_numpy)
 
     sdr.set_direct_sampling('q')
     samples = sdr.read_bytes(1024)
-    check_generated_data(samples, 2, use_numpy=use_numpy)
+    check_generated_data(list(samples)[1::2], 2, use_numpy=use_numpy)
 
     if test_exceptions:
         with pytest.raises(SyntaxError):
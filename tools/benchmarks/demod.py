@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+"""Throughput benchmark for the FM and AM demodulator stages
+
+Blocks of complex64 samples are demodulated at the full rate of the device
+(2.4 MS/s by default).  Run from the project root (or with pyrtlsdr
+installed)::
+
+    PYTHONPATH=. python tools/benchmarks/demod.py --num-samples 262144
+
+"""
+from __future__ import division, print_function
+
+import sys
+import timeit
+import argparse
+
+import numpy as np
+
+from rtlsdr.dsp import FMDemodulator, AMDemodulator, Deemphasis
+
+
+def make_fm_signal(num_samples, sample_rate, deviation=75e3, tone=1e3):
+    t = np.arange(num_samples) / sample_rate
+    message = np.sin(2 * np.pi * tone * t)
+    phase = np.cumsum(2 * np.pi * deviation * message / sample_rate)
+    rng = np.random.RandomState(0)
+    noise = rng.standard_normal(num_samples) + 1j * rng.standard_normal(num_samples)
+    return (np.exp(1j * phase) + 0.01 * noise).astype(np.complex64)
+
+def naive_fm(samples):
+    """The usual per-block demodulation (one output lost per block)"""
+    return np.angle(samples[1:] * np.conj(samples[:-1]))
+
+def run_case(name, func, num_samples, num_runs, sample_rate):
+    # warm up (allocates any reused buffers)
+    func()
+    t = min(timeit.repeat(func, number=num_runs, repeat=5)) / num_runs
+    rate = num_samples / t
+    print('{:<28} {:>10.3f} ms/block {:>10.2f} MS/s {:>8.1f}x realtime'.format(
+        name, t * 1e3, rate / 1e6, rate / sample_rate,
+    ))
+    return rate
+
+def main(**opts):
+    num_samples = opts.get('num_samples', 256*1024)
+    num_runs = opts.get('num_runs', 20)
+    sample_rate = opts.get('sample_rate', 2.4e6)
+
+    samples = make_fm_signal(num_samples, sample_rate)
+    # the stages demodulate in place, so each run starts from a fresh copy
+    block = np.empty_like(samples)
+    audio = np.zeros(num_samples, dtype=np.float32)
+
+    fm = FMDemodulator(sample_rate, deviation=75e3)
+    fm_deemph = FMDemodulator(sample_rate, deviation=75e3, deemphasis=75e-6)
+    am = AMDemodulator()
+    deemph = Deemphasis(sample_rate)
+
+    def copy_block():
+        block[...] = samples
+
+    def run_stage(stage):
+        def run():
+            block[...] = samples
+            stage.process(block)
+        return run
+
+    print('Demodulating {} samples per block at {:.2f} MS/s'.format(
+        num_samples, sample_rate / 1e6,
+    ))
+    cases = [
+        ('copy only', copy_block),
+        ('naive np.angle', lambda: naive_fm(samples)),
+        ('FMDemodulator', run_stage(fm)),
+        ('FMDemodulator + deemphasis', run_stage(fm_deemph)),
+        ('AMDemodulator', run_stage(am)),
+        ('Deemphasis (float32)', lambda: deemph.process(audio)),
+    ]
+    for name, func in cases:
+        run_case(name, func, num_samples, num_runs, sample_rate)
+
+def parse_args(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument(
+        '--num-samples', dest='num_samples', type=int, default=256*1024,
+        help='Number of samples in each demodulated block',
+    )
+    p.add_argument(
+        '--num-runs', dest='num_runs', type=int, default=20,
+        help='Number of blocks per timing run',
+    )
+    p.add_argument(
+        '--sample-rate', dest='sample_rate', type=float, default=2.4e6,
+        help='Sample rate used for the signal and the realtime factor',
+    )
+    args = p.parse_args(argv)
+    return vars(args)
+
+if __name__ == '__main__':
+    main(**parse_args())
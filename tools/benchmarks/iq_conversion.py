@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+"""Throughput benchmark for the raw byte to I/Q sample conversion
+
+Run from the project root (or with pyrtlsdr installed)::
+
+    PYTHONPATH=. python tools/benchmarks/iq_conversion.py --num-samples 262144
+
+"""
+from __future__ import division, print_function
+
+import sys
+import random
+import timeit
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rtlsdr import conversion
+from rtlsdr.conversion import SampleConverter, LUTConverter
+
+
+def make_raw_data(num_samples):
+    rng = random.Random(0)
+    return bytearray(rng.getrandbits(8) for _ in range(2*num_samples))
+
+def legacy_list_convert(bytes):
+    """The list based conversion used before the array module path was added"""
+    return [complex(i/(255/2) - 1, q/(255/2) - 1) for i, q in zip(bytes[::2], bytes[1::2])]
+
+def run_case(name, func, num_samples, num_runs):
+    # warm up (builds any cached tables)
+    func()
+    t = min(timeit.repeat(func, number=num_runs, repeat=5)) / num_runs
+    rate = num_samples / t
+    print('{:<28} {:>10.3f} ms/block {:>10.2f} MS/s'.format(name, t * 1e3, rate / 1e6))
+    return rate
+
+def print_speedups(rates, baseline_name):
+    baseline = rates[baseline_name]
+    for name, rate in rates.items():
+        print('{:<28} {:>10.2f}x'.format(name, rate / baseline))
+
+def bench_numpy(raw_data, num_samples, num_runs):
+    converters = [('arithmetic', SampleConverter()), ('lut', LUTConverter())]
+    raw_data = np.frombuffer(raw_data, dtype=np.uint8)
+
+    rates = {}
+    for conv_name, conv in converters:
+        for dtype in ['complex128', 'complex64']:
+            name = '{} {}'.format(conv_name, dtype)
+            rates[name] = run_case(
+                name, lambda: conv.convert(raw_data, dtype),
+                num_samples, num_runs,
+            )
+    print_speedups(rates, 'arithmetic complex128')
+
+def bench_no_numpy(raw_data, num_samples, num_runs):
+    conv = LUTConverter()
+    rates = {}
+    rates['legacy list'] = run_case(
+        'legacy list', lambda: legacy_list_convert(raw_data), num_samples, num_runs,
+    )
+    orig_has_numpy = conversion.has_numpy
+    conversion.has_numpy = False
+    try:
+        for dtype in ['complex128', 'complex64', 'int8', 'int16']:
+            name = 'array {}'.format(dtype)
+            rates[name] = run_case(
+                name, lambda: conv.convert(raw_data, dtype), num_samples, num_runs,
+            )
+    finally:
+        conversion.has_numpy = orig_has_numpy
+    print_speedups(rates, 'legacy list')
+
+def main(**opts):
+    num_samples = opts.get('num_samples', 256*1024)
+    num_runs = opts.get('num_runs', 20)
+    use_numpy = opts.get('use_numpy', True) and np is not None
+
+    raw_data = make_raw_data(num_samples)
+
+    print('Converting {} samples per block'.format(num_samples))
+    if use_numpy:
+        print('\nNumPy:')
+        bench_numpy(raw_data, num_samples, num_runs)
+    print('\nWithout NumPy:')
+    bench_no_numpy(raw_data, num_samples, max(1, num_runs // 10))
+
+def parse_args(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument(
+        '--num-samples', dest='num_samples', type=int, default=256*1024,
+        help='Number of samples in each converted block',
+    )
+    p.add_argument(
+        '--num-runs', dest='num_runs', type=int, default=20,
+        help='Number of conversions per timing run',
+    )
+    p.add_argument(
+        '--no-numpy', dest='use_numpy', action='store_false',
+        help='Only run the benchmarks for the NumPy-free conversion',
+    )
+    args = p.parse_args(argv)
+    return vars(args)
+
+if __name__ == '__main__':
+    main(**parse_args())